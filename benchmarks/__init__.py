@@ -0,0 +1,11 @@
+"""
+Benchmarks do Renomeador de Comprovantes.
+
+Gera um corpus sintético de comprovantes em PDF (PIX, boleto, consumo,
+Bradesco e DARF, com variantes de várias páginas e malformadas), executa o
+pipeline sobre ele medindo cada etapa e confere se os nomes esperados foram
+gerados. Uso:
+
+    python -m benchmarks --quantidade 200 --salvar base.json
+    python -m benchmarks --quantidade 200 --comparar base.json
+"""
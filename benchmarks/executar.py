@@ -0,0 +1,172 @@
+"""
+Execução e comparação de benchmarks.
+
+Cada arquivo passa por extrair_resultado(), que cronometra as próprias
+etapas (abertura do PDF, extração de texto, classificação e extração de
+campos), e depois pela renomeação de renomear_arquivos_na_pasta().
+"""
+
+import argparse
+import json
+import logging
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import renomeador_comprovantes as rc
+from benchmarks.gerador import gerar_corpus
+
+ETAPAS = ("abrir", "extrair_texto", "classificar", "extrair_campos", "renomear")
+
+# Nomes das etapas de extrair_resultado() no relatório do benchmark
+_ETAPAS_EXTRACAO = {"texto": "extrair_texto", "campos": "extrair_campos"}
+
+
+def _pico_rss_mb():
+    """Pico de memória residente do processo em MB (None se indisponível)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss vem em bytes no macOS e em KB nos demais Unix
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def _processar_cronometrado(caminho, tempos):
+    """
+    Processa um arquivo com extrair_resultado(), somando o tempo de cada etapa.
+
+    Returns:
+        str: Nome sugerido ou None
+    """
+    etapas = {}
+    resultado = rc.extrair_resultado(caminho, tempos=etapas)
+    for etapa, segundos in etapas.items():
+        tempos[_ETAPAS_EXTRACAO.get(etapa, etapa)] += segundos
+    return rc.montar_nome_sugerido(resultado)
+
+
+def executar_benchmark(pasta):
+    """
+    Executa o pipeline sobre um corpus gerado por gerar_corpus().
+
+    Args:
+        pasta (str): Pasta do corpus (com esperado.json); os arquivos são renomeados
+
+    Returns:
+        dict: Métricas (arquivos/s, percentis por etapa em ms, pico de RSS e acurácia)
+    """
+    pasta = Path(pasta)
+    esperado = json.loads((pasta / "esperado.json").read_text(encoding="utf-8"))
+    latencias = {etapa: [] for etapa in ETAPAS}
+    erros = []
+    # Um alocador para o lote, como em _processar_arquivos: a pasta é listada
+    # uma vez, e não a cada arquivo renomeado
+    alocador = rc.AlocadorNomes()
+
+    inicio = time.perf_counter()
+    for nome_arquivo in sorted(esperado):
+        arquivo = pasta / nome_arquivo
+        tempos = dict.fromkeys(ETAPAS, 0.0)
+        try:
+            nome = _processar_cronometrado(str(arquivo), tempos)
+        except Exception:
+            nome = None
+        if nome:
+            t0 = time.perf_counter()
+            rc._renomear_arquivo(arquivo, nome, alocador)
+            tempos["renomear"] = time.perf_counter() - t0
+        if nome != esperado[nome_arquivo]:
+            erros.append({"arquivo": nome_arquivo, "esperado": esperado[nome_arquivo],
+                          "obtido": nome})
+        for etapa, segundos in tempos.items():
+            latencias[etapa].append(segundos * 1000)
+    duracao = time.perf_counter() - inicio
+
+    return {
+        "versao": rc.EXTRATOR_VERSAO,
+        "python": platform.python_version(),
+        "arquivos": len(esperado),
+        "segundos": round(duracao, 3),
+        "arquivos_por_segundo": round(len(esperado) / duracao, 2) if duracao else None,
+        "etapas_ms": {
+            etapa: {"p50": round(rc._percentil(v, 50), 3),
+                    "p90": round(rc._percentil(v, 90), 3),
+                    "p99": round(rc._percentil(v, 99), 3), "max": round(max(v, default=0), 3),
+                    "total": round(sum(v), 3)}
+            for etapa, v in latencias.items()
+        },
+        "pico_rss_mb": _pico_rss_mb(),
+        "acuracia": round(1 - len(erros) / len(esperado), 4) if esperado else None,
+        "erros": erros,
+    }
+
+
+def comparar(atual, base):
+    """
+    Compara duas execuções e retorna as linhas do relatório de diferenças.
+
+    Args:
+        atual (dict): Métricas da execução atual
+        base (dict): Métricas de referência (carregadas de um JSON salvo)
+
+    Returns:
+        list: Linhas de texto com a variação de cada métrica
+    """
+    def variacao(novo, antigo):
+        if not antigo:
+            return "n/d"
+        return f"{(novo - antigo) / antigo * 100:+.1f}%"
+
+    linhas = [f"arquivos/s: {base['arquivos_por_segundo']} -> {atual['arquivos_por_segundo']} "
+              f"({variacao(atual['arquivos_por_segundo'], base['arquivos_por_segundo'])})"]
+    for etapa in ETAPAS:
+        antigo, novo = base["etapas_ms"][etapa]["p50"], atual["etapas_ms"][etapa]["p50"]
+        linhas.append(f"{etapa} p50 (ms): {antigo} -> {novo} ({variacao(novo, antigo)})")
+    if base.get("pico_rss_mb") and atual.get("pico_rss_mb"):
+        linhas.append(f"pico RSS (MB): {base['pico_rss_mb']:.1f} -> {atual['pico_rss_mb']:.1f}")
+    linhas.append(f"acurácia: {base['acuracia']} -> {atual['acuracia']}")
+    return linhas
+
+
+def main(argv=None):
+    """Gera um corpus, executa o benchmark e salva/compara o resultado."""
+    parser = argparse.ArgumentParser(description="Benchmark do renomeador de comprovantes")
+    parser.add_argument("--quantidade", type=int, default=100,
+                        help="Comprovantes de uma página (padrão: 100)")
+    parser.add_argument("--multipagina", type=int, default=10,
+                        help="Comprovantes com várias páginas (padrão: 10)")
+    parser.add_argument("--paginas-extras", type=int, default=20,
+                        help="Páginas extras dos comprovantes multipágina (padrão: 20)")
+    parser.add_argument("--malformados", type=int, default=8,
+                        help="Arquivos que devem falhar (padrão: 8)")
+    parser.add_argument("--semente", type=int, default=0, help="Semente do corpus")
+    parser.add_argument("--pasta", help="Gera o corpus nesta pasta em vez de uma temporária")
+    parser.add_argument("--salvar", metavar="JSON", help="Salva as métricas como baseline")
+    parser.add_argument("--comparar", metavar="JSON", help="Compara com um baseline salvo")
+    args = parser.parse_args(argv)
+
+    # O benchmark mede o pipeline, não a escrita de log
+    logging.getLogger("renomeador_comprovantes").setLevel(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as temporaria:
+        pasta = args.pasta or temporaria
+        gerar_corpus(pasta, args.quantidade, args.multipagina, args.paginas_extras,
+                     args.malformados, args.semente)
+        metricas = executar_benchmark(pasta)
+
+    print(json.dumps({k: v for k, v in metricas.items() if k != "erros"}, indent=2))
+    for erro in metricas["erros"][:20]:
+        print(f"❌ {erro['arquivo']}: esperado {erro['esperado']}, obtido {erro['obtido']}")
+
+    if args.salvar:
+        Path(args.salvar).write_text(json.dumps(metricas, indent=2, ensure_ascii=False),
+                                     encoding="utf-8")
+    if args.comparar:
+        base = json.loads(Path(args.comparar).read_text(encoding="utf-8"))
+        print("\n".join(comparar(metricas, base)))
+
+    return 0 if not metricas["erros"] else 1
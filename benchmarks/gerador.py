@@ -0,0 +1,190 @@
+"""
+Gerador de comprovantes sintéticos em PDF.
+
+Os PDFs são escritos diretamente (texto em Helvetica, sem dependências
+externas), com o texto de cada layout nas mesmas posições relativas dos
+comprovantes reais, além de linhas de ruído (rodapés, avisos) e variantes de
+várias páginas e malformadas. Cada arquivo gerado vem com o nome que o
+renomeador deve sugerir para ele (ou None quando ele deve falhar).
+"""
+
+import json
+import random
+import re
+from pathlib import Path
+
+MESES = ('jan', 'fev', 'mar', 'abr', 'mai', 'jun',
+         'jul', 'ago', 'set', 'out', 'nov', 'dez')
+
+TIPOS = ("pix", "boleto", "consumo", "bradesco", "darf")
+
+_NOMES = ("Pensao Alimenticia", "Aluguel Apartamento", "Condominio Residencial", "Escola Infantil",
+          "Academia Corpo", "Mecanica Central", "Farmacia Popular", "Consultorio Odonto",
+          "Internet Fibra", "Seguro Auto", "Plano de Saude", "Contabilidade Silva")
+_EMPRESAS = ("Companhia de Energia", "Saneamento Municipal", "Gas Natural SA", "Telefonia Movel")
+_RUIDO = ("Atendimento ao cliente 0800 724 7220", "Autenticação eletrônica: {hex}",
+          "Emitido em canal digital", "Ouvidoria: 0800 646 2519",
+          "Guarde este comprovante para eventuais consultas", "Cooperativa {n} - Agência {n}",
+          "SAC 24h para deficientes auditivos ou de fala")
+
+
+def _escapar_pdf(texto):
+    return texto.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def montar_pdf(paginas):
+    """
+    Monta um PDF mínimo com uma linha de texto por linha de cada página.
+
+    Args:
+        paginas (list): Lista de páginas, cada uma uma lista de linhas
+
+    Returns:
+        bytes: Conteúdo do arquivo PDF
+    """
+    objetos = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    filhos = " ".join(f"{4 + 2 * i} 0 R" for i in range(len(paginas)))
+    objetos.append(f"<< /Type /Pages /Kids [{filhos}] /Count {len(paginas)} >>".encode())
+    objetos.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica"
+                   b" /Encoding /WinAnsiEncoding >>")
+    for i, linhas in enumerate(paginas):
+        operacoes = ["BT /F1 11 Tf 14 TL 50 800 Td"]
+        operacoes += [f"({_escapar_pdf(linha)}) Tj T*" for linha in linhas]
+        operacoes.append("ET")
+        fluxo = "\n".join(operacoes).encode("cp1252", "replace")
+        objetos.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842]"
+                       f" /Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+                       .encode())
+        objetos.append(b"<< /Length %d >>\nstream\n" % len(fluxo) + fluxo + b"\nendstream")
+
+    saida = bytearray(b"%PDF-1.4\n")
+    deslocamentos = []
+    for numero, objeto in enumerate(objetos, 1):
+        deslocamentos.append(len(saida))
+        saida += b"%d 0 obj\n" % numero + objeto + b"\nendobj\n"
+    inicio_xref = len(saida)
+    saida += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1)
+    for deslocamento in deslocamentos:
+        saida += b"%010d 00000 n \n" % deslocamento
+    saida += (b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+              % (len(objetos) + 1, inicio_xref))
+    return bytes(saida)
+
+
+def _nome_esperado(descricao, valor_centavos, dia, mes):
+    """Nome que o renomeador deve sugerir (mesma limpeza da descrição)."""
+    descricao = "_".join(re.sub(r'[^a-zA-Z0-9\s_]', '', descricao).split())
+    valor = f"{valor_centavos / 100:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+    return f"{descricao}_{valor}_{dia:02d}_{MESES[mes - 1]}.pdf"
+
+
+def _ruido(rng, quantidade):
+    linhas = []
+    for _ in range(quantidade):
+        modelo = rng.choice(_RUIDO)
+        linhas.append(modelo.format(hex=f"{rng.getrandbits(48):012X}", n=rng.randint(100, 999)))
+    return linhas
+
+
+def gerar_comprovante(tipo, rng):
+    """
+    Gera as linhas da primeira página de um comprovante e o nome esperado.
+
+    Args:
+        tipo (str): Um dos TIPOS
+        rng (random.Random): Gerador de números aleatórios
+
+    Returns:
+        tuple: (lista de linhas, nome esperado)
+    """
+    centavos = rng.randint(100, 9_999_999)
+    valor = f"{centavos / 100:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+    dia, mes, ano = rng.randint(1, 28), rng.randint(1, 12), rng.randint(2019, 2026)
+    data = f"{dia:02d}/{mes:02d}/{ano}"
+
+    if tipo == "pix":
+        descricao = f"{rng.choice(_NOMES)} AP{rng.randint(100000, 999999)}"
+        linhas = ["Sicredi", "Comprovante de Pagamento Pix", descricao, f"Valor: R$ {valor}",
+                  f"Realizado em: {data} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}"]
+    elif tipo == "boleto":
+        descricao = f"{rng.choice(_NOMES)} {rng.randint(10 ** 9, 10 ** 10 - 1)}"
+        linhas = ["Sicredi", "Comprovante de Pagamento de Boleto",
+                  "Razão Social do Beneficiário", descricao,
+                  f"Valor do documento R$ {valor}", f"Data de pagamento {data}"]
+    elif tipo == "consumo":
+        descricao = f"{rng.choice(_EMPRESAS)} {MESES[mes - 1].upper()}"
+        linhas = ["Sicredi", "Comprovante de Conta de Consumo", "Nome da Empresa", descricao,
+                  f"Valor Total R$ {valor}", f"Data de vencimento {data}"]
+    elif tipo == "bradesco":
+        descricao = f"Transferencia {rng.choice(_NOMES)}"
+        linhas = ["Bradesco", "Comprovante de Transação Bancária", f"Descrição: {descricao}",
+                  f"Valor Total: R$ {valor}",
+                  f"Data de {rng.choice(('débito', 'crédito'))}: {data}"]
+    elif tipo == "darf":
+        numero = rng.randint(10 ** 16, 10 ** 17 - 1)
+        descricao = f"DARF_{numero}"
+        linhas = ["Sicredi", "Comprovante de Pagamento de DARF", str(numero),
+                  "Número do Documento:", valor, "Valor Total (R$):", data, "Data do Pagamento:"]
+    else:
+        raise ValueError(f"Tipo desconhecido: {tipo}")
+
+    return linhas + _ruido(rng, rng.randint(2, 6)), _nome_esperado(descricao, centavos, dia, mes)
+
+
+def gerar_corpus(destino, quantidade=100, multipagina=10, paginas_extras=20, malformados=5,
+                 semente=0):
+    """
+    Gera um corpus de comprovantes sintéticos em `destino`.
+
+    Args:
+        destino (str): Pasta onde os PDFs serão gravados (criada se preciso)
+        quantidade (int): Comprovantes de uma página, distribuídos entre os tipos
+        multipagina (int): Comprovantes com `paginas_extras` páginas de extrato
+            depois da primeira
+        paginas_extras (int): Páginas adicionais dos comprovantes multipágina
+        malformados (int): Arquivos que devem falhar (PDF truncado, campo
+            faltando, layout desconhecido, página vazia)
+        semente (int): Semente do gerador, para corpora reproduzíveis
+
+    Returns:
+        dict: {nome do arquivo: nome esperado ou None}; também gravado em
+            `destino/esperado.json`
+    """
+    rng = random.Random(semente)
+    destino = Path(destino)
+    destino.mkdir(parents=True, exist_ok=True)
+    esperado = {}
+
+    for i in range(quantidade):
+        tipo = TIPOS[i % len(TIPOS)]
+        linhas, nome = gerar_comprovante(tipo, rng)
+        arquivo = f"{tipo}_{i:06d}.pdf"
+        (destino / arquivo).write_bytes(montar_pdf([linhas]))
+        esperado[arquivo] = nome
+
+    for i in range(multipagina):
+        tipo = TIPOS[i % len(TIPOS)]
+        linhas, nome = gerar_comprovante(tipo, rng)
+        extras = [_ruido(rng, 40) for _ in range(paginas_extras)]
+        arquivo = f"multi_{tipo}_{i:06d}.pdf"
+        (destino / arquivo).write_bytes(montar_pdf([linhas] + extras))
+        esperado[arquivo] = nome
+
+    for i in range(malformados):
+        linhas, _ = gerar_comprovante(TIPOS[i % len(TIPOS)], rng)
+        variante = i % 4
+        if variante == 0:
+            conteudo = montar_pdf([linhas])[:200]
+        elif variante == 1:
+            conteudo = montar_pdf([[l for l in linhas if not re.search(r"\d{2}/\d{2}/\d{4}", l)]])
+        elif variante == 2:
+            conteudo = montar_pdf([_ruido(rng, 10)])
+        else:
+            conteudo = montar_pdf([[]])
+        arquivo = f"malformado_{i:06d}.pdf"
+        (destino / arquivo).write_bytes(conteudo)
+        esperado[arquivo] = None
+
+    (destino / "esperado.json").write_text(json.dumps(esperado, indent=1, ensure_ascii=False),
+                                           encoding="utf-8")
+    return esperado
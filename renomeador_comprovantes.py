@@ -12,431 +12,618 @@ Formatos suportados (exemplos):
 - DARF: DARF_123456789_1.234,56_15_mar.pdf (Número do Documento + Valor Total + Data do Pagamento)
 """
 
+import argparse
+import calendar
+import contextlib
+import contextvars
+import csv
+import fnmatch
+import hashlib
+import importlib
+import io
+import json
+import logging
 import os
+import posixpath
 import re
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from decimal import Decimal, InvalidOperation
 from pathlib import Path
-import pdfplumber  # type: ignore
-from PyPDF2 import PdfReader, PdfWriter  # type: ignore
 
 
-def identificar_tipo_comprovante(texto):
+# Incrementar sempre que a extração mudar de forma a alterar resultados:
+# entradas de cache gravadas por outra versão são ignoradas.
+EXTRATOR_VERSAO = "6.2"
+
+ResultadoExtracao = namedtuple("ResultadoExtracao", "tipo descricao valor data texto")
+
+logger = logging.getLogger("renomeador_comprovantes")
+
+# Nível abaixo de DEBUG para o despejo linha a linha do texto extraído (-vv)
+DEPURACAO_LINHAS = 5
+logging.addLevelName(DEPURACAO_LINHAS, "LINHAS")
+
+# Nível do relatório do --profile: foi pedido explicitamente, então aparece mesmo com -q
+RELATORIO = logging.WARNING + 5
+logging.addLevelName(RELATORIO, "RELATORIO")
+
+
+def _pdfplumber():
     """
-    Identifica o tipo de comprovante baseado em palavras-chave no texto.
-    
-    Args:
-        texto (str): Texto extraído do PDF
-        
-    Returns:
-        str: Tipo do comprovante (darf, bradesco, pix, boleto, consumo, desconhecido)
+    Importa o pdfplumber na primeira vez que um PDF precisa ser lido.
+
+    O pdfplumber (com o pdfminer) e o PyPDF2 respondem pela maior parte do
+    tempo de importação deste módulo; comandos que não abrem PDFs (--help,
+    query, apply, --undo, send, arquivos já processados) não pagam por eles.
     """
-    texto_lower = texto.lower()
-    
-    # Identificando comprovante DARF (verificar primeiro por ser mais específico)
-    if "comprovante da pagamento de darf" in texto_lower or "comprovante de pagamento de darf" in texto_lower:
-        return "darf"
-    # Identificando comprovante Bradesco
-    elif "bradesco" in texto_lower or "data de débito" in texto_lower or "data de crédito" in texto_lower:
-        return "bradesco"
-    # Identificando comprovante de pagamento PIX
-    elif "comprovante de pagamento pix" in texto_lower:
-        return "pix"
-    elif "razão social do beneficiário" in texto_lower:
-        return "boleto"
-    elif "nome da empresa" in texto_lower:
-        return "consumo"
-    else:
-        return "desconhecido"
+    import pdfplumber  # type: ignore
+    return pdfplumber
+
+
+def _pypdf2():
+    """Importa o PyPDF2 na primeira vez que ele é usado (veja _pdfplumber)."""
+    import PyPDF2  # type: ignore
+    return PyPDF2
+
+
+# Arquivo em processamento, anexado a cada registro de log como `arquivo`
+_arquivo_atual = contextvars.ContextVar("arquivo_atual", default=None)
+
+# Lista onde processar_bytes() coleta os avisos do comprovante em andamento
+_avisos_atuais = contextvars.ContextVar("avisos_atuais", default=None)
+
+# PerfilExecucao que recebe os tempos por etapa de cada arquivo (--profile)
+_perfil_atual = contextvars.ContextVar("perfil_atual", default=None)
+
+
+class _FiltroArquivo(logging.Filter):
+    """Anexa o arquivo em processamento aos registros de log e coleta os avisos."""
+
+    def filter(self, record):
+        if not hasattr(record, "arquivo"):
+            record.arquivo = _arquivo_atual.get()
+        avisos = _avisos_atuais.get()
+        if avisos is not None and record.levelno >= logging.WARNING:
+            avisos.append(record.getMessage())
+        return True
+
+
+logger.addFilter(_FiltroArquivo())
+
+
+class FormatadorTexto(logging.Formatter):
+    """Mensagem simples; avisos e erros são prefixados com o nome do arquivo."""
+
+    def format(self, record):
+        mensagem = super().format(record)
+        if record.levelno >= logging.WARNING and record.arquivo:
+            mensagem = f"{os.path.basename(record.arquivo)}: {mensagem}"
+        return mensagem
+
 
+# Atributos que todo LogRecord tem; o resto veio de `extra=` e vai para o JSON
+_ATRIBUTOS_LOG_RECORD = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message"}
 
-def extrair_dados_bradesco(texto):
+
+class FormatadorJSON(logging.Formatter):
+    """Um objeto JSON por linha, para ingestão por coletores de log."""
+
+    def format(self, record):
+        dados = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensagem": record.getMessage(),
+        }
+        for chave, valor in vars(record).items():
+            if chave not in _ATRIBUTOS_LOG_RECORD and valor is not None:
+                dados[chave] = valor
+        if record.exc_info:
+            dados["excecao"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            dados["excecao"] = record.exc_text
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+def configurar_logging(verbosidade=0, formato="texto", fluxo=None):
     """
-    Função específica para extrair dados de comprovantes Bradesco.
-    
+    Configura o logger da ferramenta para a linha de comando.
+
     Args:
-        texto (str): Texto extraído do PDF
-        
+        verbosidade (int): -1 = só avisos e erros, 0 = progresso, 1 = depuração,
+            2 = depuração com o texto extraído linha a linha
+        formato (str): "texto" ou "json" (JSON lines)
+        fluxo: Destino das mensagens (padrão: sys.stdout)
+    """
+    niveis = {-1: logging.WARNING, 0: logging.INFO, 1: logging.DEBUG}
+    handler = logging.StreamHandler(fluxo or sys.stdout)
+    handler.setFormatter(FormatadorJSON() if formato == "json" else FormatadorTexto())
+    for antigo in list(logger.handlers):
+        logger.removeHandler(antigo)
+    logger.addHandler(handler)
+    logger.setLevel(niveis.get(verbosidade, DEPURACAO_LINHAS))
+    logger.propagate = False
+
+
+# Marcadores de cada tipo de comprovante, em ordem de prioridade: quando o
+# texto tem marcadores de mais de um tipo, vence o que aparece primeiro aqui
+# (DARF antes de Bradesco por ser mais específico, e assim por diante).
+# Para suportar um novo banco basta incluir uma entrada nesta tabela.
+MARCADORES_TIPO = (
+    ("darf", ("comprovante da pagamento de darf", "comprovante de pagamento de darf")),
+    ("bradesco", ("bradesco", "data de débito", "data de crédito")),
+    ("pix", ("comprovante de pagamento pix",)),
+    ("boleto", ("razão social do beneficiário",)),
+    ("consumo", ("nome da empresa",)),
+)
+
+Classificacao = namedtuple("Classificacao", "tipo confianca ambiguo marcadores")
+
+
+def _compilar_classificador(marcadores_tipo):
+    """
+    Compila todos os marcadores em uma única expressão regular.
+
     Returns:
-        tuple: (descricao, valor, data)
+        tuple: (padrão compilado, {marcador: tipo}, {tipo: prioridade})
     """
-    linhas = texto.splitlines()
-    
-    print("\n[DEPURAÇÃO BRADESCO] Linhas extraídas:")
-    for i, linha in enumerate(linhas):
-        print(f"Linha {i + 1}: '{linha.strip()}'")
-    
-    descricao = "sem_descricao"
-    valor = "0.00"
-    data = ""
-    
-    # Procurar pela descrição
-    for i, linha in enumerate(linhas):
-        linha_strip = linha.strip()
-        # Procurar por "Descrição:" ou "Descricao:"
-        if re.match(r"descri[cç][aã]o\s*:?", linha_strip, re.I):
-            print(f"[DEPURAÇÃO BRADESCO] Encontrou 'Descrição' na linha {i + 1}")
-            
-            # A descrição pode estar na mesma linha ou na próxima
-            descricao_match = re.search(r"descri[cç][aã]o\s*:?\s*(.+)", linha_strip, re.I)
-            if descricao_match and descricao_match.group(1).strip():
-                descricao = descricao_match.group(1).strip()
-                print(f"[DEPURAÇÃO BRADESCO] Descrição encontrada na mesma linha: '{descricao}'")
-            elif i + 1 < len(linhas):
-                # Verificar próxima linha
-                proxima_linha = linhas[i + 1].strip()
-                if proxima_linha and not re.match(r"(valor|data|r\$)", proxima_linha, re.I):
-                    descricao = proxima_linha
-                    print(f"[DEPURAÇÃO BRADESCO] Descrição encontrada na linha seguinte: '{descricao}'")
-            break
-    
-    # Procurar pelo "Valor Total" (campo específico do Bradesco)
-    for linha in linhas:
-        # Padrões para encontrar "Valor Total"
-        valor_match = re.search(r"valor\s+total\s*:?\s*r?\$?\s*([\d.,]+)", linha, re.I)
-        if valor_match:
-            valor_raw = valor_match.group(1)
-            # Converter para formato float
-            if ',' in valor_raw:
-                valor = valor_raw.replace('.', '').replace(',', '.')
-            else:
-                valor = valor_raw
-            print(f"[DEPURAÇÃO BRADESCO] Valor Total encontrado: '{valor_raw}' -> '{valor}'")
-            break
-    
-    # Procurar pela "Data de débito" ou "Data de crédito"
-    for linha in linhas:
-        data_match = re.search(r"data\s+de\s+(d[ée]bito|cr[ée]dito)\s*:?\s*(\d{1,2})[/\-.](\d{1,2})[/\-.](\d{2,4})", linha, re.I)
-        if data_match:
-            _, dia, mes, ano = data_match.groups()
-            meses = ['jan', 'fev', 'mar', 'abr', 'mai', 'jun', 
-                    'jul', 'ago', 'set', 'out', 'nov', 'dez']
-            try:
-                mes_num = int(mes)
-                if 1 <= mes_num <= 12:
-                    data = f"{dia.zfill(2)}_{meses[mes_num-1]}"
-                    print(f"[DEPURAÇÃO BRADESCO] Data encontrada: '{data_match.group()}' -> '{data}'")
-                    break
-            except:
-                continue
-    
-    # Limpar e formatar a descrição
-    descricao = re.sub(r'[^a-zA-Z0-9\s_]', '', descricao)
-    descricao = "_".join(descricao.split())
-    
-    print(f"[DEPURAÇÃO BRADESCO] Resultado final - Descrição: '{descricao}', Valor: '{valor}', Data: '{data}'")
-    
-    return descricao, valor, data
+    tipo_do_marcador = {}
+    for tipo, marcadores in marcadores_tipo:
+        for marcador in marcadores:
+            tipo_do_marcador.setdefault(marcador, tipo)
+    # Marcadores mais longos primeiro para que prefixos comuns não os escondam
+    alternativas = sorted(tipo_do_marcador, key=len, reverse=True)
+    padrao = re.compile("|".join(re.escape(m) for m in alternativas))
+    prioridade = {tipo: i for i, (tipo, _) in enumerate(marcadores_tipo)}
+    return padrao, tipo_do_marcador, prioridade
+
+
+_CLASSIFICADOR = _compilar_classificador(MARCADORES_TIPO)
+
+
+def _contar_marcadores(texto_lower):
+    """Conta, em uma passada, quantas vezes cada tipo foi marcado no texto."""
+    padrao, tipo_do_marcador, _ = _CLASSIFICADOR
+    contagem = {}
+    for m in padrao.finditer(texto_lower):
+        tipo = tipo_do_marcador[m.group()]
+        contagem[tipo] = contagem.get(tipo, 0) + 1
+    return contagem
 
 
-def extrair_dados_darf(texto):
+def classificar_comprovante(texto, janela=None):
     """
-    Função específica para extrair dados de comprovantes DARF do Sicredi.
-    
+    Classifica o comprovante procurando todos os marcadores em uma passada.
+
+    Com `janela`, apenas os primeiros `janela` caracteres (o cabeçalho) são
+    examinados primeiro; o resto do texto só é lido se nenhum marcador
+    aparecer ali.
+
     Args:
         texto (str): Texto extraído do PDF
-        
+        janela (int): Tamanho do cabeçalho a examinar primeiro (None = texto todo)
+
     Returns:
-        tuple: (descricao, valor, data)
+        Classificacao: tipo escolhido, confiança (fração dos marcadores
+            encontrados que pertencem ao tipo escolhido), se houve marcadores
+            de mais de um tipo e a contagem de marcadores por tipo
     """
-    linhas = texto.splitlines()
-    
-    print("\n[DEPURAÇÃO DARF] Linhas extraídas:")
-    for i, linha in enumerate(linhas):
-        print(f"Linha {i + 1}: '{linha.strip()}'")
-    
-    descricao = "DARF"
-    valor = "0.00"
-    data = ""
-    
-    # No DARF, os valores aparecem ANTES dos rótulos
-    # Procurar pelo "Número do Documento:" e pegar linha ANTERIOR
-    for i, linha in enumerate(linhas):
-        if re.search(r"n[uú]mero\s+do\s+documento\s*:?", linha, re.I):
-            print(f"[DEPURAÇÃO DARF] Encontrou 'Número do Documento' na linha {i + 1}")
-            # O número está na linha ANTERIOR
-            if i > 0:
-                linha_anterior = linhas[i - 1].strip()
-                # Extrair apenas números
-                numero_doc = re.sub(r'\D', '', linha_anterior)
-                if numero_doc:
-                    descricao = f"DARF_{numero_doc}"
-                    print(f"[DEPURAÇÃO DARF] Número do Documento encontrado na linha anterior: '{numero_doc}'")
-            break
-    
-    # Procurar pelo "Valor Total (R$):" e pegar linha ANTERIOR
-    for i, linha in enumerate(linhas):
-        if re.search(r"valor\s+total\s*\(\s*r\$\s*\)\s*:?", linha, re.I):
-            print(f"[DEPURAÇÃO DARF] Encontrou 'Valor Total (R$)' na linha {i + 1}")
-            # O valor está na linha ANTERIOR
-            if i > 0:
-                linha_anterior = linhas[i - 1].strip()
-                # Extrair valor com vírgula e pontos
-                valor_match = re.search(r"([\d.,]+)", linha_anterior)
-                if valor_match:
-                    valor_raw = valor_match.group(1)
-                    # Converter para formato float
-                    if ',' in valor_raw:
-                        valor = valor_raw.replace('.', '').replace(',', '.')
-                    else:
-                        valor = valor_raw
-                    print(f"[DEPURAÇÃO DARF] Valor Total encontrado na linha anterior: '{valor_raw}' -> '{valor}'")
-            break
-    
-    # Procurar pela "Data do Pagamento:" e pegar linha ANTERIOR
-    for i, linha in enumerate(linhas):
-        if re.search(r"data\s+do\s+pagamento\s*:?", linha, re.I):
-            print(f"[DEPURAÇÃO DARF] Encontrou 'Data do Pagamento' na linha {i + 1}")
-            # A data está na linha ANTERIOR
-            if i > 0:
-                linha_anterior = linhas[i - 1].strip()
-                data_match = re.search(r"(\d{1,2})[/\-.](\d{1,2})[/\-.](\d{4})", linha_anterior)
-                if data_match:
-                    dia, mes, ano = data_match.groups()
-                    meses = ['jan', 'fev', 'mar', 'abr', 'mai', 'jun', 
-                            'jul', 'ago', 'set', 'out', 'nov', 'dez']
-                    try:
-                        mes_num = int(mes)
-                        if 1 <= mes_num <= 12:
-                            data = f"{dia.zfill(2)}_{meses[mes_num-1]}"
-                            print(f"[DEPURAÇÃO DARF] Data do Pagamento encontrada na linha anterior: '{linha_anterior}' -> '{data}'")
-                    except:
-                        pass
-            break
-    
-    print(f"[DEPURAÇÃO DARF] Resultado final - Descrição: '{descricao}', Valor: '{valor}', Data: '{data}'")
-    
-    return descricao, valor, data
+    if janela and len(texto) > janela:
+        contagem = _contar_marcadores(texto[:janela].lower())
+        if not contagem:
+            # Recua o tamanho do maior marcador para não perder um cortado ao meio
+            recuo = max(len(m) for m in _CLASSIFICADOR[1])
+            contagem = _contar_marcadores(texto[max(0, janela - recuo):].lower())
+    else:
+        contagem = _contar_marcadores(texto.lower())
+    return _classificar_contagem(contagem)
+
 
+def _classificar_contagem(contagem):
+    """Escolhe o tipo de maior prioridade entre os marcadores contados."""
+    if not contagem:
+        return Classificacao("desconhecido", 0.0, False, {})
 
-def extrair_dados_pix(texto):
+    prioridade = _CLASSIFICADOR[2]
+    tipo = min(contagem, key=prioridade.__getitem__)
+    confianca = contagem[tipo] / sum(contagem.values())
+    return Classificacao(tipo, confianca, len(contagem) > 1, contagem)
+
+
+class _ClassificacaoIncremental:
+    """
+    Classifica um texto recebido aos poucos, sem reler o que já chegou.
+
+    Os marcadores não atravessam quebras de linha, então as contagens de
+    trechos terminados em quebra de linha podem ser somadas; o resultado é o
+    mesmo de classificar_comprovante() sobre todo o texto recebido até agora.
+    """
+
+    def __init__(self, janela=None):
+        self.janela = janela
+        self._cabecalho = ""
+        self._contagem_cabecalho = {}
+        self._contagem = {}
+
+    def alimentar(self, trecho):
+        """Acrescenta um trecho (terminado em quebra de linha) ao texto."""
+        if self.janela:
+            if len(self._cabecalho) < self.janela:
+                self._cabecalho += trecho[:self.janela - len(self._cabecalho)]
+                self._contagem_cabecalho = _contar_marcadores(self._cabecalho.lower())
+            elif self._contagem_cabecalho:
+                # Cabeçalho completo e com marcadores: o resto do texto não conta
+                return
+        for tipo, n in _contar_marcadores(trecho.lower()).items():
+            self._contagem[tipo] = self._contagem.get(tipo, 0) + n
+
+    def classificacao(self):
+        """Classificacao do texto recebido até agora."""
+        return _classificar_contagem(self._contagem_cabecalho or self._contagem)
+
+
+def identificar_tipo_comprovante(texto):
     """
-    Função específica para extrair dados de comprovantes PIX.
+    Identifica o tipo de comprovante baseado em palavras-chave no texto.
     
     Args:
         texto (str): Texto extraído do PDF
         
     Returns:
-        tuple: (descricao, valor, data)
+        str: Tipo do comprovante (darf, bradesco, pix, boleto, consumo, desconhecido)
     """
-    linhas = texto.splitlines()
-    
-    print("\n[DEPURAÇÃO PIX] Linhas extraídas:")
-    for i, linha in enumerate(linhas):
-        print(f"Linha {i + 1}: '{linha.strip()}'")
-    
-    descricao = "sem_descricao"
-    valor = "0.00"
-    data = ""
-    
-    # Procurar pela linha com "Comprovante de Pagamento Pix"
-    idx_comprovante = -1
-    for i, linha in enumerate(linhas):
-        if "comprovante de pagamento pix" in linha.lower():
-            idx_comprovante = i
-            print(f"[DEPURAÇÃO PIX] Encontrou 'Comprovante de Pagamento Pix' na linha {i + 1}")
-            break
-    
-    if idx_comprovante >= 0:
-        # Procurar a descrição na próxima linha não vazia
-        for i in range(idx_comprovante + 1, len(linhas)):
-            linha_atual = linhas[i].strip()
-            if linha_atual and not linha_atual.lower().startswith("valor") and not linha_atual.lower().startswith("realizado em"):
-                descricao = linha_atual
-                print(f"[DEPURAÇÃO PIX] Descrição encontrada na linha {i + 1}: '{descricao}'")
-                break
-        
-        # Procurar o valor em qualquer linha que contenha "valor"
-        for linha in linhas:
-            if "valor" in linha.lower() and "r$" in linha.lower():
-                padroes_valor = [
-                    r"valor[:\s]*r\$\s*([\d.,]+)",
-                    r"r\$\s*([\d.,]+)",
-                    r"([\d.,]+)"
-                ]
-                
-                for padrao in padroes_valor:
-                    valor_match = re.search(padrao, linha, re.I)
-                    if valor_match:
-                        valor_raw = valor_match.group(1)
-                        if ',' in valor_raw:
-                            valor = valor_raw.replace('.', '').replace(',', '.')
-                        else:
-                            valor = valor_raw
-                        print(f"[DEPURAÇÃO PIX] Valor encontrado: '{valor_raw}' -> '{valor}'")
-                        break
-                
-                if valor != "0.00":
-                    break
-        
-        # Procurar a data no campo "Realizado em:"
-        for linha in linhas:
-            if "realizado em" in linha.lower():
-                padroes_data = [
-                    r"realizado em[:\s]*(\d{1,2})[/\-.](\d{1,2})[/\-.](\d{2,4})",
-                    r"(\d{1,2})[/\-.](\d{1,2})[/\-.](\d{2,4})"
-                ]
-                
-                for padrao in padroes_data:
-                    data_match = re.search(padrao, linha, re.I)
-                    if data_match:
-                        dia, mes, ano = data_match.groups()
-                        meses = ['jan', 'fev', 'mar', 'abr', 'mai', 'jun', 
-                                'jul', 'ago', 'set', 'out', 'nov', 'dez']
-                        try:
-                            mes_num = int(mes)
-                            if 1 <= mes_num <= 12:
-                                data = f"{dia.zfill(2)}_{meses[mes_num-1]}"
-                                print(f"[DEPURAÇÃO PIX] Data encontrada: '{linha}' -> '{data}'")
-                                break
-                        except:
-                            continue
-                
-                if data:
-                    break
-    
-    # Limpar e formatar a descrição
-    descricao = re.sub(r'[^a-zA-Z0-9\s_]', '', descricao)
-    descricao = "_".join(descricao.split())
-    
-    print(f"[DEPURAÇÃO PIX] Resultado final - Descrição: '{descricao}', Valor: '{valor}', Data: '{data}'")
-    
-    return descricao, valor, data
+    return classificar_comprovante(texto).tipo
+
+
+MESES = ('jan', 'fev', 'mar', 'abr', 'mai', 'jun',
+         'jul', 'ago', 'set', 'out', 'nov', 'dez')
+
+
+def _conv_texto(m):
+    """Texto capturado, sem espaços nas pontas."""
+    return m.group("valor").strip()
+
+
+def _conv_digitos(m):
+    """Apenas os dígitos do texto capturado (None se não houver)."""
+    return re.sub(r'\D', '', m.group("valor")) or None
+
+
+def _conv_valor(m):
+    """Valor monetário convertido para o formato interno (1234.56)."""
+    valor_raw = m.group("valor")
+    if ',' in valor_raw:
+        return valor_raw.replace('.', '').replace(',', '.')
+    return valor_raw
+
+
+def _conv_data(m):
+    """Data no formato AAAA-MM-DD (None se o mês for inválido)."""
+    mes_num = int(m.group("mes"))
+    if 1 <= mes_num <= 12:
+        ano = m.group("ano")
+        ano = f"20{ano}" if len(ano) == 2 else ano.zfill(4)
+        return f"{ano}-{mes_num:02d}-{m.group('dia').zfill(2)}"
+    return None
+
+
+# Uma Captura diz onde o valor de um campo está em relação à linha do rótulo
+# ("mesma", "proxima", "anterior" ou a primeira das "seguintes" que casar) e
+# quais padrões tentar, em ordem, até o conversor aceitar o resultado.
+Captura = namedtuple("Captura", "alvo padroes conversor")
+
+# Uma Regra preenche um campo na primeira linha cujo texto em minúsculas
+# contém ao menos um termo de cada grupo de `contem` e casa com `rotulo`.
+# Se nenhuma captura der certo, a busca continua nas linhas seguintes, a não
+# ser que `parar_no_rotulo` seja verdadeiro. Valores em `descartar` contam
+# como não encontrados; `modelo` formata o valor aceito.
+Regra = namedtuple("Regra", "campo contem rotulo capturas parar_no_rotulo descartar modelo")
+
+# Um Layout agrupa as regras de um tipo de comprovante. Se `ancora` for
+# informada e não aparecer no texto, todos os campos ficam com o padrão.
+# `gatilho` casa com qualquer termo das regras: linhas sem nenhum são puladas.
+Layout = namedtuple("Layout", "nome ancora padroes regras gatilho")
+
+
+def _captura(alvo, *padroes, conversor=_conv_texto):
+    """Cria uma Captura compilando os padrões (sem diferenciar maiúsculas)."""
+    return Captura(alvo, tuple(re.compile(p, re.I) for p in padroes), conversor)
+
+
+def _regra(campo, contem=(), rotulo=None, capturas=(), parar_no_rotulo=False,
+           descartar=(), modelo="{}"):
+    """Cria uma Regra compilando o rótulo (aplicado à linha em minúsculas)."""
+    if not contem:
+        raise ValueError(f"A regra do campo '{campo}' precisa de ao menos um termo em 'contem'")
+    return Regra(campo, contem, rotulo and re.compile(rotulo), tuple(capturas),
+                 parar_no_rotulo, descartar, modelo)
+
+
+def _layout(nome, ancora, padroes, *regras):
+    """Cria um Layout, compilando o gatilho a partir dos termos das regras."""
+    termos = {termo for regra in regras for grupo in regra.contem for termo in grupo}
+    if ancora:
+        termos.add(ancora)
+    gatilho = re.compile("|".join(re.escape(t) for t in sorted(termos, key=len, reverse=True)))
+    return Layout(nome, ancora, padroes, regras, gatilho)
+
+
+_DATA = r"(?P<dia>\d{1,2})[/\-.](?P<mes>\d{1,2})[/\-.](?P<ano>\d{2,4})"
+_VALOR_NUMERICO = r"r?\$?\s*(?P<valor>[\d.,]+)"
+_PADROES = {"descricao": "sem_descricao", "valor": "0.00", "data": ""}
 
+LAYOUTS = {
+    "darf": _layout(
+        "DARF", None, dict(_PADROES, descricao="DARF"),
+        # No DARF, os valores aparecem na linha ANTERIOR ao rótulo
+        _regra("descricao", contem=(("documento",),),
+               rotulo=r"n[uú]mero\s+do\s+documento\s*:?",
+               capturas=[_captura("anterior", r"(?P<valor>.*)", conversor=_conv_digitos)],
+               parar_no_rotulo=True, modelo="DARF_{}"),
+        _regra("valor", contem=(("valor",), ("total",)),
+               rotulo=r"valor\s+total\s*\(\s*r\$\s*\)\s*:?",
+               capturas=[_captura("anterior", r"(?P<valor>[\d.,]+)", conversor=_conv_valor)],
+               parar_no_rotulo=True),
+        _regra("data", contem=(("pagamento",),),
+               rotulo=r"data\s+do\s+pagamento\s*:?",
+               capturas=[_captura("anterior",
+                                  r"(?P<dia>\d{1,2})[/\-.](?P<mes>\d{1,2})[/\-.](?P<ano>\d{4})",
+                                  conversor=_conv_data)],
+               parar_no_rotulo=True),
+    ),
+    "bradesco": _layout(
+        "BRADESCO", None, _PADROES,
+        # A descrição pode estar na mesma linha ou na próxima
+        _regra("descricao", contem=(("descri",),), rotulo=r"^descri[cç][aã]o\s*:?",
+               capturas=[_captura("mesma", r"^descri[cç][aã]o\s*:?\s*(?P<valor>.+)"),
+                         _captura("proxima", r"^(?!valor|data|r\$)(?P<valor>.+)")],
+               parar_no_rotulo=True),
+        _regra("valor", contem=(("valor",), ("total",)),
+               capturas=[_captura("mesma", r"valor\s+total\s*:?\s*r?\$?\s*(?P<valor>[\d.,]+)",
+                                  conversor=_conv_valor)]),
+        _regra("data", contem=(("data",), ("bito", "dito")),
+               capturas=[_captura("mesma", r"data\s+de\s+(d[ée]bito|cr[ée]dito)\s*:?\s*" + _DATA,
+                                  conversor=_conv_data)]),
+    ),
+    "pix": _layout(
+        "PIX", "comprovante de pagamento pix", _PADROES,
+        # A descrição é a primeira linha não vazia depois do título
+        _regra("descricao", contem=(("comprovante de pagamento pix",),),
+               capturas=[_captura("seguintes", r"^(?!valor|realizado em)(?P<valor>.+)")],
+               parar_no_rotulo=True),
+        _regra("valor", contem=(("valor",), ("r$",)),
+               capturas=[_captura("mesma", r"valor[:\s]*r\$\s*(?P<valor>[\d.,]+)",
+                                  r"r\$\s*(?P<valor>[\d.,]+)", r"(?P<valor>[\d.,]+)",
+                                  conversor=_conv_valor)],
+               descartar=("0.00",)),
+        _regra("data", contem=(("realizado em",),),
+               capturas=[_captura("mesma", r"realizado em[:\s]*" + _DATA, _DATA,
+                                  conversor=_conv_data)]),
+    ),
+    "boleto": _layout(
+        "BOLETO", None, _PADROES,
+        _regra("descricao",
+               contem=(("razão social do beneficiário", "razao social do beneficiario"),),
+               capturas=[_captura("proxima", r"(?P<valor>.*)")],
+               parar_no_rotulo=True),
+        _regra("valor", contem=(("valor",), ("r$",)),
+               capturas=[_captura("mesma", _VALOR_NUMERICO, conversor=_conv_valor)]),
+        _regra("data", contem=(("vencimento", "pagamento"),),
+               capturas=[_captura("mesma", _DATA, conversor=_conv_data)]),
+    ),
+    "consumo": _layout(
+        "CONSUMO", None, _PADROES,
+        _regra("descricao", contem=(("nome da empresa",),),
+               capturas=[_captura("proxima", r"(?P<valor>.*)")],
+               parar_no_rotulo=True),
+        _regra("valor", contem=(("total",), ("r$", "valor")),
+               capturas=[_captura("mesma", _VALOR_NUMERICO, conversor=_conv_valor)]),
+        _regra("data", contem=(("vencimento", "data"),),
+               capturas=[_captura("mesma", _DATA, conversor=_conv_data)]),
+    ),
+}
 
-def extrair_dados_boleto(texto):
+
+def _linhas_alvo(alvo, i, total):
+    """Índices das linhas onde procurar o valor de um rótulo na linha i."""
+    if alvo == "mesma":
+        return (i,)
+    if alvo == "proxima":
+        return (i + 1,) if i + 1 < total else ()
+    if alvo == "anterior":
+        return (i - 1,) if i > 0 else ()
+    return range(i + 1, total)
+
+
+def _capturar(regra, linhas, i, final=True):
     """
-    Função específica para extrair dados de comprovantes de Boleto.
-    
-    Args:
-        texto (str): Texto extraído do PDF
-        
+    Tenta obter o valor de uma regra a partir da linha de rótulo i.
+
+    Com `final` falso, mais linhas ainda podem chegar: se uma captura olha
+    para linhas depois da última recebida sem achar o valor, a regra precisa
+    esperar por elas (as capturas seguintes não podem ser tentadas antes).
+
     Returns:
-        tuple: (descricao, valor, data)
+        tuple: (valor convertido ou None, bool indicando se a regra deve
+            esperar por mais linhas)
     """
-    linhas = texto.splitlines()
-    
-    print("\n[DEPURAÇÃO BOLETO] Linhas extraídas:")
-    for i, linha in enumerate(linhas):
-        print(f"Linha {i + 1}: '{linha.strip()}'")
-    
-    descricao = "sem_descricao"
-    valor = "0.00"
-    data = ""
-    
-    # Procurar pela "Razão Social do Beneficiário"
-    for i, linha in enumerate(linhas):
-        if "razão social do beneficiário" in linha.lower() or "razao social do beneficiario" in linha.lower():
-            print(f"[DEPURAÇÃO BOLETO] Encontrou 'Razão Social' na linha {i + 1}")
-            # A razão social normalmente está na próxima linha
-            if i + 1 < len(linhas):
-                descricao = linhas[i + 1].strip()
-                print(f"[DEPURAÇÃO BOLETO] Razão Social encontrada: '{descricao}'")
-            break
-    
-    # Procurar pelo valor
-    for linha in linhas:
-        if "valor" in linha.lower() and "r$" in linha.lower():
-            valor_match = re.search(r"r?\$?\s*([\d.,]+)", linha, re.I)
-            if valor_match:
-                valor_raw = valor_match.group(1)
-                if ',' in valor_raw:
-                    valor = valor_raw.replace('.', '').replace(',', '.')
-                else:
-                    valor = valor_raw
-                print(f"[DEPURAÇÃO BOLETO] Valor encontrado: '{valor_raw}' -> '{valor}'")
+    for captura in regra.capturas:
+        for j in _linhas_alvo(captura.alvo, i, len(linhas)):
+            for padrao in captura.padroes:
+                m = padrao.search(linhas[j])
+                valor = captura.conversor(m) if m else None
+                if valor is not None:
+                    return (None if valor in regra.descartar else valor), False
+        if not final and (captura.alvo == "seguintes"
+                          or (captura.alvo == "proxima" and i + 1 >= len(linhas))):
+            return None, True
+    return None, False
+
+
+def _contem_todos(minuscula, grupos):
+    """Indica se a linha contém ao menos um termo de cada grupo."""
+    for grupo in grupos:
+        for termo in grupo:
+            if termo in minuscula:
                 break
-    
-    # Procurar pela data de vencimento ou pagamento
-    for linha in linhas:
-        if "vencimento" in linha.lower() or "pagamento" in linha.lower():
-            data_match = re.search(r"(\d{1,2})[/\-.](\d{1,2})[/\-.](\d{2,4})", linha)
-            if data_match:
-                dia, mes, ano = data_match.groups()
-                meses = ['jan', 'fev', 'mar', 'abr', 'mai', 'jun', 
-                        'jul', 'ago', 'set', 'out', 'nov', 'dez']
-                try:
-                    mes_num = int(mes)
-                    if 1 <= mes_num <= 12:
-                        data = f"{dia.zfill(2)}_{meses[mes_num-1]}"
-                        print(f"[DEPURAÇÃO BOLETO] Data encontrada: '{linha}' -> '{data}'")
+        else:
+            return False
+    return True
+
+
+class _ExtratorCampos:
+    """
+    Aplica as regras de um layout a linhas recebidas aos poucos.
+
+    Cada linha é examinada uma única vez, só contra as regras ainda não
+    resolvidas. Uma regra cujo valor pode estar em linhas que ainda não
+    chegaram fica esperando na linha do rótulo e é retomada a cada
+    alimentar(); as regras não dependem umas das outras, então o resultado
+    é o mesmo de ler o texto inteiro de uma vez.
+
+    Só são guardadas as linhas que alguma regra ainda pode consultar (a
+    partir da anterior à próxima linha a examinar ou a um rótulo em espera);
+    o texto completo fica apenas com quem chama.
+    """
+
+    def __init__(self, layout):
+        self.layout = layout
+        self._linhas = []
+        self._inicio = 0
+        self._valores = dict(layout.padroes)
+        self._pendentes = list(layout.regras)
+        self._esperando = {}
+        self._ancora_encontrada = layout.ancora is None
+        self._proxima = 0
+
+    def alimentar(self, linhas, final=False):
+        """
+        Examina novas linhas (já sem espaços nas pontas).
+
+        Args:
+            linhas (list): Linhas recebidas, em ordem
+            final (bool): Indica que não virão mais linhas
+        """
+        total = self._inicio + len(self._linhas)
+        if logger.isEnabledFor(DEPURACAO_LINHAS):
+            if not total:
+                logger.log(DEPURACAO_LINHAS, "[%s] Linhas extraídas:", self.layout.nome)
+            for i, linha in enumerate(linhas, total):
+                logger.log(DEPURACAO_LINHAS, "Linha %d: '%s'", i + 1, linha)
+        self._linhas.extend(linhas)
+        total += len(linhas)
+
+        for regra, i in tuple(self._esperando.items()):
+            del self._esperando[regra]
+            if self._aplicar(regra, i, final):
+                # Não havia valor a partir desse rótulo: procura nas linhas já
+                # examinadas depois dele e volta para as pendentes
+                restantes = [regra]
+                for j in range(i + 1, self._proxima):
+                    if not restantes:
                         break
-                except:
-                    continue
-    
-    # Limpar e formatar a descrição
-    descricao = re.sub(r'[^a-zA-Z0-9\s_]', '', descricao)
-    descricao = "_".join(descricao.split())
-    
-    print(f"[DEPURAÇÃO BOLETO] Resultado final - Descrição: '{descricao}', Valor: '{valor}', Data: '{data}'")
-    
-    return descricao, valor, data
+                    self._examinar(restantes, j, self._linhas[j - self._inicio].lower(), final)
+                self._pendentes.extend(restantes)
+
+        i = self._proxima
+        while i < total and (self._pendentes or not self._ancora_encontrada):
+            minuscula = self._linhas[i - self._inicio].lower()
+            if not self._ancora_encontrada and self.layout.ancora in minuscula:
+                self._ancora_encontrada = True
+            self._examinar(self._pendentes, i, minuscula, final)
+            i += 1
+        if not self._esperando and not self._pendentes and self._ancora_encontrada:
+            # Nenhuma regra volta a procurar: as linhas restantes não interessam
+            i = total
+        self._proxima = i
+
+        # A regra de um rótulo na linha i pode consultar a linha anterior
+        necessaria = min([self._proxima, *self._esperando.values()]) - 1
+        if necessaria > self._inicio:
+            del self._linhas[:necessaria - self._inicio]
+            self._inicio = necessaria
+
+    def concluir(self):
+        """Resolve as regras que esperavam por linhas que não virão mais."""
+        self.alimentar([], final=True)
+
+    def _examinar(self, regras, i, minuscula, final):
+        """Aplica à linha i as regras de `regras`, tirando dela as que terminarem."""
+        if not self.layout.gatilho.search(minuscula):
+            return
+        for regra in tuple(regras):
+            if not _contem_todos(minuscula, regra.contem):
+                continue
+            if regra.rotulo is not None and not regra.rotulo.search(minuscula):
+                continue
+            if not self._aplicar(regra, i, final):
+                regras.remove(regra)
 
+    def _aplicar(self, regra, i, final):
+        """
+        Tenta a regra no rótulo da linha i.
 
-def extrair_dados_consumo(texto):
+        Returns:
+            bool: Se a busca da regra deve continuar nas linhas seguintes
+        """
+        valor, esperar = _capturar(regra, self._linhas, i - self._inicio, final)
+        if valor is not None:
+            self._valores[regra.campo] = regra.modelo.format(valor)
+            logger.debug("[%s] Campo '%s' encontrado a partir da linha %d: '%s'",
+                         self.layout.nome, regra.campo, i + 1, self._valores[regra.campo])
+            return False
+        if esperar:
+            self._esperando[regra] = i
+            return False
+        return not regra.parar_no_rotulo
+
+    def campos(self):
+        """
+        Campos encontrados até agora.
+
+        Returns:
+            tuple: (descricao, valor, data)
+        """
+        valores = self._valores if self._ancora_encontrada else self.layout.padroes
+
+        # Limpar e formatar a descrição
+        descricao = re.sub(r'[^a-zA-Z0-9\s_]', '', valores["descricao"])
+        descricao = "_".join(descricao.split())
+
+        logger.debug("[%s] Resultado final - Descrição: '%s', Valor: '%s', Data: '%s'",
+                     self.layout.nome, descricao, valores["valor"], valores["data"])
+
+        return descricao, valores["valor"], valores["data"]
+
+
+def extrair_campos(layout, texto):
     """
-    Função específica para extrair dados de comprovantes de Consumo (Luz, Água, etc).
-    
+    Extrai (descricao, valor, data) de um comprovante segundo o seu layout.
+
+    Percorre as linhas uma única vez; cada linha é convertida para minúsculas
+    uma só vez e testada apenas contra as regras ainda não resolvidas.
+
     Args:
+        layout (Layout): Layout do comprovante (ver LAYOUTS)
         texto (str): Texto extraído do PDF
-        
+
     Returns:
         tuple: (descricao, valor, data)
     """
-    linhas = texto.splitlines()
-    
-    print("\n[DEPURAÇÃO CONSUMO] Linhas extraídas:")
-    for i, linha in enumerate(linhas):
-        print(f"Linha {i + 1}: '{linha.strip()}'")
-    
-    descricao = "sem_descricao"
-    valor = "0.00"
-    data = ""
-    
-    # Procurar pelo "Nome da Empresa"
-    for i, linha in enumerate(linhas):
-        if "nome da empresa" in linha.lower():
-            print(f"[DEPURAÇÃO CONSUMO] Encontrou 'Nome da Empresa' na linha {i + 1}")
-            if i + 1 < len(linhas):
-                descricao = linhas[i + 1].strip()
-                print(f"[DEPURAÇÃO CONSUMO] Nome da Empresa encontrado: '{descricao}'")
-            break
-    
-    # Procurar pelo valor total
-    for linha in linhas:
-        if "total" in linha.lower() and ("r$" in linha.lower() or "valor" in linha.lower()):
-            valor_match = re.search(r"r?\$?\s*([\d.,]+)", linha, re.I)
-            if valor_match:
-                valor_raw = valor_match.group(1)
-                if ',' in valor_raw:
-                    valor = valor_raw.replace('.', '').replace(',', '.')
-                else:
-                    valor = valor_raw
-                print(f"[DEPURAÇÃO CONSUMO] Valor encontrado: '{valor_raw}' -> '{valor}'")
-                break
-    
-    # Procurar pela data
-    for linha in linhas:
-        if "vencimento" in linha.lower() or "data" in linha.lower():
-            data_match = re.search(r"(\d{1,2})[/\-.](\d{1,2})[/\-.](\d{2,4})", linha)
-            if data_match:
-                dia, mes, ano = data_match.groups()
-                meses = ['jan', 'fev', 'mar', 'abr', 'mai', 'jun', 
-                        'jul', 'ago', 'set', 'out', 'nov', 'dez']
-                try:
-                    mes_num = int(mes)
-                    if 1 <= mes_num <= 12:
-                        data = f"{dia.zfill(2)}_{meses[mes_num-1]}"
-                        print(f"[DEPURAÇÃO CONSUMO] Data encontrada: '{linha}' -> '{data}'")
-                        break
-                except:
-                    continue
-    
-    # Limpar e formatar a descrição
-    descricao = re.sub(r'[^a-zA-Z0-9\s_]', '', descricao)
-    descricao = "_".join(descricao.split())
-    
-    print(f"[DEPURAÇÃO CONSUMO] Resultado final - Descrição: '{descricao}', Valor: '{valor}', Data: '{data}'")
-    
-    return descricao, valor, data
+    extrator = _ExtratorCampos(layout)
+    extrator.alimentar([linha.strip() for linha in texto.splitlines()], final=True)
+    return extrator.campos()
 
 
 def formatar_valor_saida(valor_str):
@@ -458,141 +645,3644 @@ def formatar_valor_saida(valor_str):
         return valor_str
 
 
-def processar_pdf(caminho_pdf):
+def formatar_data_saida(data_iso):
     """
-    Processa um arquivo PDF e retorna o nome sugerido.
-    
+    Formata a data para o formato de saída (DD_mmm).
+
     Args:
-        caminho_pdf (str): Caminho do arquivo PDF
-        
+        data_iso (str): Data no formato interno (AAAA-MM-DD)
+
     Returns:
-        str: Nome sugerido para o arquivo ou None se falhar
+        str: Data formatada (09_jun)
     """
-    print(f"\n{'='*60}")
-    print(f"Processando: {caminho_pdf}")
-    print(f"{'='*60}")
-    
     try:
-        # Extrair texto do PDF
-        with pdfplumber.open(caminho_pdf) as pdf:
-            texto_completo = ""
-            for pagina in pdf.pages:
-                texto_completo += pagina.extract_text() + "\n"
-        
-        # Identificar tipo de comprovante
-        tipo = identificar_tipo_comprovante(texto_completo)
-        print(f"\nTipo identificado: {tipo.upper()}")
-        
-        # Extrair dados conforme o tipo
-        if tipo == "darf":
-            descricao, valor, data = extrair_dados_darf(texto_completo)
-        elif tipo == "bradesco":
-            descricao, valor, data = extrair_dados_bradesco(texto_completo)
-        elif tipo == "pix":
-            descricao, valor, data = extrair_dados_pix(texto_completo)
-        elif tipo == "boleto":
-            descricao, valor, data = extrair_dados_boleto(texto_completo)
-        elif tipo == "consumo":
-            descricao, valor, data = extrair_dados_consumo(texto_completo)
-        else:
-            print("⚠️  Tipo de comprovante não reconhecido!")
-            return None
-        
-        # Validar dados extraídos
-        if not descricao or descricao == "sem_descricao":
-            print("⚠️  Descrição não encontrada!")
-            return None
-        
-        if not data:
-            print("⚠️  Data não encontrada!")
-            return None
-        
-        # Formatar valor para saída
-        valor_formatado = formatar_valor_saida(valor)
-        
-        # Montar nome do arquivo
-        nome_sugerido = f"{descricao}_{valor_formatado}_{data}.pdf"
-        
-        print(f"\n✅ Nome sugerido: {nome_sugerido}")
-        
-        return nome_sugerido
-        
-    except Exception as e:
-        print(f"❌ Erro ao processar PDF: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        _, mes, dia = data_iso.split("-")
+        return f"{dia}_{MESES[int(mes) - 1]}"
+    except (AttributeError, ValueError, IndexError):
+        return data_iso
+
+
+def data_extraida(resultado):
+    """
+    Data do comprovante como datetime.date.
+
+    Returns:
+        date: Data extraída ou None se ausente ou inválida (ex.: 31/02)
+    """
+    try:
+        return date.fromisoformat(resultado.data)
+    except (TypeError, ValueError):
         return None
 
 
-def renomear_arquivos_na_pasta(pasta="."):
+def _diretorio_cache_usuario():
     """
-    Renomeia todos os arquivos PDF na pasta especificada.
-    
-    Args:
-        pasta (str): Caminho da pasta a processar (padrão: pasta atual)
+    Retorna o diretório de cache do usuário para esta ferramenta.
+
+    Returns:
+        Path: %LOCALAPPDATA% no Windows, $XDG_CACHE_HOME ou ~/.cache nos demais
     """
-    pasta_path = Path(pasta)
-    arquivos_pdf = list(pasta_path.glob("*.pdf"))
-    
-    if not arquivos_pdf:
-        print("Nenhum arquivo PDF encontrado na pasta.")
-        return
-    
-    print(f"\n📁 Encontrados {len(arquivos_pdf)} arquivos PDF\n")
-    
-    processados = 0
-    falhas = 0
-    
-    for arquivo in arquivos_pdf:
-        nome_original = arquivo.name
-        
-        # Pular se já parece ter sido renomeado
-        if re.match(r".+_[\d.,]+_\d{2}_[a-z]{3}\.pdf", nome_original, re.I):
-            print(f"⏭️  Pulando (já renomeado): {nome_original}")
-            continue
-        
-        nome_sugerido = processar_pdf(str(arquivo))
-        
-        if nome_sugerido:
-            novo_caminho = arquivo.parent / nome_sugerido
-            
-            # Evitar sobrescrever arquivos
-            contador = 1
-            while novo_caminho.exists():
-                nome_base = nome_sugerido.replace('.pdf', '')
-                novo_caminho = arquivo.parent / f"{nome_base}_{contador}.pdf"
-                contador += 1
-            
-            try:
-                arquivo.rename(novo_caminho)
-                print(f"✅ Renomeado com sucesso!")
-                print(f"   De: {nome_original}")
-                print(f"   Para: {novo_caminho.name}\n")
-                processados += 1
-            except Exception as e:
-                print(f"❌ Erro ao renomear: {str(e)}\n")
-                falhas += 1
-        else:
-            falhas += 1
-    
-    # Resumo
-    print(f"\n{'='*60}")
-    print(f"RESUMO:")
-    print(f"✅ Processados com sucesso: {processados}")
-    print(f"❌ Falhas: {falhas}")
-    print(f"📊 Total: {len(arquivos_pdf)}")
-    print(f"{'='*60}\n")
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local"
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "renomeador_comprovantes"
 
 
-def main():
-    """Função principal"""
-    print("\n" + "="*60)
-    print("RENOMEADOR INTELIGENTE DE COMPROVANTES - v6")
-    print("="*60)
-    
-    # Processar arquivos na pasta atual
-    renomear_arquivos_na_pasta()
+def hash_arquivo(caminho):
+    """
+    Hash do conteúdo de um arquivo.
+
+    Returns:
+        str: BLAKE2b (20 bytes) em hexadecimal
+    """
+    h = hashlib.blake2b(digest_size=20)
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def hash_dados(dados):
+    """Como hash_arquivo, para um conteúdo já lido para a memória."""
+    return hashlib.blake2b(dados, digest_size=20).hexdigest()
+
+
+class CacheExtracao:
+    """
+    Cache persistente (SQLite) de resultados de extração.
+
+    A chave é o hash do conteúdo do arquivo mais EXTRATOR_VERSAO, então cópias
+    do mesmo PDF, arquivos movidos e comprovantes de tipo desconhecido não são
+    lidos de novo. Quando o tamanho total passa de `max_bytes`, as entradas
+    acessadas há mais tempo são removidas por podar().
+    """
+
+    def __init__(self, caminho=None, max_bytes=512 * 1024 * 1024, reconstruir=False):
+        """
+        Args:
+            caminho (str): Arquivo SQLite (padrão: cache do usuário)
+            max_bytes (int): Tamanho máximo aproximado do cache
+            reconstruir (bool): Ignora entradas existentes e as regrava
+        """
+        self.caminho = Path(caminho) if caminho else _diretorio_cache_usuario() / "extracao.sqlite3"
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.reconstruir = reconstruir
+        self._conexao = sqlite3.connect(str(self.caminho), timeout=30)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS extracao ("
+            " chave TEXT PRIMARY KEY, tipo TEXT NOT NULL, descricao TEXT, valor TEXT,"
+            " data TEXT, texto TEXT NOT NULL, tamanho INTEGER NOT NULL,"
+            " acessado_em REAL NOT NULL)")
+        self._conexao.execute(
+            "CREATE INDEX IF NOT EXISTS idx_extracao_acesso ON extracao (acessado_em)")
+        self._pendentes = 0
+
+    @staticmethod
+    def chave_arquivo(caminho_pdf):
+        """
+        Calcula a chave de cache de um arquivo a partir do seu conteúdo.
+
+        Args:
+            caminho_pdf (str): Caminho do arquivo PDF
+
+        Returns:
+            str: Hash BLAKE2b do conteúdo prefixado com EXTRATOR_VERSAO
+        """
+        return f"{EXTRATOR_VERSAO}:{hash_arquivo(caminho_pdf)}"
+
+    @staticmethod
+    def chave_conteudo(dados):
+        """Como chave_arquivo, para um conteúdo já lido para a memória."""
+        return f"{EXTRATOR_VERSAO}:{hash_dados(dados)}"
+
+    def obter(self, chave):
+        """
+        Busca um resultado no cache.
+
+        Args:
+            chave (str): Chave retornada por chave_arquivo()
+
+        Returns:
+            ResultadoExtracao: Resultado armazenado ou None
+        """
+        if self.reconstruir:
+            return None
+        linha = self._conexao.execute(
+            "SELECT tipo, descricao, valor, data, texto FROM extracao WHERE chave = ?",
+            (chave,)).fetchone()
+        if linha is None:
+            return None
+        self._conexao.execute(
+            "UPDATE extracao SET acessado_em = ? WHERE chave = ?", (time.time(), chave))
+        self._registrar_escrita()
+        return ResultadoExtracao(*linha)
+
+    def contem(self, chave):
+        """
+        Indica se há um resultado válido para a chave.
+
+        Args:
+            chave (str): Chave retornada por chave_arquivo()
+
+        Returns:
+            bool: True se obter(chave) retornaria um resultado
+        """
+        if self.reconstruir:
+            return False
+        return self._conexao.execute(
+            "SELECT 1 FROM extracao WHERE chave = ?", (chave,)).fetchone() is not None
+
+    def guardar(self, chave, resultado):
+        """
+        Armazena (ou substitui) um resultado no cache.
+
+        Args:
+            chave (str): Chave retornada por chave_arquivo()
+            resultado (ResultadoExtracao): Resultado da extração
+        """
+        tamanho = len(resultado.texto.encode("utf-8")) + 256
+        self._conexao.execute(
+            "INSERT OR REPLACE INTO extracao VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (chave, *resultado, tamanho, time.time()))
+        self._registrar_escrita()
+
+    def _registrar_escrita(self):
+        self._pendentes += 1
+        if self._pendentes >= 200:
+            self._conexao.commit()
+            self._pendentes = 0
+
+    def podar(self):
+        """
+        Remove as entradas menos usadas até o cache caber em max_bytes.
+
+        Returns:
+            int: Número de entradas removidas
+        """
+        total = self._conexao.execute(
+            "SELECT COALESCE(SUM(tamanho), 0) FROM extracao").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+        remover = []
+        for chave, tamanho in self._conexao.execute(
+                "SELECT chave, tamanho FROM extracao ORDER BY acessado_em"):
+            if total <= self.max_bytes:
+                break
+            remover.append((chave,))
+            total -= tamanho
+        self._conexao.executemany("DELETE FROM extracao WHERE chave = ?", remover)
+        self._conexao.commit()
+        return len(remover)
+
+    def fechar(self):
+        """Poda o cache, grava as alterações pendentes e fecha a conexão."""
+        self.podar()
+        self._conexao.commit()
+        self._conexao.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+class IndiceProcessados:
+    """
+    Índice persistente (SQLite) da situação de cada arquivo já processado.
+
+    Cada entrada guarda o caminho, o tamanho, o mtime e o inode do arquivo e
+    a situação: "renomeado", "falha" ou "desconhecido" (tipo não reconhecido).
+    Um arquivo cujo stat() ainda bate com a entrada é pulado sem ser aberto,
+    então uma execução sobre um arquivo que só cresce lê apenas os PDFs novos
+    ou alterados.
+    """
+
+    def __init__(self, caminho=None):
+        """
+        Args:
+            caminho (str): Arquivo SQLite (padrão: cache do usuário)
+        """
+        self.caminho = Path(caminho) if caminho else _diretorio_cache_usuario() / "indice.sqlite3"
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        self._conexao = sqlite3.connect(str(self.caminho), timeout=30)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS arquivo ("
+            " caminho TEXT PRIMARY KEY, tamanho INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+            " inode INTEGER NOT NULL, situacao TEXT NOT NULL, nome TEXT,"
+            " processado_em REAL NOT NULL)")
+        self._pendentes = 0
+
+    @staticmethod
+    def _assinatura(caminho):
+        info = os.stat(caminho)
+        return info.st_size, info.st_mtime_ns, info.st_ino
+
+    def situacao(self, caminho):
+        """
+        Situação registrada para o arquivo, se ele não mudou desde então.
+
+        Args:
+            caminho (str): Caminho do arquivo
+
+        Returns:
+            str: "renomeado", "falha" ou "desconhecido"; None se o arquivo
+                não está no índice ou mudou (tamanho, mtime ou inode)
+        """
+        linha = self._conexao.execute(
+            "SELECT tamanho, mtime_ns, inode, situacao FROM arquivo WHERE caminho = ?",
+            (os.path.abspath(caminho),)).fetchone()
+        if linha is None:
+            return None
+        try:
+            assinatura = self._assinatura(caminho)
+        except OSError:
+            return None
+        return linha[3] if tuple(linha[:3]) == assinatura else None
+
+    def registrar(self, caminho, situacao, nome=None, anterior=None):
+        """
+        Registra a situação de um arquivo com o stat() atual.
+
+        Args:
+            caminho (str): Caminho atual do arquivo (o novo, se foi renomeado)
+            situacao (str): "renomeado", "falha" ou "desconhecido"
+            nome (str): Nome sugerido, se houver
+            anterior (str): Caminho antigo, removido do índice
+        """
+        caminho = os.path.abspath(caminho)
+        try:
+            assinatura = self._assinatura(caminho)
+        except OSError:
+            return
+        if anterior is not None and os.path.abspath(anterior) != caminho:
+            self._conexao.execute("DELETE FROM arquivo WHERE caminho = ?",
+                                  (os.path.abspath(anterior),))
+        self._conexao.execute("INSERT OR REPLACE INTO arquivo VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              (caminho, *assinatura, situacao, nome, time.time()))
+        self._pendentes += 1
+        if self._pendentes >= 200:
+            self._conexao.commit()
+            self._pendentes = 0
+
+    def fechar(self):
+        """Grava as alterações pendentes e fecha a conexão."""
+        self._conexao.commit()
+        self._conexao.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+def valor_em_centavos(valor):
+    """
+    Converte um valor ("1234.56", "1.234,56" ou "1234") para centavos.
+
+    Returns:
+        int: Valor em centavos ou None se não for um número
+    """
+    texto = str(valor).strip()
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        return int((Decimal(texto) * 100).to_integral_value())
+    except (InvalidOperation, ValueError):
+        return None
+
+
+# Valor digitado: pontos seguidos de exatamente três dígitos separam milhares
+# ("1.000", "1.000,50"); sem vírgula, um ponto com um ou dois dígitos depois
+# é a casa decimal ("1000.5")
+_VALOR_DIGITADO = (
+    re.compile(r"(?P<inteiro>\d{1,3}(?:\.\d{3})+|\d+)(?:,(?P<centavos>\d{1,2}))?"),
+    re.compile(r"(?P<inteiro>\d+)\.(?P<centavos>\d{1,2})"),
+)
+
+
+def valor_digitado_em_centavos(texto):
+    """
+    Converte um valor digitado pelo usuário ("1.000", "1.000,50", "1000.5") para centavos.
+
+    Raises:
+        ValueError: Se o texto não for um valor
+    """
+    texto = str(texto).strip()
+    for padrao in _VALOR_DIGITADO:
+        m = padrao.fullmatch(texto)
+        if m:
+            centavos = (m.group("centavos") or "0").ljust(2, "0")
+            return int(m.group("inteiro").replace(".", "")) * 100 + int(centavos)
+    raise ValueError(f"valor inválido: {texto!r} (ex.: 1.000,00)")
+
+
+def limite_de_data(texto, final=False):
+    """
+    Data AAAA-MM-DD de um filtro de período.
+
+    AAAA e AAAA-MM são completados com o primeiro dia do período, ou com o
+    último se `final` for verdadeiro ("2024-03" até 2024-03-31).
+
+    Raises:
+        ValueError: Se o texto não for uma data válida
+    """
+    m = re.fullmatch(r"(\d{4})(?:-(\d{1,2})(?:-(\d{1,2}))?)?", str(texto).strip())
+    if not m:
+        raise ValueError(f"data inválida: {texto!r} (use AAAA-MM-DD, AAAA-MM ou AAAA)")
+    ano = int(m.group(1))
+    mes = int(m.group(2) or (12 if final else 1))
+    try:
+        if m.group(3):
+            dia = int(m.group(3))
+        else:
+            dia = calendar.monthrange(ano, mes)[1] if final else 1
+        return date(ano, mes, dia).isoformat()
+    except ValueError:
+        raise ValueError(f"data inválida: {texto!r}") from None
+
+
+def caminho_livro_padrao():
+    """Livro usado quando nenhum é informado (livro.sqlite3 no cache do usuário)."""
+    return _diretorio_cache_usuario() / "livro.sqlite3"
+
+
+# Colunas devolvidas por LivroComprovantes.consultar() e exportadas em CSV
+CAMPOS_LIVRO = ("data", "tipo", "descricao", "valor", "caminho", "hash")
+
+
+class LivroComprovantes:
+    """
+    Livro (SQLite) com os campos de cada comprovante renomeado.
+
+    Cada comprovante é identificado pelo hash do conteúdo: processar de novo
+    o mesmo arquivo (ou uma cópia) atualiza a entrada em vez de duplicá-la. O
+    valor é guardado em centavos e a data completa (AAAA-MM-DD), com índices
+    por data, valor e tipo para as consultas de consultar().
+    """
+
+    def __init__(self, caminho=None):
+        """
+        Args:
+            caminho (str): Arquivo SQLite (padrão: livro.sqlite3 no cache do usuário)
+        """
+        self.caminho = Path(caminho) if caminho else caminho_livro_padrao()
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        self._conexao = sqlite3.connect(str(self.caminho), timeout=30)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS comprovante ("
+            " hash TEXT PRIMARY KEY, caminho TEXT NOT NULL, tipo TEXT NOT NULL,"
+            " descricao TEXT, valor_centavos INTEGER, data TEXT,"
+            " atualizado_em REAL NOT NULL)")
+        for coluna in ("data", "valor_centavos", "tipo"):
+            self._conexao.execute(f"CREATE INDEX IF NOT EXISTS idx_comprovante_{coluna}"
+                                  f" ON comprovante ({coluna})")
+        self._pendentes = 0
+
+    def registrar(self, caminho, resultado, hash_conteudo=None):
+        """
+        Insere ou atualiza o comprovante de um arquivo.
+
+        Args:
+            caminho (str): Caminho atual do arquivo
+            resultado (ResultadoExtracao): Campos extraídos
+            hash_conteudo (str): Hash já calculado (padrão: lê o arquivo)
+        """
+        try:
+            hash_conteudo = hash_conteudo or hash_arquivo(caminho)
+        except OSError as e:
+            logger.warning("⚠️  Não foi possível registrar %s no livro: %s", caminho, e)
+            return
+        self._conexao.execute(
+            "INSERT OR REPLACE INTO comprovante VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (hash_conteudo, os.path.abspath(caminho), resultado.tipo, resultado.descricao,
+             valor_em_centavos(resultado.valor), resultado.data or None, time.time()))
+        self._pendentes += 1
+        if self._pendentes >= 200:
+            self._conexao.commit()
+            self._pendentes = 0
+
+    def consultar(self, tipo=None, de=None, ate=None, valor_min=None, valor_max=None,
+                  descricao=None):
+        """
+        Busca comprovantes, em ordem de data.
+
+        Args:
+            tipo (str): Tipo exato (pix, boleto, darf...)
+            de (str): Data inicial (inclusive) AAAA-MM-DD, AAAA-MM ou AAAA
+            ate (str): Data final (inclusive), nos mesmos formatos; "2024-03"
+                vai até 2024-03-31
+            valor_min (str): Valor mínimo ("1000", "1.000" ou "1.000,00")
+            valor_max (str): Valor máximo
+            descricao (str): Trecho da descrição (sem diferenciar maiúsculas)
+
+        Yields:
+            dict: Um comprovante com as colunas de CAMPOS_LIVRO
+
+        Raises:
+            ValueError: Se alguma data ou valor for inválido
+        """
+        de = limite_de_data(de) if de is not None else None
+        ate = limite_de_data(ate, final=True) if ate is not None else None
+        valor_min = valor_digitado_em_centavos(valor_min) if valor_min is not None else None
+        valor_max = valor_digitado_em_centavos(valor_max) if valor_max is not None else None
+        condicoes, parametros = [], []
+        for sql, valor in (("tipo = ?", tipo), ("data >= ?", de), ("data <= ?", ate),
+                           ("valor_centavos >= ?", valor_min),
+                           ("valor_centavos <= ?", valor_max),
+                           ("descricao LIKE ?", descricao and f"%{descricao}%")):
+            if valor is not None:
+                condicoes.append(sql)
+                parametros.append(valor)
+        where = f" WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        self._conexao.commit()
+        cursor = self._conexao.execute(
+            "SELECT data, tipo, descricao, valor_centavos, caminho, hash FROM comprovante"
+            f"{where} ORDER BY data, caminho", parametros)
+        for data, tipo_, descricao_, centavos, caminho, hash_conteudo in cursor:
+            valor = None if centavos is None else f"{centavos / 100:.2f}"
+            yield dict(zip(CAMPOS_LIVRO, (data, tipo_, descricao_, valor, caminho,
+                                          hash_conteudo)))
+
+    def fechar(self):
+        """Grava as alterações pendentes e fecha a conexão."""
+        self._conexao.commit()
+        self._conexao.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+def exportar_csv(comprovantes, destino):
+    """
+    Grava comprovantes (ex.: de LivroComprovantes.consultar) em CSV.
+
+    Args:
+        comprovantes (iterable): Dicionários com as colunas de CAMPOS_LIVRO
+        destino (file): Arquivo texto aberto para escrita
+
+    Returns:
+        int: Número de linhas gravadas
+    """
+    escritor = csv.DictWriter(destino, CAMPOS_LIVRO)
+    escritor.writeheader()
+    total = 0
+    for comprovante in comprovantes:
+        escritor.writerow(comprovante)
+        total += 1
+    return total
+
+
+_NAO_ALFANUMERICO = re.compile(r"[\W_]+")
+
+
+def impressao_digital(resultado):
+    """
+    Impressão digital de um comprovante, independente dos bytes do PDF.
+
+    Combina os campos extraídos com o texto normalizado (minúsculas, só letras
+    e dígitos), de modo que o mesmo comprovante baixado de novo ou
+    reencaminhado por e-mail tenha a mesma impressão.
+
+    Args:
+        resultado (ResultadoExtracao): Campos e texto extraídos
+
+    Returns:
+        str: BLAKE2b (16 bytes) em hexadecimal
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for parte in (*resultado[:4], _NAO_ALFANUMERICO.sub("", (resultado.texto or "").lower())):
+        h.update(str(parte).encode("utf-8") + b"\0")
+    return h.hexdigest()
+
+
+# Subpasta para onde vão as duplicatas no modo "quarentena" sem pasta própria
+PASTA_DUPLICATAS = "duplicatas"
+
+
+class DetectorDuplicatas:
+    """
+    Detecta comprovantes repetidos pela impressão digital do conteúdo extraído.
+
+    As impressões dos comprovantes já renomeados ficam em um índice SQLite
+    (chave primária, então cada consulta é uma busca na árvore do índice)
+    que persiste entre execuções. `acao` diz o que fazer com uma duplicata:
+    "reportar" (avisa e renomeia normalmente), "pular" (deixa o arquivo como
+    está) ou "quarentena" (move para a pasta `quarentena`, ou para a subpasta
+    PASTA_DUPLICATAS da pasta do arquivo).
+    """
+
+    ACOES = ("reportar", "pular", "quarentena")
+
+    def __init__(self, caminho=None, acao="reportar", quarentena=None):
+        """
+        Args:
+            caminho (str): Arquivo SQLite (padrão: digitais.sqlite3 no cache do usuário)
+            acao (str): Uma das ACOES
+            quarentena (str): Pasta das duplicatas no modo "quarentena"
+        """
+        if acao not in self.ACOES:
+            raise ValueError(f"Ação inválida para duplicatas: {acao}")
+        self.acao = acao
+        self.quarentena = Path(quarentena) if quarentena else None
+        self.caminho = Path(caminho) if caminho else _diretorio_cache_usuario() / "digitais.sqlite3"
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        self._conexao = sqlite3.connect(str(self.caminho), timeout=30)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS digital ("
+            " impressao TEXT PRIMARY KEY, caminho TEXT NOT NULL, registrado_em REAL NOT NULL)")
+        self._pendentes = 0
+
+    def original(self, arquivo, resultado):
+        """
+        Comprovante já registrado com a mesma impressão digital.
+
+        Args:
+            arquivo (Path): Arquivo sendo processado
+            resultado (ResultadoExtracao): Resultado da extração dele
+
+        Returns:
+            Path: Caminho do original, ou None se não houver (ou se o original
+                registrado não existir mais ou for o próprio arquivo)
+        """
+        linha = self._conexao.execute("SELECT caminho FROM digital WHERE impressao = ?",
+                                      (impressao_digital(resultado),)).fetchone()
+        if linha is None:
+            return None
+        original = Path(linha[0])
+        if original == Path(os.path.abspath(arquivo)) or not original.exists():
+            return None
+        return original
+
+    def registrar(self, caminho, resultado):
+        """Registra (ou atualiza) o caminho do comprovante com esta impressão."""
+        self._conexao.execute("INSERT OR REPLACE INTO digital VALUES (?, ?, ?)",
+                              (impressao_digital(resultado), os.path.abspath(caminho),
+                               time.time()))
+        self._pendentes += 1
+        if self._pendentes >= 200:
+            self._conexao.commit()
+            self._pendentes = 0
+
+    def tratar(self, arquivo, original, alocador):
+        """
+        Aplica `acao` a uma duplicata.
+
+        Returns:
+            tuple: (bool indicando se o arquivo deve ser renomeado mesmo assim,
+                novo caminho se foi movido para a quarentena)
+        """
+        if self.acao == "reportar":
+            logger.warning("🔁 Duplicata de %s", original)
+            return True, None
+        if self.acao == "pular":
+            logger.warning("🔁 Duplicata de %s (mantida como está)", original)
+            return False, None
+        pasta = self.quarentena or arquivo.parent / PASTA_DUPLICATAS
+        pasta.mkdir(parents=True, exist_ok=True)
+        novo_caminho = alocador.mover(arquivo, arquivo.name, pasta)
+        logger.warning("🔁 Duplicata de %s, movida para %s", original, novo_caminho)
+        return False, novo_caminho
+
+    def excluir_quarentena(self, raiz):
+        """
+        Padrões de `excluir` que tiram a quarentena da varredura de `raiz`.
+
+        Sem eles, as cópias isoladas seriam encontradas de novo (com -r ou
+        --watch) e movidas para duplicatas/duplicatas/... a cada ciclo.
+
+        Returns:
+            tuple: Padrões fnmatch (vazio fora do modo "quarentena" ou se a
+                pasta da quarentena não estiver dentro de `raiz`)
+        """
+        if self.acao != "quarentena":
+            return ()
+        if self.quarentena is None:
+            return (PASTA_DUPLICATAS,)
+        try:
+            relativo = Path(os.path.abspath(self.quarentena)).relative_to(os.path.abspath(raiz))
+        except ValueError:
+            return ()
+        return (relativo.as_posix(),)
+
+    def fechar(self):
+        """Grava as alterações pendentes e fecha a conexão."""
+        self._conexao.commit()
+        self._conexao.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+class OpcoesExtracao:
+    """Opções que controlam como o texto é lido dos PDFs."""
+
+    __slots__ = ("texto_rapido", "janela_cabecalho", "leitura_antecipada", "max_paginas",
+                 "max_rss_mb", "ocr", "ocr_workers", "adiar_ocr")
+
+    def __init__(self, texto_rapido=False, janela_cabecalho=None, leitura_antecipada=0,
+                 max_paginas=None, max_rss_mb=None, ocr=None, ocr_workers=1,
+                 adiar_ocr=False):
+        """
+        Args:
+            texto_rapido (bool): Tenta primeiro a extração de texto do PyPDF2,
+                bem mais barata, e só usa o pdfplumber se faltar algum campo
+            janela_cabecalho (int): Caracteres iniciais examinados primeiro na
+                classificação (None = texto todo)
+            leitura_antecipada (int): Arquivos lidos para a memória à frente da
+                extração, em threads (0 = cada arquivo é lido pelo próprio
+                extrator)
+            max_paginas (int): Arquivos com mais páginas que isso são recusados
+                (None = sem limite)
+            max_rss_mb (int): Quanto a memória residente do processo pode
+                crescer durante a extração de um arquivo; o arquivo que
+                passar disso é recusado (None = sem limite)
+            ocr (str): Idioma do tesseract (ex.: "por") para ler por OCR os
+                PDFs sem camada de texto (None = desativado)
+            ocr_workers (int): Processos do tesseract em paralelo no
+                processamento em lote
+            adiar_ocr (bool): Não aplica o OCR durante a extração; quem chama
+                o aplica depois, no seu próprio pool (uso interno do lote)
+        """
+        self.texto_rapido = texto_rapido
+        self.janela_cabecalho = janela_cabecalho
+        self.leitura_antecipada = leitura_antecipada
+        self.max_paginas = max_paginas
+        self.max_rss_mb = max_rss_mb
+        self.ocr = ocr
+        self.ocr_workers = ocr_workers
+        self.adiar_ocr = adiar_ocr
+
+    def substituir(self, **campos):
+        """Cópia das opções com os campos informados alterados."""
+        copia = OpcoesExtracao()
+        for campo in self.__slots__:
+            setattr(copia, campo, campos.get(campo, getattr(self, campo)))
+        return copia
+
+
+class ArquivoRecusado(Exception):
+    """O arquivo excede um limite de OpcoesExtracao e não foi processado."""
+
+
+def rss_atual_mb():
+    """
+    Memória residente atual do processo.
+
+    Returns:
+        float: RSS em MB, ou None se a plataforma não expõe /proc/self/statm
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            paginas_residentes = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return paginas_residentes * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def _conferir_paginas(total, max_paginas):
+    if max_paginas and total > max_paginas:
+        raise ArquivoRecusado(f"{total} páginas (limite: {max_paginas})")
+
+
+def _somar_tempo(tempos, etapa, inicio):
+    """Soma em tempos[etapa] os segundos desde `inicio` (nada se tempos for None)."""
+    if tempos is not None:
+        tempos[etapa] = tempos.get(etapa, 0.0) + time.perf_counter() - inicio
+
+
+def _paginas_pdfplumber(caminho_pdf, max_paginas=None, tempos=None):
+    """
+    Gera o texto de cada página, extraindo sob demanda com o pdfplumber.
+
+    Se `tempos` for informado, acumula nele os segundos gastos em "abrir"
+    (abertura do PDF e contagem de páginas) e "texto" (extração das páginas).
+
+    Raises:
+        ArquivoRecusado: Se o PDF tiver mais de `max_paginas` páginas
+    """
+    inicio = time.perf_counter()
+    with _pdfplumber().open(caminho_pdf) as pdf:
+        _conferir_paginas(len(pdf.pages), max_paginas)
+        _somar_tempo(tempos, "abrir", inicio)
+        for pagina in pdf.pages:
+            inicio = time.perf_counter()
+            # Páginas só com imagem (digitalizadas) não têm texto
+            texto = pagina.extract_text() or ""
+            # Descarta os objetos de layout da página já lida e o mapa de texto
+            # (todos os caracteres), que fica num lru_cache da página até o PDF
+            # ser fechado: é ele que fazia a memória crescer a cada página
+            pagina.flush_cache()
+            pagina.get_textmap.cache_clear()
+            _somar_tempo(tempos, "texto", inicio)
+            yield texto
+
+
+def _paginas_pypdf2(caminho_pdf, max_paginas=None, tempos=None):
+    """
+    Gera o texto de cada página usando a camada de texto lida pelo PyPDF2.
+
+    Os `tempos` são acumulados como em _paginas_pdfplumber.
+
+    Raises:
+        ArquivoRecusado: Se o PDF tiver mais de `max_paginas` páginas
+    """
+    inicio = time.perf_counter()
+    with (contextlib.nullcontext(caminho_pdf) if hasattr(caminho_pdf, "read")
+          else open(caminho_pdf, "rb")) as f:
+        paginas = _pypdf2().PdfReader(f).pages
+        _conferir_paginas(len(paginas), max_paginas)
+        _somar_tempo(tempos, "abrir", inicio)
+        for pagina in paginas:
+            inicio = time.perf_counter()
+            texto = pagina.extract_text() or ""
+            _somar_tempo(tempos, "texto", inicio)
+            yield texto
+
+
+def _vigiar_memoria(paginas, max_rss_mb):
+    """
+    Repassa as páginas conferindo a memória residente depois de cada uma.
+
+    O limite vale para o crescimento a partir do RSS do início do arquivo: a
+    memória já ocupada pelo processo (inclusive a que um arquivo recusado
+    antes deixou para trás, que o alocador não devolve ao sistema) não conta.
+
+    Raises:
+        ArquivoRecusado: Se o RSS crescer mais que `max_rss_mb` neste arquivo
+    """
+    inicial = rss_atual_mb()
+    paginas = iter(paginas)
+    try:
+        for numero, texto in enumerate(paginas, 1):
+            rss = rss_atual_mb()
+            if rss is not None and inicial is not None and rss - inicial > max_rss_mb:
+                raise ArquivoRecusado(f"memória cresceu {rss - inicial:.1f} MB até a página "
+                                      f"{numero} (limite: {max_rss_mb} MB)")
+            yield texto
+    finally:
+        fechar = getattr(paginas, "close", None)
+        if fechar:
+            fechar()
+
+
+def _campos_completos(descricao, valor, data):
+    """Indica se todos os campos do nome foram encontrados."""
+    return (descricao not in ("", "sem_descricao", "DARF")
+            and valor != "0.00" and bool(data))
+
+
+def _extrair_de_paginas(paginas, janela_cabecalho=None, tempos=None):
+    """
+    Classifica e extrai os campos lendo as páginas uma a uma.
+
+    Cada página lida só é classificada e passada às regras ainda pendentes
+    (o que já foi lido não é relido); as páginas seguintes só são extraídas
+    se ainda faltar algum campo. O texto só é reconstruído por inteiro
+    quando o tipo muda e no fim.
+
+    Args:
+        paginas (iterable): Textos das páginas, em ordem
+        janela_cabecalho (int): Janela de cabeçalho usada na classificação
+        tempos (dict): Se informado, acumula os segundos gastos em
+            "classificar" e "campos"
+
+    Returns:
+        tuple: (ResultadoExtracao, bool indicando se todos os campos foram achados)
+    """
+    partes = []
+    classificador = _ClassificacaoIncremental(janela_cabecalho)
+    tipo, ambiguo, extrator, completo = "desconhecido", False, None, False
+    paginas = iter(paginas)
+    try:
+        for texto_pagina in paginas:
+            inicio = time.perf_counter()
+            texto_pagina += "\n"
+            partes.append(texto_pagina)
+
+            # Identificar tipo de comprovante e extrair dados conforme o tipo
+            classificador.alimentar(texto_pagina)
+            classificacao = classificador.classificacao()
+            _somar_tempo(tempos, "classificar", inicio)
+            if classificacao.ambiguo and (classificacao.tipo != tipo or not ambiguo):
+                outros = ", ".join(t for t in classificacao.marcadores
+                                   if t != classificacao.tipo)
+                logger.warning("⚠️  Marcadores de outros tipos também encontrados (%s); "
+                               "usando %s", outros, classificacao.tipo.upper())
+            ambiguo = classificacao.ambiguo
+
+            inicio = time.perf_counter()
+            if classificacao.tipo != tipo:
+                # Outro layout: as regras recomeçam do início do texto
+                tipo = classificacao.tipo
+                layout = LAYOUTS.get(tipo)
+                extrator = layout and _ExtratorCampos(layout)
+                novas = "".join(partes).splitlines()
+            else:
+                novas = texto_pagina.splitlines()
+            if extrator is None:
+                continue
+            extrator.alimentar([linha.strip() for linha in novas])
+            completo = _campos_completos(*extrator.campos())
+            _somar_tempo(tempos, "campos", inicio)
+            if completo:
+                break
+        else:
+            if extrator is not None:
+                extrator.concluir()
+    finally:
+        # Fecha o PDF mesmo quando as páginas restantes não são lidas
+        fechar = getattr(paginas, "close", None)
+        if fechar:
+            fechar()
+    texto = "".join(partes)
+    if extrator is None:
+        return ResultadoExtracao(tipo, None, None, None, texto), False
+    return ResultadoExtracao(tipo, *extrator.campos(), texto), completo
+
+
+# Resolução (DPI) das imagens das páginas enviadas ao tesseract
+RESOLUCAO_OCR = 300
+
+# Segundos máximos do tesseract por página
+TEMPO_MAXIMO_OCR = 120
+
+# O pdfplumber 0.9 renderiza as páginas pelo Wand (ImageMagick), que chama o
+# Ghostscript; a MagickWand não pode renderizar em paralelo em threads
+_TRAVA_RENDERIZACAO = threading.Lock()
+
+# Executáveis do Ghostscript (Linux/macOS e Windows)
+_GHOSTSCRIPT = ("gs", "gswin64c", "gswin32c")
+
+
+def motivo_sem_ocr():
+    """
+    Verifica o tesseract e o renderizador das páginas usado pelo OCR.
+
+    Returns:
+        str: O que falta instalar, ou None se o OCR pode rodar
+    """
+    if shutil.which("tesseract") is None:
+        return "tesseract não encontrado no PATH (instale o tesseract e o idioma por)"
+    try:
+        importlib.import_module("pdfplumber.display")
+    except ImportError:
+        return ("ImageMagick não encontrado: o pdfplumber precisa da biblioteca "
+                "MagickWand para renderizar as páginas (instale o ImageMagick)")
+    if not any(shutil.which(executavel) for executavel in _GHOSTSCRIPT):
+        return ("Ghostscript não encontrado no PATH: o ImageMagick precisa dele "
+                "para ler PDFs (instale o Ghostscript)")
+    return None
+
+
+def ocr_disponivel():
+    """Indica se o tesseract, o ImageMagick e o Ghostscript estão instalados."""
+    return motivo_sem_ocr() is None
+
+
+def ocr_paginas(caminho_pdf, idioma="por", max_paginas=None, tempos=None):
+    """
+    Lê o texto de cada página por OCR, com o tesseract local.
+
+    Cada página é renderizada em tons de cinza a RESOLUCAO_OCR e enviada ao
+    tesseract pela entrada padrão; nada é gravado em disco. Pode ser chamada
+    de várias threads: só a renderização é serializada, os processos do
+    tesseract rodam em paralelo.
+
+    Args:
+        caminho_pdf (str): Caminho do PDF ou arquivo binário aberto
+        idioma (str): Idioma (ou idiomas, ex.: "por+eng") do tesseract
+        max_paginas (int): Recusa PDFs com mais páginas que isso
+        tempos (dict): Se informado, acumula em "ocr" os segundos gastos
+
+    Returns:
+        list: Texto de cada página
+
+    Raises:
+        ArquivoRecusado: Se o PDF tiver mais de `max_paginas` páginas
+        RuntimeError: Se o tesseract falhar
+    """
+    textos = []
+    inicio = time.perf_counter()
+    with _pdfplumber().open(caminho_pdf) as pdf:
+        _conferir_paginas(len(pdf.pages), max_paginas)
+        for pagina in pdf.pages:
+            with _TRAVA_RENDERIZACAO:
+                imagem = pagina.to_image(resolution=RESOLUCAO_OCR).original.convert("L")
+            pagina.flush_cache()
+            png = io.BytesIO()
+            imagem.save(png, format="PNG")
+            del imagem
+            saida = subprocess.run(["tesseract", "stdin", "stdout", "-l", idioma],
+                                   input=png.getvalue(), capture_output=True,
+                                   timeout=TEMPO_MAXIMO_OCR)
+            if saida.returncode != 0:
+                erro = saida.stderr.decode("utf-8", "replace").strip()
+                raise RuntimeError(f"tesseract terminou com código {saida.returncode}: {erro}")
+            textos.append(saida.stdout.decode("utf-8", "replace"))
+    _somar_tempo(tempos, "ocr", inicio)
+    return textos
+
+
+def _sem_texto(resultado):
+    """Indica se a extração não achou texto algum (PDF só com imagens)."""
+    return resultado is not None and not resultado.texto.strip()
+
+
+def extrair_resultado(caminho_pdf, opcoes=None, tempos=None):
+    """
+    Lê o PDF, identifica o tipo e extrai os campos do comprovante.
+
+    Todos os layouts suportados têm os campos na primeira página, então as
+    demais só são lidas quando algum campo não foi encontrado.
+
+    Args:
+        caminho_pdf (str): Caminho do arquivo PDF ou arquivo binário aberto
+            (com read e seek)
+        opcoes (OpcoesExtracao): Opções de extração (padrão: OpcoesExtracao())
+        tempos (dict): Se informado, acumula os segundos gastos em cada etapa
+            ("abrir", "texto", "classificar", "campos" e "ocr")
+
+    Returns:
+        ResultadoExtracao: Campos extraídos (None quando o tipo é desconhecido)
+    """
+    opcoes = opcoes or OpcoesExtracao()
+
+    def paginas(leitor):
+        if hasattr(caminho_pdf, "seek"):
+            caminho_pdf.seek(0)
+        gerador = leitor(caminho_pdf, opcoes.max_paginas, tempos)
+        if opcoes.max_rss_mb:
+            gerador = _vigiar_memoria(gerador, opcoes.max_rss_mb)
+        return gerador
+
+    if opcoes.texto_rapido:
+        try:
+            resultado, completo = _extrair_de_paginas(paginas(_paginas_pypdf2),
+                                                      opcoes.janela_cabecalho, tempos)
+            if completo:
+                return resultado
+        except ArquivoRecusado:
+            raise
+        except Exception as e:
+            logger.debug("⚡ Falha na leitura rápida de %s (%s); lendo com o pdfplumber",
+                         _arquivo_atual.get() or caminho_pdf, e)
+    resultado, _ = _extrair_de_paginas(paginas(_paginas_pdfplumber), opcoes.janela_cabecalho,
+                                       tempos)
+    if opcoes.ocr and not opcoes.adiar_ocr and _sem_texto(resultado):
+        if hasattr(caminho_pdf, "seek"):
+            caminho_pdf.seek(0)
+        logger.info("🔍 PDF sem camada de texto; lendo por OCR")
+        textos = ocr_paginas(caminho_pdf, opcoes.ocr, opcoes.max_paginas, tempos)
+        resultado, _ = _extrair_de_paginas(textos, opcoes.janela_cabecalho, tempos)
+    return resultado
+
+
+def montar_nome_sugerido(resultado):
+    """
+    Valida o resultado da extração e monta o nome do arquivo.
+
+    Args:
+        resultado (ResultadoExtracao): Campos extraídos
+
+    Returns:
+        str: Nome sugerido para o arquivo ou None se faltar algum campo
+    """
+    logger.debug("Tipo identificado: %s", resultado.tipo.upper())
+
+    if resultado.tipo not in LAYOUTS:
+        logger.warning("⚠️  Tipo de comprovante não reconhecido!")
+        return None
+
+    # Validar dados extraídos
+    if not resultado.descricao or resultado.descricao == "sem_descricao":
+        logger.warning("⚠️  Descrição não encontrada!")
+        return None
+
+    if not resultado.data:
+        logger.warning("⚠️  Data não encontrada!")
+        return None
+
+    # Formatar valor para saída
+    valor_formatado = formatar_valor_saida(resultado.valor)
+
+    # Montar nome do arquivo
+    nome_sugerido = (f"{resultado.descricao}_{valor_formatado}_"
+                     f"{formatar_data_saida(resultado.data)}.pdf")
+
+    logger.debug("Nome sugerido: %s", nome_sugerido)
+
+    return nome_sugerido
+
+
+def processar_pdf(caminho_pdf, cache=None, chave=None, opcoes=None):
+    """
+    Processa um arquivo PDF e retorna o nome sugerido.
+    
+    Args:
+        caminho_pdf (str): Caminho do arquivo PDF
+        cache (CacheExtracao): Cache de extração opcional
+        chave (str): Chave de cache já calculada (evita ler o arquivo de novo)
+        opcoes (OpcoesExtracao): Opções de extração
+        
+    Returns:
+        str: Nome sugerido para o arquivo ou None se falhar
+    """
+    return _processar_pdf_detalhado(caminho_pdf, cache, chave, opcoes)[0]
+
+
+def _processar_pdf_detalhado(caminho_pdf, cache=None, chave=None, opcoes=None, dados=None,
+                             tempos=None):
+    """
+    Como processar_pdf, mas devolve também o resultado da extração.
+
+    Se `dados` for informado, o PDF é lido desse conteúdo em memória em vez
+    de `caminho_pdf`, que serve então apenas para o log. Se `tempos` for
+    informado, acumula nele os segundos de cada etapa (veja extrair_resultado),
+    mais os gastos no "cache".
+
+    Returns:
+        tuple: (nome sugerido ou None, ResultadoExtracao ou None se a leitura falhar)
+    """
+    token = _arquivo_atual.set(str(caminho_pdf))
+    logger.info("📄 Processando: %s", caminho_pdf)
+
+    resultado = None
+    try:
+        if cache is not None:
+            inicio = time.perf_counter()
+            chave = chave or (cache.chave_arquivo(caminho_pdf) if dados is None
+                              else cache.chave_conteudo(dados))
+            resultado = cache.obter(chave)
+            _somar_tempo(tempos, "cache", inicio)
+            if (resultado is not None and _sem_texto(resultado) and opcoes is not None
+                    and opcoes.ocr and not opcoes.adiar_ocr):
+                # Guardado por uma execução sem OCR: o PDF precisa ser lido de novo
+                resultado = None
+            if resultado is not None:
+                logger.debug("♻️  Resultado reaproveitado do cache")
+
+        if resultado is None:
+            fonte = caminho_pdf if dados is None else io.BytesIO(dados)
+            resultado = extrair_resultado(fonte, opcoes, tempos)
+            if cache is not None:
+                inicio = time.perf_counter()
+                cache.guardar(chave, resultado)
+                _somar_tempo(tempos, "cache", inicio)
+
+        if _sem_texto(resultado):
+            if opcoes is not None and opcoes.ocr and opcoes.adiar_ocr:
+                logger.info("🔍 PDF sem camada de texto; aguardando o OCR")
+            elif opcoes is None or not opcoes.ocr:
+                logger.warning("⚠️  PDF sem camada de texto (imagem digitalizada?); use --ocr")
+            else:
+                logger.warning("⚠️  Nenhum texto reconhecido pelo OCR")
+            return None, resultado
+
+        return montar_nome_sugerido(resultado), resultado
+
+    except ArquivoRecusado as e:
+        logger.error("🚫 Arquivo ignorado: %s", e)
+        return None, resultado
+    except Exception as e:
+        # O traceback completo só aparece no modo de depuração
+        logger.error("❌ Erro ao processar PDF: %s", e,
+                     exc_info=logger.isEnabledFor(logging.DEBUG))
+        return None, resultado
+    finally:
+        _arquivo_atual.reset(token)
+
+
+class _FluxoMemoria(io.RawIOBase):
+    """Arquivo binário somente leitura sobre um buffer, sem copiá-lo."""
+
+    def __init__(self, dados):
+        super().__init__()
+        vista = memoryview(dados)
+        if not vista.c_contiguous:
+            # cast() só aceita buffers contíguos; apenas esses são copiados
+            vista = memoryview(vista.tobytes())
+        self._dados = vista.cast("B")
+        self._posicao = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._posicao
+
+    def seek(self, deslocamento, origem=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._posicao, io.SEEK_END: len(self._dados)}
+        self._posicao = max(0, base[origem] + deslocamento)
+        return self._posicao
+
+    def read(self, tamanho=-1):
+        fim = len(self._dados) if tamanho is None or tamanho < 0 else self._posicao + tamanho
+        trecho = self._dados[self._posicao:fim].tobytes()
+        self._posicao += len(trecho)
+        return trecho
+
+    def readinto(self, destino):
+        trecho = self._dados[self._posicao:self._posicao + len(destino)]
+        destino[:len(trecho)] = trecho
+        self._posicao += len(trecho)
+        return len(trecho)
+
+
+class ResultadoComprovante:
+    """
+    Resultado estruturado de processar_bytes().
+
+    Atributos:
+        tipo (str): Tipo do comprovante ("desconhecido" se não reconhecido;
+            None se o PDF não pôde ser lido)
+        descricao (str): Descrição extraída
+        valor (Decimal): Valor extraído
+        data (date): Data extraída
+        nome (str): Nome sugerido, ou None se faltar algum campo
+        tempos (dict): Segundos gastos em "texto" (leitura das páginas),
+            "campos" (classificação e extração) e "total"
+        avisos (list): Mensagens de aviso e erro geradas no processamento
+        origem: Identificação da entrada (ex.: nome do anexo), se informada
+    """
+
+    __slots__ = ("tipo", "descricao", "valor", "data", "nome", "tempos", "avisos", "origem")
+
+    def __init__(self, tipo=None, descricao=None, valor=None, data=None, nome=None,
+                 tempos=None, avisos=None, origem=None):
+        self.tipo = tipo
+        self.descricao = descricao
+        self.valor = valor
+        self.data = data
+        self.nome = nome
+        self.tempos = tempos or {}
+        self.avisos = avisos or []
+        self.origem = origem
+
+    def __repr__(self):
+        campos = ", ".join(f"{campo}={getattr(self, campo)!r}" for campo in self.__slots__)
+        return f"ResultadoComprovante({campos})"
+
+
+def processar_bytes(dados, opcoes=None, origem=None):
+    """
+    Processa um PDF que está em memória, sem gravá-lo em disco.
+
+    Args:
+        dados: bytes, bytearray, memoryview ou arquivo binário aberto (ex.:
+            BytesIO); buffers são lidos diretamente, sem cópia
+        opcoes (OpcoesExtracao): Opções de extração
+        origem: Identificação da entrada, usada no log e devolvida no resultado
+
+    Returns:
+        ResultadoComprovante: Campos extraídos, nome sugerido, tempos e avisos
+    """
+    avisos, etapas = [], {}
+    token_avisos = _avisos_atuais.set(avisos)
+    token_arquivo = _arquivo_atual.set(None if origem is None else str(origem))
+    inicio = time.perf_counter()
+    resultado = nome = None
+    try:
+        # Dentro do try: uma entrada que não é um buffer (ex.: str) vira um
+        # resultado sem campos, como um PDF ilegível
+        fonte = dados if hasattr(dados, "read") else _FluxoMemoria(dados)
+        resultado = extrair_resultado(fonte, opcoes, etapas)
+        nome = montar_nome_sugerido(resultado)
+    except ArquivoRecusado as e:
+        logger.error("🚫 Arquivo ignorado: %s", e)
+    except Exception as e:
+        logger.error("❌ Erro ao processar PDF: %s", e,
+                     exc_info=logger.isEnabledFor(logging.DEBUG))
+    finally:
+        _arquivo_atual.reset(token_arquivo)
+        _avisos_atuais.reset(token_avisos)
+    total = time.perf_counter() - inicio
+    texto = sum(etapas.get(etapa, 0.0) for etapa in ("abrir", "texto", "ocr"))
+    tempos = {"texto": texto, "campos": total - texto, "total": total}
+
+    if resultado is None:
+        return ResultadoComprovante(tempos=tempos, avisos=avisos, origem=origem)
+    try:
+        valor = Decimal(resultado.valor) if resultado.valor else None
+    except InvalidOperation:
+        valor = None
+    return ResultadoComprovante(resultado.tipo, resultado.descricao, valor,
+                                data_extraida(resultado), nome, tempos, avisos, origem)
+
+
+def processar_lote(entradas, opcoes=None):
+    """
+    Processa uma sequência de PDFs em memória, gerando os resultados em ordem.
+
+    Cada entrada é processada só quando o resultado anterior é consumido, de
+    modo que `entradas` pode ser um gerador sem fim (ex.: uma fila de anexos).
+
+    Args:
+        entradas (iterable): Entradas aceitas por processar_bytes(), ou pares
+            (origem, dados)
+        opcoes (OpcoesExtracao): Opções de extração
+
+    Yields:
+        ResultadoComprovante: Um por entrada
+    """
+    for entrada in entradas:
+        if isinstance(entrada, tuple):
+            origem, dados = entrada
+        else:
+            origem, dados = None, entrada
+        yield processar_bytes(dados, opcoes, origem)
+
+
+class _ColetorLog(logging.Handler):
+    """Guarda os registros de log de um worker para reemiti-los no coordenador."""
+
+    def __init__(self):
+        super().__init__()
+        self.registros = []
+
+    def emit(self, record):
+        # Formata a mensagem e o traceback aqui para o registro poder ser
+        # enviado entre processos
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        self.registros.append(record)
+
+
+def _chamar_capturando_log(funcao, nivel_log, *args):
+    """
+    Chama funcao(*args) guardando os registros de log que ela gera.
+
+    Usada pelos processos do pool: os registros de cada arquivo voltam juntos
+    para o coordenador, que os emite na ordem original sem intercalar arquivos.
+
+    Args:
+        funcao (callable): Função a executar (deve ser importável pelo worker)
+        nivel_log (int): Nível de log do coordenador
+        *args: Argumentos da função
+
+    Returns:
+        tuple: (retorno da função, registros de log)
+    """
+    coletor_log = _ColetorLog()
+    handlers, nivel, propagar = logger.handlers, logger.level, logger.propagate
+    logger.handlers, logger.propagate = [coletor_log], False
+    logger.setLevel(nivel_log)
+    try:
+        return funcao(*args), coletor_log.registros
+    finally:
+        logger.handlers, logger.propagate = handlers, propagar
+        logger.setLevel(nivel)
+
+
+def _processar_pdf_para_coordenador(caminho_pdf, opcoes=None, dados=None, medir=False):
+    """
+    Executa processar_pdf em um worker devolvendo também o resultado bruto.
+
+    O resultado volta com o texto, usado pelo coordenador no cache e na
+    detecção de duplicatas, e com os tempos por etapa, que o coordenador
+    registra no perfil da execução.
+
+    Args:
+        caminho_pdf (str): Caminho do arquivo PDF
+        opcoes (OpcoesExtracao): Opções de extração
+        dados (bytes): Conteúdo já lido pelo coordenador (None = ler o arquivo)
+        medir (bool): Cronometrar as etapas (há um perfil ativo no coordenador)
+
+    Returns:
+        tuple: (nome_sugerido ou None, ResultadoExtracao ou None, tempos ou None)
+    """
+    tempos = {} if medir else None
+    return (*_processar_pdf_detalhado(caminho_pdf, opcoes=opcoes, dados=dados, tempos=tempos),
+            tempos)
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, max(0, round(p / 100 * (len(ordenados) - 1))))]
+
+
+def _estatisticas_ms(valores):
+    """Total, p50, p95 e máximo de uma lista de segundos, em milissegundos."""
+    return {"total": round(sum(valores) * 1000, 3),
+            "p50": round(_percentil(valores, 50) * 1000, 3),
+            "p95": round(_percentil(valores, 95) * 1000, 3),
+            "max": round(max(valores) * 1000, 3)}
+
+
+class PerfilExecucao:
+    """
+    Tempos por etapa de cada arquivo de uma execução (--profile).
+
+    As etapas medidas na extração rodam onde o arquivo é extraído (inclusive
+    nos workers) e voltam ao coordenador junto com o resultado; as demais são
+    medidas pelo próprio coordenador. Sem um perfil ativo nada é registrado.
+    """
+
+    ETAPAS = ("cache", "abrir", "texto", "classificar", "campos", "ocr", "renomear",
+              "registros")
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.arquivos = {}
+
+    def registrar(self, arquivo, tempos, tipo=None):
+        """Soma os `tempos` (segundos por etapa) aos já registrados para o arquivo."""
+        entrada = self.arquivos.setdefault(str(arquivo), {"tipo": None, "tempos": {}})
+        if tipo:
+            entrada["tipo"] = tipo
+        for etapa, segundos in tempos.items():
+            entrada["tempos"][etapa] = entrada["tempos"].get(etapa, 0.0) + segundos
+
+    @contextlib.contextmanager
+    def medir(self, arquivo, etapa):
+        """Registra o tempo do bloco como a etapa `etapa` do arquivo."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(arquivo, {etapa: time.perf_counter() - inicio})
+
+    def relatorio(self, mais_lentos=10):
+        """
+        Resume os tempos registrados até agora.
+
+        Args:
+            mais_lentos (int): Quantos arquivos listar em "mais_lentos"
+
+        Returns:
+            dict: Duração da execução, estatísticas em ms por etapa (total,
+                p50, p95 e máximo) e por tipo, e os arquivos mais lentos
+        """
+        duracao = time.perf_counter() - self.inicio
+        totais = {caminho: sum(entrada["tempos"].values())
+                  for caminho, entrada in self.arquivos.items()}
+        etapas = {}
+        for etapa in self.ETAPAS:
+            valores = [entrada["tempos"][etapa] for entrada in self.arquivos.values()
+                       if etapa in entrada["tempos"]]
+            if valores:
+                etapas[etapa] = _estatisticas_ms(valores)
+        if totais:
+            etapas["total"] = _estatisticas_ms(list(totais.values()))
+        por_tipo = {}
+        for caminho, entrada in self.arquivos.items():
+            por_tipo.setdefault(entrada["tipo"] or "erro", []).append(totais[caminho])
+        return {
+            "arquivos": len(self.arquivos),
+            "segundos": round(duracao, 3),
+            "arquivos_por_segundo": round(len(self.arquivos) / duracao, 2) if duracao else None,
+            "etapas_ms": etapas,
+            "por_tipo_ms": {tipo: {"arquivos": len(valores), **_estatisticas_ms(valores)}
+                            for tipo, valores in sorted(por_tipo.items())},
+            "mais_lentos": [
+                {"arquivo": caminho, "tipo": self.arquivos[caminho]["tipo"],
+                 "ms": round(totais[caminho] * 1000, 3),
+                 "etapas_ms": {etapa: round(segundos * 1000, 3) for etapa, segundos
+                               in self.arquivos[caminho]["tempos"].items()}}
+                for caminho in sorted(totais, key=totais.get, reverse=True)[:mais_lentos]
+            ],
+        }
+
+
+def _medir(arquivo, etapa):
+    """PerfilExecucao.medir no perfil ativo, ou um contexto vazio se não houver um."""
+    perfil = _perfil_atual.get()
+    return contextlib.nullcontext() if perfil is None else perfil.medir(arquivo, etapa)
+
+
+def _registrar_tempos(arquivo, tempos, resultado):
+    """Registra os tempos do arquivo no perfil ativo, se houver um."""
+    perfil = _perfil_atual.get()
+    if perfil is not None and tempos is not None:
+        perfil.registrar(arquivo, tempos, resultado.tipo if resultado is not None else None)
+
+
+def _processar_cronometrado(arquivo, cache=None, chave=None, opcoes=None, dados=None):
+    """_processar_pdf_detalhado no coordenador, registrando os tempos no perfil ativo."""
+    tempos = {} if _perfil_atual.get() is not None else None
+    nome_sugerido, resultado = _processar_pdf_detalhado(str(arquivo), cache, chave, opcoes,
+                                                        dados, tempos)
+    _registrar_tempos(arquivo, tempos, resultado)
+    return nome_sugerido, resultado
+
+
+def _emitir_log(registros):
+    for registro in registros:
+        logger.handle(registro)
+
+
+def _em_ordem(itens, submeter, limite):
+    """
+    Submete itens a um pool e gera (item, futuro) na ordem de entrada.
+
+    Um item fica retido até todos os anteriores terem sido gerados, e no
+    máximo `limite` itens ficam pendentes ao mesmo tempo.
+
+    Args:
+        itens (iterable): Itens a processar (pode ser um gerador)
+        submeter (callable): Recebe um item e retorna um Future, ou None se
+            o item deve ser tratado pelo próprio coordenador
+        limite (int): Máximo de itens pendentes
+
+    Yields:
+        tuple: (item, Future ou None)
+    """
+    pendentes = deque()
+    for item in itens:
+        pendentes.append((item, submeter(item)))
+        while pendentes and (len(pendentes) > limite or pendentes[0][1] is None
+                             or pendentes[0][1].done()):
+            yield pendentes.popleft()
+    while pendentes:
+        yield pendentes.popleft()
+
+
+def _chave_ou_none(cache, arquivo):
+    try:
+        return cache.chave_arquivo(arquivo)
+    except OSError:
+        return None
+
+
+# Resultados que podem ficar retidos atrás de um arquivo em OCR; são só
+# texto, então a janela larga mantém a extração andando durante o OCR
+_JANELA_OCR = 64
+
+
+def _completar_com_ocr(extraidos, cache, opcoes):
+    """
+    Aplica OCR, em um pool de threads próprio, aos PDFs sem camada de texto.
+
+    Recebe os itens de _extrair_nomes (extraídos com adiar_ocr) e os repassa
+    na mesma ordem; os que vieram sem texto são enviados ao tesseract, com no
+    máximo `opcoes.ocr_workers` páginas em OCR ao mesmo tempo, enquanto a
+    extração dos seguintes continua. O resultado do OCR é guardado no cache
+    pelo hash do conteúdo, então o mesmo arquivo não passa pelo OCR de novo.
+    """
+    # As threads do pool não herdam o contexto, então o perfil é consultado aqui
+    medir = _perfil_atual.get() is not None
+
+    def ocr_cronometrado(caminho):
+        tempos = {} if medir else None
+        return ocr_paginas(caminho, opcoes.ocr, opcoes.max_paginas, tempos), tempos
+
+    with ThreadPoolExecutor(max_workers=max(1, opcoes.ocr_workers)) as pool:
+        def submeter(item):
+            arquivo, nome_sugerido, resultado = item
+            if nome_sugerido is not None or not _sem_texto(resultado):
+                return None
+            return pool.submit(ocr_cronometrado, str(arquivo))
+
+        for (arquivo, nome_sugerido, resultado), futuro in _em_ordem(extraidos, submeter,
+                                                                     _JANELA_OCR):
+            if futuro is None:
+                yield arquivo, nome_sugerido, resultado
+                continue
+            token = _arquivo_atual.set(str(arquivo))
+            try:
+                textos, tempos = futuro.result()
+                resultado, _ = _extrair_de_paginas(textos, opcoes.janela_cabecalho, tempos)
+                _registrar_tempos(arquivo, tempos, resultado)
+                logger.info("🔍 Texto lido por OCR: %s", arquivo)
+                chave = _chave_ou_none(cache, arquivo) if cache else None
+                if chave:
+                    cache.guardar(chave, resultado)
+                if _sem_texto(resultado):
+                    logger.warning("⚠️  Nenhum texto reconhecido pelo OCR")
+                    yield arquivo, None, resultado
+                else:
+                    yield arquivo, montar_nome_sugerido(resultado), resultado
+            except ArquivoRecusado as e:
+                logger.error("🚫 Arquivo ignorado: %s", e)
+                yield arquivo, None, resultado
+            except Exception as e:
+                logger.error("❌ Erro no OCR: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+                yield arquivo, None, resultado
+            finally:
+                _arquivo_atual.reset(token)
+
+
+def _extrair_nomes(arquivos, workers=1, cache=None, opcoes=None, hashes=None):
+    """
+    Gera (arquivo, nome_sugerido, resultado) na mesma ordem de `arquivos`.
+
+    `arquivos` pode ser um gerador: cada arquivo é processado assim que
+    aparece. Com workers > 1 a extração roda em um pool de processos, com no
+    máximo 4 arquivos por worker em andamento; o log de cada arquivo é
+    emitido de uma vez, na ordem de entrada. O cache é consultado e
+    atualizado somente por este processo; os workers recebem apenas os
+    arquivos que não estão no cache.
+
+    Com `opcoes.leitura_antecipada` > 0 a leitura dos arquivos também é
+    sobreposta à extração (veja _extrair_nomes_lendo_antes). Com `opcoes.ocr`,
+    os PDFs sem camada de texto passam depois por _completar_com_ocr.
+
+    Args:
+        arquivos (iterable): Path dos PDFs a processar
+        workers (int): Número de processos de extração
+        cache (CacheExtracao): Cache de extração opcional
+        opcoes (OpcoesExtracao): Opções de extração
+        hashes (dict): Com leitura antecipada, recebe o hash_dados de cada
+            arquivo lido, calculado sobre o conteúdo já em memória
+
+    Yields:
+        tuple: (arquivo, nome_sugerido ou None, ResultadoExtracao ou None)
+    """
+    if opcoes is not None and opcoes.ocr and not opcoes.adiar_ocr:
+        extraidos = _extrair_nomes(arquivos, workers, cache, opcoes.substituir(adiar_ocr=True),
+                                   hashes)
+        yield from _completar_com_ocr(extraidos, cache, opcoes)
+        return
+
+    if opcoes is not None and opcoes.leitura_antecipada > 0:
+        yield from _extrair_nomes_lendo_antes(arquivos, workers, cache, opcoes, hashes)
+        return
+
+    if workers <= 1:
+        for arquivo in arquivos:
+            yield (arquivo, *_processar_cronometrado(arquivo, cache, opcoes=opcoes))
+        return
+
+    nivel_log = logger.getEffectiveLevel()
+    medir = _perfil_atual.get() is not None
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        def submeter(item):
+            arquivo, chave = item
+            if chave and cache.contem(chave):
+                return None
+            return executor.submit(_chamar_capturando_log, _processar_pdf_para_coordenador,
+                                   nivel_log, str(arquivo), opcoes, None, medir)
+
+        itens = ((arquivo, _chave_ou_none(cache, arquivo) if cache else None)
+                 for arquivo in arquivos)
+        for (arquivo, chave), futuro in _em_ordem(itens, submeter, workers * 4):
+            if futuro is None:
+                yield (arquivo, *_processar_cronometrado(arquivo, cache, chave, opcoes))
+                continue
+            (nome_sugerido, resultado, tempos), registros = futuro.result()
+            _emitir_log(registros)
+            _registrar_tempos(arquivo, tempos, resultado)
+            if chave and resultado is not None:
+                cache.guardar(chave, resultado)
+            yield arquivo, nome_sugerido, resultado
+
+
+def _ler_conteudo(arquivo):
+    """Lê o arquivo inteiro; erros de leitura viram None (o extrator os reporta)."""
+    try:
+        return Path(arquivo).read_bytes()
+    except OSError:
+        return None
+
+
+def _extrair_nomes_lendo_antes(arquivos, workers, cache, opcoes, hashes=None):
+    """
+    Como _extrair_nomes, com a leitura dos arquivos em um estágio à parte.
+
+    Três estágios encadeados, cada um com sua janela limitada: threads leem
+    até `opcoes.leitura_antecipada` arquivos à frente, os workers (ou o
+    próprio coordenador, com workers <= 1) extraem do conteúdo em memória e o
+    coordenador gera os resultados na ordem de entrada. Um estágio só puxa
+    novos itens do anterior quando há vaga na sua janela, então no máximo
+    leitura_antecipada + 4 * workers arquivos ficam em memória ao mesmo
+    tempo. Em pastas de rede a leitura de um arquivo acontece enquanto os
+    anteriores são extraídos, e a chave do cache (e o hash guardado em
+    `hashes`) é calculada sobre o conteúdo já lido, sem uma segunda leitura.
+    """
+    profundidade = opcoes.leitura_antecipada
+    nivel_log = logger.getEffectiveLevel()
+    paralelo = workers > 1
+    medir = _perfil_atual.get() is not None
+
+    with ThreadPoolExecutor(max_workers=profundidade) as leitores, \
+            (ProcessPoolExecutor(max_workers=workers) if paralelo
+             else contextlib.nullcontext()) as executor:
+        def lidos():
+            leituras = _em_ordem(arquivos, lambda arquivo: leitores.submit(_ler_conteudo, arquivo),
+                                 profundidade)
+            for arquivo, futuro in leituras:
+                dados = futuro.result()
+                chave = None
+                if dados is not None and (cache or hashes is not None):
+                    resumo = hash_dados(dados)
+                    if hashes is not None:
+                        hashes[arquivo] = resumo
+                    chave = f"{EXTRATOR_VERSAO}:{resumo}" if cache else None
+                yield arquivo, dados, chave
+
+        def submeter(item):
+            arquivo, dados, chave = item
+            if not paralelo or dados is None or (chave and cache.contem(chave)):
+                return None
+            return executor.submit(_chamar_capturando_log, _processar_pdf_para_coordenador,
+                                   nivel_log, str(arquivo), opcoes, dados, medir)
+
+        for (arquivo, dados, chave), futuro in _em_ordem(lidos(), submeter,
+                                                         workers * 4 if paralelo else 1):
+            if futuro is None:
+                yield (arquivo, *_processar_cronometrado(arquivo, cache, chave, opcoes, dados))
+                continue
+            (nome_sugerido, resultado, tempos), registros = futuro.result()
+            _emitir_log(registros)
+            _registrar_tempos(arquivo, tempos, resultado)
+            if chave and resultado is not None:
+                cache.guardar(chave, resultado)
+            yield arquivo, nome_sugerido, resultado
+
+
+def _mover_sem_sobrescrever(origem, destino):
+    """
+    Move origem para destino falhando com FileExistsError se destino já existir.
+
+    Usa os.link + unlink, que nunca sobrescreve. Em sistemas de arquivos sem
+    hard links, reserva o destino com O_EXCL e o substitui com os.replace.
+    Se o processo morrer entre o link e o unlink, os dois nomes ficam
+    apontando para o mesmo arquivo; AlocadorNomes.mover conclui esse
+    movimento na execução seguinte em vez de criar uma cópia NOME_1.pdf.
+    """
+    try:
+        os.link(origem, destino)
+    except FileExistsError:
+        raise
+    except (OSError, NotImplementedError):
+        os.close(os.open(destino, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        try:
+            os.replace(origem, destino)
+        except BaseException:
+            os.unlink(destino)
+            raise
+        return
+    os.unlink(origem)
+
+
+class AlocadorNomes:
+    """
+    Aloca nomes livres (NOME.pdf, NOME_1.pdf, NOME_2.pdf...) sem sondar o disco.
+
+    Cada pasta é listada uma única vez, na primeira alocação; a partir daí os
+    nomes ocupados ficam em memória e cada nome sugerido guarda o próximo
+    sufixo a tentar, de modo que uma pasta com milhares de arquivos iguais não
+    custa uma chamada exists() por sufixo. A reserva no disco é atômica
+    (hard link ou O_EXCL): se outro processo ocupar o nome depois da listagem,
+    o alocador passa para o sufixo seguinte em vez de sobrescrever.
+    """
+
+    def __init__(self):
+        self._ocupados = {}
+        self._proximo = {}
+
+    def _nomes_ocupados(self, pasta):
+        ocupados = self._ocupados.get(pasta)
+        if ocupados is None:
+            with os.scandir(pasta) as entradas:
+                ocupados = self._ocupados[pasta] = {entrada.name for entrada in entradas}
+        return ocupados
+
+    def _alocar(self, pasta, nome_sugerido, reservar):
+        pasta = Path(pasta)
+        ocupados = self._nomes_ocupados(pasta)
+        nome_base, extensao = os.path.splitext(nome_sugerido)
+        chave = (pasta, nome_sugerido)
+        contador = self._proximo.get(chave, 0)
+        while True:
+            nome = nome_sugerido if contador == 0 else f"{nome_base}_{contador}{extensao}"
+            contador += 1
+            if nome in ocupados:
+                continue
+            caminho = pasta / nome
+            try:
+                reservar(caminho)
+            except FileExistsError:
+                # Criado por outro processo depois da listagem
+                ocupados.add(nome)
+                continue
+            ocupados.add(nome)
+            self._proximo[chave] = contador
+            return caminho
+
+    def _link_interrompido(self, arquivo, pasta, nome_sugerido):
+        """Nome sugerido (ou com sufixo) em `pasta` que é um hard link de `arquivo`."""
+        try:
+            if os.stat(arquivo).st_nlink < 2:
+                return None
+        except OSError:
+            return None
+        nome_base, extensao = os.path.splitext(nome_sugerido)
+        padrao = re.compile(re.escape(nome_base) + r"(?:_\d+)?" + re.escape(extensao))
+        for nome in sorted(self._nomes_ocupados(pasta)):
+            caminho = pasta / nome
+            if padrao.fullmatch(nome) and caminho != arquivo:
+                try:
+                    if os.path.samefile(arquivo, caminho):
+                        return caminho
+                except OSError:
+                    continue
+        return None
+
+    def mover(self, arquivo, nome_sugerido, pasta=None):
+        """
+        Move um arquivo para o primeiro nome livre, sem sobrescrever.
+
+        Args:
+            arquivo (Path): Arquivo a mover
+            nome_sugerido (str): Nome desejado
+            pasta (Path): Pasta de destino (padrão: a do próprio arquivo)
+
+        Returns:
+            Path: Novo caminho do arquivo
+        """
+        arquivo = Path(arquivo)
+        pasta = Path(pasta) if pasta is not None else arquivo.parent
+        novo_caminho = self._link_interrompido(arquivo, pasta, nome_sugerido)
+        if novo_caminho is not None:
+            # O destino já foi criado por uma execução interrompida; só falta o unlink
+            logger.debug("🔗 Concluindo movimento interrompido para %s", novo_caminho.name)
+            os.unlink(arquivo)
+        else:
+            novo_caminho = self._alocar(pasta, nome_sugerido,
+                                        lambda caminho: _mover_sem_sobrescrever(arquivo, caminho))
+        ocupados = self._ocupados.get(arquivo.parent)
+        if ocupados is not None:
+            ocupados.discard(arquivo.name)
+        return novo_caminho
+
+    def criar(self, pasta, nome_sugerido):
+        """
+        Cria um arquivo vazio no primeiro nome livre e o retorna aberto.
+
+        Returns:
+            tuple: (Path criado, arquivo aberto em modo binário para escrita)
+        """
+        aberto = []
+        caminho = self._alocar(pasta, nome_sugerido,
+                               lambda caminho: aberto.append(open(caminho, "xb")))
+        return caminho, aberto[0]
+
+
+class Organizador:
+    """
+    Escolhe a pasta de destino dos comprovantes e registra os movimentos.
+
+    Com `formato` (códigos do strftime, ex.: "%Y/%m/%d"), cada comprovante vai
+    para a subpasta de `raiz` (ou, sem `raiz`, da pasta em que ele está)
+    correspondente à data extraída; comprovantes sem
+    data válida ficam onde estão. Cada subpasta é verificada e criada uma única
+    vez por lote.
+
+    Com `diario`, cada pasta criada e cada arquivo movido ou gravado é
+    acrescentado ao diário (JSON, uma linha por ação) assim que acontece. Um
+    diário existente é continuado, de modo que uma execução interrompida pode
+    ser retomada: os arquivos já movidos (inclusive os PDFs divididos e os
+    .zip já extraídos, que só são movidos depois da última parte) são pulados,
+    e de um arquivo interrompido no meio só as partes ainda não gravadas são
+    gravadas de novo. desfazer_diario() desfaz tudo sem ler nenhum PDF.
+    """
+
+    def __init__(self, raiz=".", formato=None, diario=None):
+        self.raiz = Path(raiz) if raiz is not None else None
+        self.formato = formato
+        self.diario = Path(diario) if diario else None
+        self._pastas = set()
+        self._registrados = set()
+        self._criados = {}
+        self._arquivo_diario = None
+        if self.diario:
+            if self.diario.exists():
+                for entrada in _ler_diario(self.diario):
+                    if entrada["acao"] == "mover":
+                        self._registrados.add(entrada["origem"])
+                    elif entrada["acao"] == "criar" and "parte" in entrada:
+                        self._criados[entrada["origem"], entrada["parte"]] = (
+                            Path(entrada["destino"]), entrada.get("extraido", True))
+            else:
+                self.diario.parent.mkdir(parents=True, exist_ok=True)
+            self._arquivo_diario = open(self.diario, "a", encoding="utf-8")
+            self.registrar("inicio", raiz=raiz and os.path.abspath(raiz), formato=formato,
+                           ts=datetime.now(timezone.utc).isoformat(timespec="seconds"))
+
+    def novo_lote(self):
+        """Esquece as pastas já verificadas (o disco pode ter mudado entre lotes)."""
+        self._pastas.clear()
+
+    def ja_registrado(self, arquivo):
+        """Indica se o arquivo já foi movido ou dividido segundo o diário."""
+        return os.path.abspath(arquivo) in self._registrados
+
+    def ja_criado(self, origem, parte):
+        """
+        Arquivo já gravado no diário para uma parte de `origem`.
+
+        Args:
+            origem (str): PDF dividido ou .zip de onde a parte saiu
+            parte: Identificação da parte (1ª página do recibo ou nome do membro)
+
+        Returns:
+            tuple: (caminho gravado, bool indicando se o nome veio da extração),
+                ou None se a parte ainda não foi gravada
+        """
+        return self._criados.get((os.path.abspath(origem), parte))
+
+    def pasta_destino(self, resultado, padrao):
+        """
+        Pasta para onde o comprovante deve ir, criando-a se preciso.
+
+        Args:
+            resultado (ResultadoExtracao): Campos extraídos do comprovante
+            padrao (Path): Pasta usada sem `formato` ou sem data válida
+
+        Returns:
+            Path: Pasta de destino
+        """
+        data = self.formato and resultado is not None and data_extraida(resultado)
+        if not data:
+            return Path(padrao)
+        pasta = (self.raiz or Path(padrao)) / data.strftime(self.formato)
+        if pasta not in self._pastas:
+            faltando = []
+            atual = pasta
+            while not atual.is_dir():
+                faltando.append(atual)
+                atual = atual.parent
+            for nova in reversed(faltando):
+                nova.mkdir()
+                self.registrar("pasta", caminho=os.path.abspath(nova))
+            self._pastas.add(pasta)
+        return pasta
+
+    def registrar(self, acao, **campos):
+        """Acrescenta uma ação ao diário (se houver) e a grava imediatamente."""
+        if self._arquivo_diario is None:
+            return
+        for campo in ("origem", "destino"):
+            if campo in campos:
+                campos[campo] = os.path.abspath(campos[campo])
+        if acao == "mover":
+            self._registrados.add(campos["origem"])
+        elif acao == "criar" and "parte" in campos:
+            self._criados[campos["origem"], campos["parte"]] = (
+                Path(campos["destino"]), campos.get("extraido", True))
+        self._arquivo_diario.write(json.dumps(dict(acao=acao, **campos), ensure_ascii=False)
+                                   + "\n")
+        self._arquivo_diario.flush()
+
+    def fechar(self):
+        if self._arquivo_diario is not None:
+            self._arquivo_diario.close()
+            self._arquivo_diario = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+def _ler_diario(caminho):
+    """Entradas do diário posteriores ao último "desfeito"."""
+    entradas = []
+    with open(caminho, encoding="utf-8") as f:
+        for linha in f:
+            try:
+                entrada = json.loads(linha)
+            except ValueError:
+                # Linha incompleta de uma execução interrompida
+                continue
+            if entrada.get("acao") == "desfeito":
+                entradas = []
+            else:
+                entradas.append(entrada)
+    return entradas
+
+
+def desfazer_diario(caminho):
+    """
+    Desfaz os movimentos registrados em um diário, do último para o primeiro.
+
+    Arquivos movidos voltam ao caminho original, arquivos gravados pela
+    divisão são apagados e as pastas criadas são removidas se estiverem
+    vazias. Nenhum PDF é lido. Ao final, o diário recebe a marca "desfeito".
+
+    Args:
+        caminho (str): Arquivo do diário
+
+    Returns:
+        dict: Contadores "desfeitos" e "falhas"
+
+    Raises:
+        FileNotFoundError: Se o diário não existir
+    """
+    contagem = {"desfeitos": 0, "falhas": 0}
+    for entrada in reversed(_ler_diario(caminho)):
+        acao = entrada.get("acao")
+        try:
+            if acao == "mover":
+                origem, destino = Path(entrada["origem"]), Path(entrada["destino"])
+                if not destino.exists() or origem.exists():
+                    logger.warning("⚠️  Não foi possível desfazer %s -> %s", origem, destino)
+                    contagem["falhas"] += 1
+                    continue
+                origem.parent.mkdir(parents=True, exist_ok=True)
+                _mover_sem_sobrescrever(destino, origem)
+                logger.info("↩️  %s -> %s", destino.name, origem.name)
+            elif acao == "criar":
+                Path(entrada["destino"]).unlink()
+                logger.info("🗑️  Removido: %s", Path(entrada["destino"]).name)
+            elif acao == "pasta":
+                Path(entrada["caminho"]).rmdir()
+            else:
+                continue
+            contagem["desfeitos"] += 1
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            if acao == "pasta":
+                logger.debug("Pasta mantida (não está vazia): %s", entrada["caminho"])
+                continue
+            logger.error("❌ Erro ao desfazer %s: %s", entrada.get("destino"), e)
+            contagem["falhas"] += 1
+
+    with open(caminho, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"acao": "desfeito",
+                            "ts": datetime.now(timezone.utc).isoformat(timespec="seconds")})
+                + "\n")
+    logger.info("RESUMO: ↩️  Desfeitos: %d | ❌ Falhas: %d",
+                contagem["desfeitos"], contagem["falhas"], extra=contagem)
+    return contagem
+
+
+def _ja_tem_nome(nome_atual, nome_sugerido):
+    """Indica se o nome atual já é o sugerido (ou ele com um sufixo _N)."""
+    if nome_atual == nome_sugerido:
+        return True
+    base = nome_sugerido.replace('.pdf', '')
+    return (nome_atual.startswith(base + "_") and nome_atual.endswith(".pdf")
+            and nome_atual[len(base) + 1:-4].isdigit())
+
+
+def _renomear_arquivo(arquivo, nome_sugerido, alocador=None, organizador=None, resultado=None):
+    """
+    Renomeia um arquivo para o nome sugerido sem sobrescrever outro existente.
+
+    Args:
+        arquivo (Path): Arquivo original
+        nome_sugerido (str): Nome sugerido por processar_pdf
+        alocador (AlocadorNomes): Alocador compartilhado pelo lote (padrão:
+            um novo, que lista a pasta do arquivo)
+        organizador (Organizador): Move para a pasta da data e registra no diário
+        resultado (ResultadoExtracao): Campos extraídos (usados pelo organizador)
+
+    Returns:
+        Path: Novo caminho do arquivo ou None se não foi possível renomear
+    """
+    nome_original = arquivo.name
+    alocador = alocador or AlocadorNomes()
+
+    try:
+        pasta = organizador.pasta_destino(resultado, arquivo.parent) if organizador else None
+        if (pasta is None or pasta == arquivo.parent) and _ja_tem_nome(nome_original,
+                                                                      nome_sugerido):
+            logger.debug("Já está com o nome sugerido: %s", nome_original)
+            return arquivo
+        novo_caminho = alocador.mover(arquivo, nome_sugerido, pasta)
+        if organizador:
+            organizador.registrar("mover", origem=arquivo, destino=novo_caminho)
+        logger.info("✅ Renomeado: %s -> %s", nome_original,
+                    os.path.relpath(novo_caminho, arquivo.parent))
+        return novo_caminho
+    except Exception as e:
+        logger.error("❌ Erro ao renomear %s: %s", nome_original, e)
+        return None
+
+
+# Nome no formato DESCRICAO_VALOR_DATA.pdf gerado por este script
+_PADRAO_JA_RENOMEADO = re.compile(r".+_[\d.,]+_\d{2}_[a-z]{3}\.pdf", re.I)
+
+
+def _casa_algum(nome, relativo, padroes):
+    return any(fnmatch.fnmatch(nome, p) or fnmatch.fnmatch(relativo, p) for p in padroes)
+
+
+def percorrer_pdfs(pasta=".", recursivo=False, incluir=("*.pdf",), excluir=()):
+    """
+    Gera os arquivos da pasta à medida que são encontrados (os.scandir).
+
+    Cada diretório é listado e ordenado isoladamente, então a ordem é
+    determinística sem que a árvore inteira precise ser listada antes de o
+    primeiro arquivo ser processado. Links simbólicos para diretórios não
+    são seguidos.
+
+    Args:
+        pasta (str): Pasta raiz
+        recursivo (bool): Desce nas subpastas
+        incluir (tuple): Padrões fnmatch (nome ou caminho relativo) dos arquivos aceitos
+        excluir (tuple): Padrões de arquivos e subpastas a ignorar
+
+    Yields:
+        Path: Caminho de cada arquivo aceito
+    """
+    raiz = Path(pasta)
+    pilha = [raiz]
+    while pilha:
+        diretorio = pilha.pop()
+        try:
+            with os.scandir(diretorio) as entradas:
+                entradas = sorted(entradas, key=lambda e: e.name)
+        except OSError as e:
+            logger.warning("⚠️  Não foi possível listar %s: %s", diretorio, e)
+            continue
+
+        subpastas = []
+        for entrada in entradas:
+            relativo = Path(entrada.path).relative_to(raiz).as_posix()
+            if excluir and _casa_algum(entrada.name, relativo, excluir):
+                continue
+            if entrada.is_dir(follow_symlinks=False):
+                if recursivo:
+                    subpastas.append(Path(entrada.path))
+            elif entrada.is_file() and _casa_algum(entrada.name, relativo, incluir):
+                yield Path(entrada.path)
+        # Empilha em ordem reversa para visitar as subpastas em ordem alfabética
+        pilha.extend(reversed(subpastas))
+
+
+def _pendentes(arquivos, contagem, organizador=None, indice=None, repetir_falhas=False):
+    """
+    Conta os arquivos em contagem["total"] e gera os que precisam ser processados.
+
+    Com um IndiceProcessados, são pulados os arquivos que não mudaram desde a
+    última execução (ou, com repetir_falhas, todos menos os que falharam).
+    Sem índice, são pulados os nomes no formato gerado por este script.
+    """
+    for arquivo in arquivos:
+        contagem["total"] += 1
+        if indice is not None:
+            situacao = indice.situacao(arquivo)
+            if repetir_falhas and situacao not in ("falha", "desconhecido"):
+                continue
+            if not repetir_falhas and situacao is not None:
+                logger.debug("⏭️  Pulando (%s, sem mudanças): %s", situacao, arquivo.name)
+                continue
+        elif _PADRAO_JA_RENOMEADO.match(arquivo.name):
+            # Pular se já parece ter sido renomeado
+            logger.debug("⏭️  Pulando (já renomeado): %s", arquivo.name)
+            continue
+        if organizador and organizador.ja_registrado(arquivo):
+            logger.debug("⏭️  Pulando (já registrado no diário): %s", arquivo.name)
+            continue
+        yield arquivo
+
+
+def _separar_zips(arquivos, zips):
+    """Gera os arquivos que não são .zip, guardando os .zip na lista `zips`."""
+    for arquivo in arquivos:
+        if arquivo.suffix.lower() != ".zip":
+            yield arquivo
+        elif _PADRAO_REEMPACOTADO.search(arquivo.name):
+            logger.debug("⏭️  Pulando (já reempacotado): %s", arquivo.name)
+        else:
+            zips.append(arquivo)
+
+
+def _processar_arquivos(arquivos, workers=1, cache=None, opcoes=None, dividir=False,
+                        organizador=None, indice=None, repetir_falhas=False, livro=None,
+                        duplicatas=None, saida_zip=None, reempacotar=False):
+    """
+    Extrai e renomeia uma sequência de arquivos.
+
+    Args:
+        arquivos (iterable): Path dos PDFs (pode ser um gerador)
+        workers (int): Número de processos para extração
+        cache (CacheExtracao): Cache de extração opcional
+        opcoes (OpcoesExtracao): Opções de extração
+        dividir (bool): Separa PDFs com vários comprovantes (ver dividir_arquivos)
+        organizador (Organizador): Pastas por data e diário de movimentos
+        indice (IndiceProcessados): Índice dos arquivos já processados
+        repetir_falhas (bool): Processa só os arquivos que falharam antes
+        livro (LivroComprovantes): Livro onde registrar os comprovantes renomeados
+        duplicatas (DetectorDuplicatas): Detecção de comprovantes repetidos
+            (não usada com `dividir`)
+        saida_zip (str): Pasta onde gravar os PDFs de dentro de arquivos .zip
+        reempacotar (bool): Grava um novo .zip em vez de PDFs soltos
+
+    Returns:
+        dict: Contadores "processados", "falhas", "total", "duplicatas" e os
+            novos caminhos em "renomeados"
+    """
+    contagem = {"processados": 0, "falhas": 0, "total": 0, "duplicatas": 0, "renomeados": []}
+    if organizador:
+        organizador.novo_lote()
+    zips = []
+    pendentes = _separar_zips(_pendentes(arquivos, contagem, organizador, indice, repetir_falhas),
+                              zips)
+    alocador = AlocadorNomes()
+
+    if dividir:
+        divididos = dividir_arquivos(pendentes, workers, opcoes, organizador=organizador,
+                                     indice=indice, livro=livro)
+        divididos.update(total=contagem["total"], duplicatas=0)
+        contagem = divididos
+    else:
+        _renomear_extraidos(pendentes, contagem, workers, cache, opcoes, alocador, organizador,
+                            indice, livro, duplicatas)
+
+    # Os .zip encontrados na varredura são processados depois dos PDFs soltos
+    for caminho_zip in zips:
+        parcial = processar_zip(caminho_zip, saida_zip, opcoes, reempacotar, alocador,
+                                organizador, livro, duplicatas, indice)
+        for chave in ("processados", "falhas", "duplicatas", "renomeados"):
+            contagem[chave] += parcial[chave]
+        # O .zip já foi contado como um arquivo; valem os PDFs de dentro dele
+        contagem["total"] += parcial["total"] - 1
+    return contagem
+
+
+def _renomear_extraidos(pendentes, contagem, workers, cache, opcoes, alocador, organizador,
+                        indice, livro, duplicatas):
+    """Extrai e renomeia os PDFs de `pendentes`, atualizando `contagem`."""
+    for arquivo, nome_sugerido, resultado in _extrair_nomes(pendentes, workers, cache, opcoes):
+        original = nome_sugerido and duplicatas and duplicatas.original(arquivo, resultado)
+        if original:
+            contagem["duplicatas"] += 1
+            token = _arquivo_atual.set(str(arquivo))
+            try:
+                renomear, quarentena = duplicatas.tratar(arquivo, original, alocador)
+            except OSError as e:
+                logger.error("❌ Erro ao mover duplicata %s: %s", arquivo.name, e)
+                renomear, quarentena = False, None
+            finally:
+                _arquivo_atual.reset(token)
+            if not renomear:
+                if indice is not None:
+                    indice.registrar(quarentena or arquivo, "duplicata", anterior=arquivo)
+                continue
+
+        with _medir(arquivo, "renomear"):
+            novo_caminho = nome_sugerido and _renomear_arquivo(arquivo, nome_sugerido, alocador,
+                                                               organizador, resultado)
+        if novo_caminho:
+            contagem["processados"] += 1
+            contagem["renomeados"].append(novo_caminho)
+        else:
+            contagem["falhas"] += 1
+        with _medir(arquivo, "registros"):
+            if novo_caminho and duplicatas and not original:
+                duplicatas.registrar(novo_caminho, resultado)
+            if novo_caminho and livro is not None:
+                livro.registrar(novo_caminho, resultado)
+            if indice is not None:
+                if novo_caminho:
+                    indice.registrar(novo_caminho, "renomeado", nome_sugerido, anterior=arquivo)
+                elif resultado is not None and resultado.tipo not in LAYOUTS:
+                    indice.registrar(arquivo, "desconhecido")
+                else:
+                    indice.registrar(arquivo, "falha", nome_sugerido)
+
+
+def _registrar_resumo(contagem):
+    mensagem = "RESUMO: ✅ Processados com sucesso: %d | ❌ Falhas: %d | 📊 Total: %d"
+    argumentos = [contagem["processados"], contagem["falhas"], contagem["total"]]
+    extra = {"processados": contagem["processados"], "falhas": contagem["falhas"],
+             "total": contagem["total"]}
+    if contagem.get("duplicatas"):
+        mensagem += " | 🔁 Duplicatas: %d"
+        argumentos.append(contagem["duplicatas"])
+        extra["duplicatas"] = contagem["duplicatas"]
+    logger.info(mensagem, *argumentos, extra=extra)
+
+
+def renomear_arquivos_na_pasta(pasta=".", workers=1, cache=None, opcoes=None,
+                               recursivo=False, incluir=("*.pdf",), excluir=(), dividir=False,
+                               organizador=None, indice=None, repetir_falhas=False,
+                               livro=None, duplicatas=None, saida_zip=None,
+                               reempacotar=False):
+    """
+    Renomeia todos os arquivos PDF na pasta especificada.
+
+    Os arquivos são processados à medida que a pasta é percorrida. A extração
+    pode rodar em paralelo (workers > 1), mas a renomeação é feita sempre por
+    este processo, na ordem da listagem, para que os nomes finais (inclusive
+    os sufixos _1, _2...) sejam determinísticos.
+
+    Args:
+        pasta (str): Caminho da pasta a processar (padrão: pasta atual)
+        workers (int): Número de processos para extração (padrão: 1)
+        cache (CacheExtracao): Cache de extração opcional
+        opcoes (OpcoesExtracao): Opções de extração
+        recursivo (bool): Processa também as subpastas
+        incluir (tuple): Padrões dos arquivos a processar (padrão: *.pdf)
+        excluir (tuple): Padrões de arquivos e subpastas a ignorar
+        dividir (bool): Separa PDFs com vários comprovantes em um arquivo por
+            comprovante (o cache não é usado neste modo)
+        organizador (Organizador): Move os comprovantes para pastas por data
+            e/ou registra os movimentos em um diário
+        indice (IndiceProcessados): Pula os arquivos que não mudaram desde a
+            última execução (sem ele, pula os nomes já no formato do script)
+        repetir_falhas (bool): Com `indice`, processa só os que falharam antes
+        livro (LivroComprovantes): Registra os campos de cada comprovante renomeado
+        duplicatas (DetectorDuplicatas): Reporta, pula ou isola os comprovantes
+            que já foram renomeados antes
+        saida_zip (str): Pasta de saída dos PDFs de dentro de arquivos .zip
+            incluídos na varredura (padrão: a pasta do .zip; ver processar_zip)
+        reempacotar (bool): Grava um novo .zip em vez de PDFs soltos
+    """
+    logger.info("📁 Procurando PDFs em %s", Path(pasta).resolve())
+    if duplicatas:
+        excluir = tuple(excluir) + duplicatas.excluir_quarentena(pasta)
+    arquivos = percorrer_pdfs(pasta, recursivo, incluir, excluir)
+    contagem = _processar_arquivos(arquivos, workers, cache, opcoes, dividir, organizador,
+                                   indice, repetir_falhas, livro, duplicatas, saida_zip,
+                                   reempacotar)
+
+    if not contagem["total"]:
+        logger.info("Nenhum arquivo PDF encontrado na pasta.")
+        return
+
+    _registrar_resumo(contagem)
+
+
+# Campos de cada entrada do manifesto gerado por planejar_pasta()
+CAMPOS_MANIFESTO = ("origem", "hash", "tamanho", "tipo", "descricao", "valor", "data", "nome")
+
+
+def _formato_manifesto(caminho):
+    return "csv" if str(caminho).lower().endswith(".csv") else "jsonl"
+
+
+def planejar_pasta(pasta, manifesto, workers=1, cache=None, opcoes=None, recursivo=False,
+                   incluir=("*.pdf",), excluir=()):
+    """
+    Extrai os campos dos PDFs da pasta e grava um manifesto, sem renomear nada.
+
+    O manifesto tem uma entrada por arquivo (CAMPOS_MANIFESTO), em JSON (uma
+    linha por arquivo) ou CSV se o nome terminar em .csv. "nome" fica vazio
+    quando a extração falha. O manifesto pode ser revisado ou editado antes de
+    ser aplicado por aplicar_manifesto().
+
+    Args:
+        pasta (str): Pasta com os PDFs
+        manifesto (str): Arquivo de saída
+        workers (int): Número de processos para extração
+        cache (CacheExtracao): Cache de extração opcional
+        opcoes (OpcoesExtracao): Opções de extração
+        recursivo (bool): Processa também as subpastas
+        incluir (tuple): Padrões dos arquivos a processar
+        excluir (tuple): Padrões de arquivos e subpastas a ignorar
+
+    Returns:
+        dict: Contadores "processados", "falhas" e "total"
+    """
+    contagem = {"processados": 0, "falhas": 0, "total": 0}
+    formato = _formato_manifesto(manifesto)
+    logger.info("📁 Procurando PDFs em %s", Path(pasta).resolve())
+    arquivos = _pendentes(percorrer_pdfs(pasta, recursivo, incluir, excluir), contagem)
+    # Com a leitura antecipada, o hash do manifesto sai do mesmo conteúdo
+    # lido para a extração, sem ler cada arquivo duas vezes
+    opcoes = opcoes or OpcoesExtracao()
+    if opcoes.leitura_antecipada <= 0:
+        opcoes = opcoes.substituir(leitura_antecipada=1)
+    hashes = {}
+
+    with open(manifesto, "w", encoding="utf-8", newline="") as f:
+        escritor = None
+        if formato == "csv":
+            escritor = csv.DictWriter(f, CAMPOS_MANIFESTO)
+            escritor.writeheader()
+        for arquivo, nome, resultado in _extrair_nomes(arquivos, workers, cache, opcoes,
+                                                       hashes):
+            resumo = hashes.pop(arquivo, None)
+            try:
+                tamanho = arquivo.stat().st_size
+            except OSError:
+                resumo = None
+            if resumo is None:
+                logger.error("❌ Erro ao ler %s", arquivo.name)
+                contagem["falhas"] += 1
+                continue
+            entrada = {"origem": os.path.abspath(arquivo), "hash": resumo, "tamanho": tamanho}
+            campos = resultado[:4] if resultado else (None,) * 4
+            entrada.update(zip(("tipo", "descricao", "valor", "data"), campos), nome=nome or "")
+            if escritor:
+                escritor.writerow(entrada)
+            else:
+                f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+            contagem["processados" if nome else "falhas"] += 1
+
+    logger.info("📝 Manifesto gravado em %s", manifesto)
+    return contagem
+
+
+def ler_manifesto(manifesto):
+    """
+    Lê as entradas de um manifesto JSON-lines ou CSV, uma a uma.
+
+    Yields:
+        dict: Entrada com os campos de CAMPOS_MANIFESTO
+    """
+    with open(manifesto, encoding="utf-8", newline="") as f:
+        if _formato_manifesto(manifesto) == "csv":
+            yield from csv.DictReader(f)
+            return
+        for numero, linha in enumerate(f, 1):
+            if linha.strip():
+                try:
+                    yield json.loads(linha)
+                except ValueError as e:
+                    raise ValueError(f"{manifesto}:{numero}: linha inválida ({e})") from None
+
+
+def aplicar_manifesto(manifesto, organizador=None, livro=None):
+    """
+    Renomeia os arquivos conforme um manifesto, sem abrir nenhum PDF.
+
+    Entradas com "nome" vazio são ignoradas; o nome pode ter sido editado à
+    mão, mas não pode apontar para outra pasta (com separadores, ".." ou
+    caminho absoluto): essas entradas, e as sem origem ou com um tamanho que
+    não é um número inteiro, contam como falha e as demais são aplicadas.
+    Arquivos que não existem mais (por exemplo, numa segunda aplicação do
+    mesmo manifesto) ou cujo tamanho mudou desde o plano são pulados.
+
+    Args:
+        manifesto (str): Arquivo gerado por planejar_pasta()
+        organizador (Organizador): Pastas por data e diário de movimentos
+        livro (LivroComprovantes): Registra os campos de cada comprovante
+            renomeado (com o hash do manifesto)
+
+    Returns:
+        dict: Contadores "processados", "falhas", "total" e os novos caminhos
+            em "renomeados"
+    """
+    contagem = {"processados": 0, "falhas": 0, "total": 0, "renomeados": []}
+    if organizador:
+        organizador.novo_lote()
+    alocador = AlocadorNomes()
+
+    for entrada in ler_manifesto(manifesto):
+        contagem["total"] += 1
+        nome = entrada.get("nome")
+        if not nome:
+            continue
+        if not entrada.get("origem"):
+            logger.error("❌ Entrada %d sem origem; ignorada", contagem["total"])
+            contagem["falhas"] += 1
+            continue
+        arquivo = Path(entrada["origem"])
+        if nome in (".", "..") or nome != os.path.basename(nome):
+            logger.error("❌ Nome inválido para %s (não pode conter pastas): %s",
+                         arquivo.name, nome)
+            contagem["falhas"] += 1
+            continue
+        tamanho_plano = entrada.get("tamanho")
+        if tamanho_plano not in (None, ""):
+            try:
+                tamanho_plano = int(tamanho_plano)
+            except (TypeError, ValueError):
+                logger.error("❌ Tamanho inválido para %s: %r; entrada ignorada",
+                             arquivo.name, tamanho_plano)
+                contagem["falhas"] += 1
+                continue
+        try:
+            tamanho = arquivo.stat().st_size
+        except FileNotFoundError:
+            logger.debug("⏭️  Pulando (não encontrado, já aplicado?): %s", arquivo)
+            continue
+        if tamanho_plano not in (None, "") and tamanho_plano != tamanho:
+            logger.warning("⚠️  %s mudou desde o plano; gere o manifesto de novo", arquivo.name)
+            contagem["falhas"] += 1
+            continue
+        if arquivo.name == nome and not organizador:
+            continue
+
+        resultado = ResultadoExtracao(entrada.get("tipo"), entrada.get("descricao"),
+                                      entrada.get("valor"), entrada.get("data"), "")
+        novo_caminho = _renomear_arquivo(arquivo, nome, alocador, organizador, resultado)
+        if novo_caminho:
+            contagem["processados"] += 1
+            contagem["renomeados"].append(novo_caminho)
+            if livro is not None:
+                livro.registrar(novo_caminho, resultado, entrada.get("hash"))
+        else:
+            contagem["falhas"] += 1
+    return contagem
+
+
+Recibo = namedtuple("Recibo", "paginas resultado")
+
+# Extensão dada ao PDF original depois de dividido, para não ser lido de novo
+SUFIXO_DIVIDIDO = ".dividido"
+
+
+def planejar_divisao(caminho_pdf, opcoes=None):
+    """
+    Separa um PDF com vários comprovantes em recibos, lendo página a página.
+
+    Cada página em que algum tipo de comprovante é reconhecido começa um
+    recibo novo; páginas sem marcador são continuação do recibo anterior.
+    Só o texto do recibo atual fica em memória.
+
+    Args:
+        caminho_pdf (str): Caminho do arquivo PDF
+        opcoes (OpcoesExtracao): Opções de extração
+
+    Returns:
+        list: Um Recibo (índices das páginas, ResultadoExtracao sem o texto)
+            para cada comprovante encontrado
+    """
+    opcoes = opcoes or OpcoesExtracao()
+    recibos = []
+    paginas, partes, tipo_atual = [], [], None
+
+    def fechar_recibo():
+        layout = LAYOUTS.get(tipo_atual)
+        campos = extrair_campos(layout, "".join(partes)) if layout else (None, None, None)
+        recibos.append(Recibo(tuple(paginas), ResultadoExtracao(tipo_atual, *campos, "")))
+
+    paginas_pdf = _paginas_pdfplumber(caminho_pdf, opcoes.max_paginas)
+    if opcoes.max_rss_mb:
+        paginas_pdf = _vigiar_memoria(paginas_pdf, opcoes.max_rss_mb)
+    for i, texto_pagina in enumerate(paginas_pdf):
+        texto_pagina += "\n"
+        tipo = classificar_comprovante(texto_pagina, opcoes.janela_cabecalho).tipo
+        if paginas and tipo != "desconhecido":
+            fechar_recibo()
+            paginas, partes = [], []
+        if not paginas:
+            tipo_atual = tipo
+        paginas.append(i)
+        partes.append(texto_pagina)
+    if paginas:
+        fechar_recibo()
+    return recibos
+
+
+def gravar_recibos(caminho_pdf, recibos, destino=None, alocador=None, organizador=None):
+    """
+    Grava cada recibo como um PDF próprio chamado DESCRICAO_VALOR_DATA.pdf.
+
+    Recibos cujos campos não foram encontrados são gravados como
+    <original>_pagina_NNN.pdf, para que nenhuma página se perca.
+
+    Args:
+        caminho_pdf (str): PDF de origem
+        recibos (list): Recibos retornados por planejar_divisao()
+        destino (str): Pasta de saída (padrão: a pasta do PDF de origem)
+        alocador (AlocadorNomes): Alocador compartilhado pelo lote
+        organizador (Organizador): Pastas por data e diário de movimentos
+
+    Returns:
+        list: (caminho gravado, bool indicando se o nome veio da extração)
+    """
+    origem = Path(caminho_pdf)
+    destino = Path(destino) if destino else origem.parent
+    alocador = alocador or AlocadorNomes()
+    gravados = []
+    with open(origem, "rb") as f:
+        leitor = _pypdf2().PdfReader(f)
+        for recibo in recibos:
+            parte = recibo.paginas[0] + 1
+            gravado = organizador and organizador.ja_criado(origem, parte)
+            if gravado:
+                logger.info("⏭️  Páginas %d-%d já gravadas em %s (diário)", parte,
+                            recibo.paginas[-1] + 1, gravado[0].name)
+                gravados.append(gravado)
+                continue
+            nome = montar_nome_sugerido(recibo.resultado)
+            extraido = nome is not None
+            if not extraido:
+                nome = f"{origem.stem}_pagina_{recibo.paginas[0] + 1:03d}.pdf"
+
+            escritor = _pypdf2().PdfWriter()
+            for i in recibo.paginas:
+                escritor.add_page(leitor.pages[i])
+            pasta = destino
+            if organizador and extraido:
+                pasta = organizador.pasta_destino(recibo.resultado, destino)
+            novo_caminho, saida = alocador.criar(pasta, nome)
+            with saida:
+                escritor.write(saida)
+            if organizador:
+                organizador.registrar("criar", origem=origem, destino=novo_caminho, parte=parte,
+                                      extraido=extraido)
+            # As páginas já foram copiadas: libera os objetos lidos até aqui
+            leitor.resolved_objects.clear()
+
+            logger.info("✅ Páginas %d-%d gravadas em %s", recibo.paginas[0] + 1,
+                        recibo.paginas[-1] + 1, os.path.relpath(novo_caminho, destino))
+            gravados.append((novo_caminho, extraido))
+    return gravados
+
+
+def dividir_arquivos(arquivos, workers=1, opcoes=None, destino=None, organizador=None,
+                     indice=None, livro=None):
+    """
+    Divide cada PDF em um arquivo por comprovante.
+
+    Arquivos com um único comprovante são apenas renomeados. Os demais são
+    divididos e o original recebe a extensão SUFIXO_DIVIDIDO. O planejamento
+    (leitura das páginas) pode rodar em paralelo; a gravação é feita por este
+    processo, na ordem de entrada.
+
+    Args:
+        arquivos (iterable): Path dos PDFs (pode ser um gerador)
+        workers (int): Número de processos para leitura dos PDFs
+        opcoes (OpcoesExtracao): Opções de extração
+        destino (str): Pasta de saída dos recibos (padrão: a do original)
+        organizador (Organizador): Pastas por data e diário de movimentos
+        indice (IndiceProcessados): Registra os arquivos gravados e as falhas
+        livro (LivroComprovantes): Registra os campos de cada recibo gravado
+
+    Returns:
+        dict: Contadores "processados", "falhas", "total" e os caminhos
+            gravados em "renomeados"
+    """
+    contagem = {"processados": 0, "falhas": 0, "total": 0, "renomeados": []}
+    alocador = AlocadorNomes()
+
+    def planejados():
+        if workers <= 1:
+            for arquivo in arquivos:
+                yield arquivo, _planejar_com_log(arquivo, opcoes)
+            return
+        nivel_log = logger.getEffectiveLevel()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            def submeter(arquivo):
+                return executor.submit(_chamar_capturando_log, _planejar_com_log, nivel_log,
+                                       arquivo, opcoes)
+            for arquivo, futuro in _em_ordem(arquivos, submeter, workers * 4):
+                recibos, registros = futuro.result()
+                _emitir_log(registros)
+                yield arquivo, recibos
+
+    for arquivo, recibos in planejados():
+        contagem["total"] += 1
+        if not recibos:
+            contagem["falhas"] += 1
+            if indice is not None:
+                indice.registrar(arquivo, "falha")
+            continue
+        token = _arquivo_atual.set(str(arquivo))
+        try:
+            if len(recibos) == 1 and destino is None:
+                nome = montar_nome_sugerido(recibos[0].resultado)
+                novo_caminho = nome and _renomear_arquivo(arquivo, nome, alocador, organizador,
+                                                          recibos[0].resultado)
+                gravados = [(novo_caminho, True)] if novo_caminho else []
+            else:
+                gravados = gravar_recibos(arquivo, recibos, destino, alocador, organizador)
+                dividido = arquivo.with_name(arquivo.name + SUFIXO_DIVIDIDO)
+                arquivo.rename(dividido)
+                if organizador:
+                    organizador.registrar("mover", origem=arquivo, destino=dividido)
+        except Exception as e:
+            logger.error("❌ Erro ao dividir %s: %s", arquivo.name, e,
+                         exc_info=logger.isEnabledFor(logging.DEBUG))
+            gravados = []
+        finally:
+            _arquivo_atual.reset(token)
+
+        if not gravados:
+            contagem["falhas"] += 1
+        # gravados está na mesma ordem de recibos
+        for (caminho, extraido), recibo in zip(gravados, recibos):
+            contagem["renomeados"].append(caminho)
+            contagem["processados" if extraido else "falhas"] += 1
+            if livro is not None and extraido:
+                livro.registrar(caminho, recibo.resultado)
+            if indice is not None:
+                indice.registrar(caminho, "renomeado" if extraido else "falha")
+    return contagem
+
+
+def _planejar_com_log(arquivo, opcoes):
+    """Executa planejar_divisao registrando o progresso e os erros no log."""
+    token = _arquivo_atual.set(str(arquivo))
+    logger.info("📄 Lendo comprovantes de: %s", arquivo)
+    try:
+        recibos = planejar_divisao(str(arquivo), opcoes)
+        logger.info("🔎 %d comprovante(s) em %s", len(recibos), arquivo.name)
+        return recibos
+    except ArquivoRecusado as e:
+        logger.error("🚫 Arquivo ignorado: %s", e)
+        return []
+    except Exception as e:
+        logger.error("❌ Erro ao processar PDF: %s", e,
+                     exc_info=logger.isEnabledFor(logging.DEBUG))
+        return []
+    finally:
+        _arquivo_atual.reset(token)
+
+
+# Extensão dada ao .zip depois de processado, para não ser lido de novo
+SUFIXO_EXTRAIDO = ".extraido"
+
+# Final do nome dos .zip gravados com reempacotar=True (não são lidos de novo)
+SUFIXO_REEMPACOTADO = ".renomeado.zip"
+
+# O mesmo final com o sufixo _N que o AlocadorNomes põe quando o nome já existe
+_PADRAO_REEMPACOTADO = re.compile(r"\.renomeado(?:_\d+)?\.zip$", re.IGNORECASE)
+
+# Membros maiores que isto passam da memória para um arquivo temporário
+_LIMITE_MEMBRO_EM_MEMORIA = 32 * 1024 * 1024
+
+
+def processar_zip(caminho_zip, destino=None, opcoes=None, reempacotar=False, alocador=None,
+                  organizador=None, livro=None, duplicatas=None, indice=None):
+    """
+    Renomeia os PDFs de dentro de um .zip sem extraí-lo para o disco.
+
+    Cada membro .pdf é lido para a memória (ou para um arquivo temporário, se
+    passar de 32 MB), processado e gravado já com o nome sugerido em
+    `destino`; só um membro fica aberto por vez, então o uso de memória não
+    depende do tamanho do .zip. Membros cujos campos não foram encontrados são
+    gravados com o nome original, para que nenhum comprovante se perca. Com
+    `reempacotar`, os membros vão para um novo <nome>.renomeado.zip em vez de
+    PDFs soltos. No final, o .zip original recebe a extensão SUFIXO_EXTRAIDO.
+
+    Args:
+        caminho_zip (str): Arquivo .zip
+        destino (str): Pasta de saída (padrão: a pasta do .zip)
+        opcoes (OpcoesExtracao): Opções de extração
+        reempacotar (bool): Grava um .zip com os membros renomeados
+        alocador (AlocadorNomes): Alocador compartilhado pelo lote
+        organizador (Organizador): Pastas por data (só sem reempacotar) e diário
+        livro (LivroComprovantes): Registra os comprovantes gravados
+        duplicatas (DetectorDuplicatas): Detecção de comprovantes repetidos
+        indice (IndiceProcessados): Registra os PDFs gravados, como os soltos
+
+    Returns:
+        dict: Contadores "processados", "falhas", "total", "duplicatas" e os
+            caminhos gravados em "renomeados"
+    """
+    caminho_zip = Path(caminho_zip)
+    destino = Path(destino) if destino else caminho_zip.parent
+    destino.mkdir(parents=True, exist_ok=True)
+    alocador = alocador or AlocadorNomes()
+    contagem = {"processados": 0, "falhas": 0, "total": 0, "duplicatas": 0, "renomeados": []}
+    logger.info("🗜️  Lendo %s", caminho_zip)
+
+    try:
+        with zipfile.ZipFile(caminho_zip) as origem, contextlib.ExitStack() as pilha:
+            saida = None
+            if reempacotar:
+                caminho_saida, arquivo_saida = alocador.criar(
+                    destino, caminho_zip.stem + SUFIXO_REEMPACOTADO)
+                pilha.enter_context(arquivo_saida)
+                if organizador:
+                    organizador.registrar("criar", origem=caminho_zip, destino=caminho_saida)
+                saida = pilha.enter_context(
+                    zipfile.ZipFile(arquivo_saida, "w", zipfile.ZIP_DEFLATED))
+                nomes_saida = set()
+            for info in origem.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(".pdf"):
+                    continue
+                contagem["total"] += 1
+                gravado = saida is None and organizador and organizador.ja_criado(
+                    caminho_zip, info.filename)
+                if gravado:
+                    logger.info("⏭️  %s já gravado em %s (diário)", info.filename,
+                                gravado[0].name)
+                    contagem["renomeados"].append(gravado[0])
+                    contagem["processados" if gravado[1] else "falhas"] += 1
+                    continue
+                with tempfile.SpooledTemporaryFile(_LIMITE_MEMBRO_EM_MEMORIA) as membro:
+                    with origem.open(info) as f:
+                        shutil.copyfileobj(f, membro, 1024 * 1024)
+                    nome, resultado = _processar_membro_zip(caminho_zip, info.filename,
+                                                            membro, opcoes)
+                    original = nome and duplicatas and duplicatas.original(
+                        caminho_zip / info.filename, resultado)
+                    membro.seek(0)
+                    if original:
+                        contagem["duplicatas"] += 1
+                        logger.warning("🔁 %s é duplicata de %s", info.filename, original)
+                        if duplicatas.acao == "pular":
+                            continue
+                        if duplicatas.acao == "quarentena":
+                            pasta = duplicatas.quarentena or destino / PASTA_DUPLICATAS
+                            pasta.mkdir(parents=True, exist_ok=True)
+                            caminho, arquivo = alocador.criar(
+                                pasta, posixpath.basename(info.filename))
+                            with arquivo:
+                                shutil.copyfileobj(membro, arquivo, 1024 * 1024)
+                            if organizador:
+                                organizador.registrar("criar", origem=caminho_zip,
+                                                      destino=caminho)
+                            if indice is not None:
+                                indice.registrar(caminho, "duplicata")
+                            continue
+                    if saida is not None:
+                        caminho = _gravar_membro_zip(saida, nomes_saida, info,
+                                                     nome or posixpath.basename(info.filename),
+                                                     membro)
+                    else:
+                        pasta = destino
+                        if nome and organizador:
+                            pasta = organizador.pasta_destino(resultado, destino)
+                        caminho, arquivo = alocador.criar(
+                            pasta, nome or posixpath.basename(info.filename))
+                        with arquivo:
+                            shutil.copyfileobj(membro, arquivo, 1024 * 1024)
+                        if organizador:
+                            organizador.registrar("criar", origem=caminho_zip, destino=caminho,
+                                                  parte=info.filename, extraido=bool(nome))
+                        if indice is not None:
+                            # Como os PDFs soltos, para não ser lido de novo na próxima execução
+                            if nome:
+                                situacao = "renomeado"
+                            elif resultado is not None and resultado.tipo not in LAYOUTS:
+                                situacao = "desconhecido"
+                            else:
+                                situacao = "falha"
+                            indice.registrar(caminho, situacao, nome)
+                        contagem["renomeados"].append(caminho)
+                if nome:
+                    logger.info("✅ %s -> %s", info.filename, caminho)
+                    contagem["processados"] += 1
+                    if duplicatas and not original:
+                        # Com reempacotar, o comprovante só existe dentro do .zip gravado
+                        duplicatas.registrar(caminho if saida is None else caminho_saida,
+                                             resultado)
+                    if livro is not None and saida is None:
+                        livro.registrar(caminho, resultado)
+                else:
+                    contagem["falhas"] += 1
+            if saida is not None:
+                contagem["renomeados"].append(caminho_saida)
+                if indice is not None:
+                    indice.registrar(caminho_saida, "renomeado")
+        extraido = caminho_zip.with_name(caminho_zip.name + SUFIXO_EXTRAIDO)
+        caminho_zip.rename(extraido)
+        if organizador:
+            organizador.registrar("mover", origem=caminho_zip, destino=extraido)
+    except (OSError, zipfile.BadZipFile) as e:
+        logger.error("❌ Erro ao processar %s: %s", caminho_zip.name, e,
+                     exc_info=logger.isEnabledFor(logging.DEBUG))
+        contagem["falhas"] += 1
+        contagem["total"] = max(contagem["total"], 1)
+    return contagem
+
+
+def _processar_membro_zip(caminho_zip, nome_membro, membro, opcoes):
+    """Extrai os campos de um membro já copiado; devolve (nome sugerido, resultado)."""
+    token = _arquivo_atual.set(f"{caminho_zip}/{nome_membro}")
+    logger.info("📄 Processando: %s", nome_membro)
+    try:
+        resultado = extrair_resultado(membro, opcoes)
+        return montar_nome_sugerido(resultado), resultado
+    except Exception as e:
+        logger.error("❌ Erro ao processar PDF: %s", e,
+                     exc_info=logger.isEnabledFor(logging.DEBUG))
+        return None, None
+    finally:
+        _arquivo_atual.reset(token)
+
+
+def _gravar_membro_zip(saida, nomes_saida, info, nome, membro):
+    """Copia um membro para o .zip de saída com um nome ainda não usado nele."""
+    pasta = posixpath.dirname(info.filename)
+    base, extensao = os.path.splitext(nome)
+    candidato, contador = nome, 1
+    while posixpath.join(pasta, candidato) in nomes_saida:
+        candidato = f"{base}_{contador}{extensao}"
+        contador += 1
+    caminho = posixpath.join(pasta, candidato)
+    nomes_saida.add(caminho)
+    novo_info = zipfile.ZipInfo(caminho, info.date_time)
+    novo_info.compress_type = zipfile.ZIP_DEFLATED
+    with saida.open(novo_info, "w") as f:
+        shutil.copyfileobj(membro, f, 1024 * 1024)
+    return caminho
+
+
+class _ObservadorPasta:
+    """
+    Detecta arquivos novos em uma árvore sem listá-la inteira a cada ciclo.
+
+    Só os diretórios cujo mtime mudou (entrada criada, removida ou renomeada)
+    são listados novamente. Um arquivo novo só é entregue depois de ficar
+    `debounce` segundos sem mudar de tamanho nem de mtime, para não pegar
+    PDFs que ainda estão sendo gravados.
+    """
+
+    def __init__(self, pasta, recursivo=False, incluir=("*.pdf",), excluir=(), debounce=5.0):
+        self.raiz = Path(pasta)
+        self.recursivo = recursivo
+        self.incluir = incluir
+        self.excluir = excluir
+        self.debounce = debounce
+        self._diretorios = {}   # diretório -> (mtime_ns, nomes conhecidos)
+        self._candidatos = {}   # arquivo -> (tamanho, mtime_ns, visto estável desde)
+        self._varrer(self.raiz, inicial=True)
+
+    def ignorar(self, caminho):
+        """Marca um caminho como conhecido (ex.: o nome dado ao renomear)."""
+        caminho = Path(caminho)
+        registro = self._diretorios.get(caminho.parent)
+        if registro:
+            registro[1].add(caminho.name)
+
+    def _varrer(self, diretorio, inicial=False):
+        try:
+            mtime = diretorio.stat().st_mtime_ns
+            with os.scandir(diretorio) as entradas:
+                entradas = list(entradas)
+        except OSError:
+            self._diretorios.pop(diretorio, None)
+            return
+        _, conhecidos = self._diretorios.get(diretorio, (None, set()))
+        nomes = set()
+        for entrada in entradas:
+            nomes.add(entrada.name)
+            if entrada.name in conhecidos:
+                continue
+            relativo = Path(entrada.path).relative_to(self.raiz).as_posix()
+            if self.excluir and _casa_algum(entrada.name, relativo, self.excluir):
+                continue
+            caminho = Path(entrada.path)
+            if entrada.is_dir(follow_symlinks=False):
+                if self.recursivo:
+                    self._varrer(caminho, inicial)
+            elif not inicial and _casa_algum(entrada.name, relativo, self.incluir):
+                self._candidatos.setdefault(caminho, (None, None, None))
+        self._diretorios[diretorio] = (mtime, nomes)
+
+    def novos_arquivos(self):
+        """
+        Verifica mudanças e retorna os arquivos novos que já estão estáveis.
+
+        Returns:
+            list: Path dos arquivos prontos para processamento, em ordem
+        """
+        for diretorio, (mtime, _) in list(self._diretorios.items()):
+            try:
+                atual = diretorio.stat().st_mtime_ns
+            except OSError:
+                self._diretorios.pop(diretorio, None)
+                continue
+            if atual != mtime:
+                self._varrer(diretorio)
+
+        prontos = []
+        agora = time.monotonic()
+        for caminho, (tamanho, mtime, desde) in list(self._candidatos.items()):
+            try:
+                info = caminho.stat()
+            except OSError:
+                del self._candidatos[caminho]
+                continue
+            if (info.st_size, info.st_mtime_ns) != (tamanho, mtime):
+                self._candidatos[caminho] = (info.st_size, info.st_mtime_ns, agora)
+            elif agora - desde >= self.debounce:
+                del self._candidatos[caminho]
+                prontos.append(caminho)
+        return sorted(prontos)
+
+
+def observar_pasta(pasta=".", workers=1, cache=None, opcoes=None, recursivo=False,
+                   incluir=("*.pdf",), excluir=(), intervalo=2.0, debounce=5.0, dividir=False,
+                   organizador=None, indice=None, repetir_falhas=False, livro=None,
+                   duplicatas=None, saida_zip=None, reempacotar=False):
+    """
+    Processa continuamente os PDFs que chegarem na pasta (até Ctrl+C).
+
+    Os arquivos que já estão na pasta quando a observação começa não são
+    processados; use renomear_arquivos_na_pasta() para eles.
+
+    Args:
+        pasta (str): Pasta de entrada a observar
+        workers (int): Número de processos para extração
+        cache (CacheExtracao): Cache de extração opcional
+        opcoes (OpcoesExtracao): Opções de extração
+        recursivo (bool): Observa também as subpastas
+        incluir (tuple): Padrões dos arquivos a processar
+        excluir (tuple): Padrões de arquivos e subpastas a ignorar
+        intervalo (float): Segundos entre verificações
+        debounce (float): Segundos que um arquivo deve ficar sem mudanças
+        dividir (bool): Separa PDFs com vários comprovantes
+        organizador (Organizador): Pastas por data e diário de movimentos
+        indice (IndiceProcessados): Índice dos arquivos já processados
+        repetir_falhas (bool): Processa só os arquivos que falharam antes
+        livro (LivroComprovantes): Livro onde registrar os comprovantes renomeados
+        duplicatas (DetectorDuplicatas): Detecção de comprovantes repetidos
+        saida_zip (str): Pasta de saída dos PDFs de dentro de arquivos .zip
+        reempacotar (bool): Grava um novo .zip em vez de PDFs soltos
+    """
+    if duplicatas:
+        excluir = tuple(excluir) + duplicatas.excluir_quarentena(pasta)
+    observador = _ObservadorPasta(pasta, recursivo, incluir, excluir, debounce)
+    logger.info("👀 Observando %s (Ctrl+C para sair)", Path(pasta).resolve())
+    try:
+        while True:
+            novos = observador.novos_arquivos()
+            if novos:
+                contagem = _processar_arquivos(novos, workers, cache, opcoes, dividir,
+                                               organizador, indice, repetir_falhas, livro,
+                                               duplicatas, saida_zip, reempacotar)
+                for caminho in contagem["renomeados"]:
+                    observador.ignorar(caminho)
+                _registrar_resumo(contagem)
+            time.sleep(intervalo)
+    except KeyboardInterrupt:
+        logger.info("Observação encerrada.")
+
+
+def caminho_socket_padrao():
+    """Socket usado por servir() e enviar_arquivos() quando nenhum é informado."""
+    return _diretorio_cache_usuario() / "servidor.sock"
+
+
+def _enviar_mensagem(arquivo, mensagem):
+    arquivo.write(json.dumps(mensagem, ensure_ascii=False).encode("utf-8") + b"\n")
+    arquivo.flush()
+
+
+class _HandlerConexao(logging.Handler):
+    """Repassa ao cliente os registros de log de um pedido, um JSON por linha."""
+
+    def __init__(self, arquivo, formato="texto"):
+        super().__init__()
+        self.arquivo = arquivo
+        self.setFormatter(FormatadorJSON() if formato == "json" else FormatadorTexto())
+
+    def emit(self, record):
+        try:
+            _enviar_mensagem(self.arquivo, {"log": self.format(record)})
+        except OSError:
+            # O cliente desconectou; o pedido é concluído mesmo assim
+            pass
+
+
+def _servidor_ativo(caminho):
+    """Indica se há um servidor aceitando conexões no socket."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conexao:
+        try:
+            conexao.connect(str(caminho))
+            return True
+        except OSError:
+            return False
+
+
+def _atender_pedido(arquivo, workers, cache, opcoes, processamento):
+    """
+    Lê e atende um pedido de um cliente.
+
+    Returns:
+        bool: False se o cliente pediu para encerrar o servidor
+    """
+    try:
+        pedido = json.loads(arquivo.readline() or "null")
+    except ValueError:
+        pedido = None
+    if not isinstance(pedido, dict):
+        _enviar_mensagem(arquivo, {"erro": "pedido inválido"})
+        return True
+    if pedido.get("parar"):
+        _enviar_mensagem(arquivo, {"resumo": {}})
+        return False
+
+    # O logger passa a deixar passar também o que o cliente pediu, mas os
+    # handlers do próprio servidor continuam no nível dele
+    nivel_servidor, nivel_logger = logger.getEffectiveLevel(), logger.level
+    nivel_cliente = pedido.get("nivel", logging.INFO)
+    niveis_handlers = [(h, h.level) for h in logger.handlers]
+    for h, nivel in niveis_handlers:
+        h.setLevel(max(nivel, nivel_servidor))
+    handler = _HandlerConexao(arquivo, pedido.get("formato", "texto"))
+    handler.setLevel(nivel_cliente)
+    logger.addHandler(handler)
+    logger.setLevel(min(nivel_servidor, handler.level))
+    try:
+        arquivos = []
+        ausentes = 0
+        for caminho in pedido.get("arquivos", ()):
+            if Path(caminho).is_file():
+                arquivos.append(Path(caminho))
+            else:
+                logger.error("❌ Arquivo não encontrado: %s", caminho)
+                ausentes += 1
+        contagem = _processar_arquivos(arquivos, workers, cache, opcoes, **processamento)
+        contagem["falhas"] += ausentes
+        contagem["total"] += ausentes
+        _registrar_resumo(contagem)
+    except Exception as e:
+        logger.error("❌ Erro ao atender o pedido: %s", e,
+                     exc_info=logger.isEnabledFor(logging.DEBUG))
+        contagem = None
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(nivel_logger)
+        for h, nivel in niveis_handlers:
+            h.setLevel(nivel)
+
+    try:
+        if contagem is None:
+            _enviar_mensagem(arquivo, {"erro": "falha no servidor (veja o log do servidor)"})
+        else:
+            contagem["renomeados"] = [str(c) for c in contagem["renomeados"]]
+            _enviar_mensagem(arquivo, {"resumo": contagem})
+    except OSError:
+        pass
+    return True
+
+
+def servir(caminho_socket=None, workers=1, cache=None, opcoes=None, **processamento):
+    """
+    Mantém um processo residente que renomeia os arquivos enviados por clientes.
+
+    As bibliotecas de PDF são importadas uma única vez e o cache, o índice, o
+    livro e o detector de duplicatas ficam abertos entre os pedidos, então
+    cada pedido custa só a extração dos seus arquivos. Os pedidos são
+    atendidos um por vez, na ordem de chegada, por este processo; o socket é
+    criado com permissão apenas para o usuário. Termina com Ctrl+C ou com um
+    pedido de parada (parar_servidor).
+
+    Protocolo (uma mensagem JSON por linha): o cliente envia {"arquivos":
+    [caminhos absolutos], "nivel": nível de log, "formato": "texto" ou
+    "json"} ou {"parar": true}; o servidor responde com {"log": linha} para
+    cada registro de log e termina com {"resumo": contagem} ou {"erro": ...}.
+
+    Args:
+        caminho_socket (str): Socket Unix (padrão: caminho_socket_padrao())
+        workers (int): Número de processos para extração
+        cache (CacheExtracao): Cache de extração opcional
+        opcoes (OpcoesExtracao): Opções de extração
+        **processamento: Demais argumentos de _processar_arquivos (dividir,
+            organizador, indice, livro, duplicatas, saida_zip...)
+
+    Raises:
+        OSError: Se a plataforma não tiver sockets Unix ou já houver um
+            servidor no socket
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        raise OSError("sockets Unix não são suportados nesta plataforma")
+    caminho = Path(caminho_socket) if caminho_socket else caminho_socket_padrao()
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    if os.path.lexists(caminho):
+        if _servidor_ativo(caminho):
+            raise OSError(f"já existe um servidor em {caminho}")
+        # Socket deixado por um servidor que não terminou normalmente
+        caminho.unlink()
+
+    _pdfplumber()
+    _pypdf2()
+    servidor = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    mascara = os.umask(0o177)
+    try:
+        servidor.bind(str(caminho))
+    finally:
+        os.umask(mascara)
+    servidor.listen()
+    logger.info("🛰️  Aguardando arquivos em %s (Ctrl+C para sair)", caminho)
+    try:
+        continuar = True
+        while continuar:
+            conexao, _ = servidor.accept()
+            with conexao, conexao.makefile("rwb") as arquivo:
+                continuar = _atender_pedido(arquivo, workers, cache, opcoes, processamento)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.close()
+        with contextlib.suppress(FileNotFoundError):
+            caminho.unlink()
+    logger.info("Servidor encerrado.")
+
+
+def _conversar(caminho_socket, pedido, saida=None):
+    """Envia um pedido ao servidor, repassa o log dele e retorna o resumo."""
+    if not hasattr(socket, "AF_UNIX"):
+        raise OSError("sockets Unix não são suportados nesta plataforma")
+    caminho = Path(caminho_socket) if caminho_socket else caminho_socket_padrao()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conexao:
+        conexao.connect(str(caminho))
+        with conexao.makefile("rwb") as arquivo:
+            _enviar_mensagem(arquivo, pedido)
+            for linha in arquivo:
+                mensagem = json.loads(linha)
+                if "log" in mensagem:
+                    print(mensagem["log"], file=saida or sys.stdout, flush=True)
+                elif "resumo" in mensagem:
+                    return mensagem["resumo"]
+                elif "erro" in mensagem:
+                    raise OSError(mensagem["erro"])
+    raise OSError("o servidor encerrou a conexão sem responder")
+
+
+def enviar_arquivos(arquivos, caminho_socket=None, nivel=logging.INFO, formato="texto",
+                    saida=None):
+    """
+    Envia arquivos a um servidor iniciado por servir() e aguarda o resultado.
+
+    Args:
+        arquivos (iterable): Caminhos dos arquivos (relativos à pasta atual)
+        caminho_socket (str): Socket do servidor (padrão: caminho_socket_padrao())
+        nivel (int): Nível dos registros de log a receber
+        formato (str): "texto" ou "json"
+        saida: Onde escrever o log recebido (padrão: sys.stdout)
+
+    Returns:
+        dict: Contadores do servidor ("processados", "falhas", "total",
+            "duplicatas" e "renomeados")
+
+    Raises:
+        OSError: Se não houver servidor ou ele falhar
+    """
+    pedido = {"arquivos": [os.path.abspath(a) for a in arquivos], "nivel": nivel,
+              "formato": formato}
+    return _conversar(caminho_socket, pedido, saida)
+
+
+def parar_servidor(caminho_socket=None):
+    """Pede ao servidor que termine depois do pedido em andamento."""
+    _conversar(caminho_socket, {"parar": True})
+
+
+# Subcomandos aceitos como primeiro argumento; sem nenhum deles, a pasta é renomeada
+COMANDOS = {
+    "plan": "Extrai os campos e grava um manifesto, sem renomear",
+    "apply": "Renomeia conforme um manifesto, sem abrir os PDFs",
+    "query": "Consulta o livro de comprovantes (--ledger) e exporta em CSV",
+    "serve": "Mantém um processo residente que renomeia os arquivos recebidos por send",
+    "send": "Envia arquivos ao processo iniciado por serve",
+}
+
+
+def _adicionar_opcoes_log(parser):
+    verbosidade = parser.add_mutually_exclusive_group()
+    verbosidade.add_argument("-q", "--quiet", action="store_true",
+                             help="Mostra apenas avisos e erros")
+    verbosidade.add_argument("-v", "--verbose", action="count", default=0,
+                             help="Mais detalhes (-v: depuração, -vv: texto extraído linha a linha)")
+    parser.add_argument("--log-format", choices=("texto", "json"), default="texto",
+                        help="Formato do log (json = um objeto JSON por linha)")
+
+
+def _adicionar_opcoes_varredura(parser):
+    parser.add_argument("pasta", nargs="?", default=".",
+                        help="Pasta com os PDFs (padrão: pasta atual)")
+    parser.add_argument("-r", "--recursivo", action="store_true",
+                        help="Processa também as subpastas")
+    parser.add_argument("--incluir", action="append", metavar="PADRAO",
+                        help="Padrão dos arquivos a processar (padrão: *.pdf; pode repetir)")
+    parser.add_argument("--excluir", action="append", default=[], metavar="PADRAO",
+                        help="Padrão de arquivos ou subpastas a ignorar (pode repetir)")
+
+
+def _adicionar_opcoes_organizacao(parser):
+    parser.add_argument("--organizar", nargs="?", const="%Y/%m/%d", metavar="FORMATO",
+                        help="Move os comprovantes para subpastas pela data extraída "
+                             "(padrão do FORMATO: %%Y/%%m/%%d)")
+    parser.add_argument("--journal", metavar="ARQUIVO",
+                        help="Diário dos movimentos, para retomar ou desfazer a execução "
+                             "(com --organizar, o padrão é um arquivo novo no cache do usuário "
+                             "a cada execução: para retomar, passe o mesmo --journal)")
+
+
+def _adicionar_opcao_livro(parser):
+    parser.add_argument("--ledger", nargs="?", const="", metavar="ARQUIVO",
+                        help="Registra cada comprovante renomeado no livro SQLite "
+                             "(padrão: livro.sqlite3 no cache do usuário)")
+
+
+def _adicionar_opcoes_renomeacao(parser):
+    parser.add_argument("--dividir", action="store_true",
+                        help="Separa PDFs com vários comprovantes em um arquivo por comprovante")
+    _adicionar_opcoes_organizacao(parser)
+    _adicionar_opcao_livro(parser)
+    parser.add_argument("--saida-zip", metavar="PASTA",
+                        help="Pasta onde gravar os PDFs vindos de .zip (padrão: a do .zip)")
+    parser.add_argument("--reempacotar", action="store_true",
+                        help="Grava os PDFs renomeados de cada .zip em um novo .zip")
+    parser.add_argument("--no-index", action="store_true",
+                        help="Não usa o índice de arquivos processados (pula pelo nome)")
+    parser.add_argument("--index-db", metavar="ARQUIVO",
+                        help="Arquivo SQLite do índice (padrão: cache do usuário)")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Processa só os arquivos que falharam nas execuções anteriores")
+    parser.add_argument("--duplicatas", choices=DetectorDuplicatas.ACOES,
+                        help="Detecta comprovantes já renomeados antes (mesmo texto e campos) "
+                             "e os reporta, pula ou move para a quarentena")
+    parser.add_argument("--quarentena", metavar="PASTA",
+                        help="Pasta das duplicatas com --duplicatas quarentena "
+                             "(padrão: subpasta 'duplicatas' da pasta do arquivo)")
+    parser.add_argument("--fingerprint-db", metavar="ARQUIVO",
+                        help="Arquivo SQLite das impressões digitais (padrão: cache do usuário)")
+
+
+def _adicionar_opcoes_extracao(parser):
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Processos para extração em paralelo (padrão: 1; 0 = nº de CPUs)")
+    parser.add_argument("--texto-rapido", action="store_true",
+                        help="Tenta primeiro a extração de texto do PyPDF2 (mais rápida)")
+    parser.add_argument("--janela-cabecalho", type=int, metavar="N",
+                        help="Classifica pelos N primeiros caracteres, lendo o resto "
+                             "só se nenhum marcador aparecer neles")
+    parser.add_argument("--prefetch", type=int, default=0, metavar="N",
+                        help="Lê até N arquivos à frente da extração, em paralelo com ela "
+                             "(útil em pastas de rede; padrão: 0 = desativado)")
+    parser.add_argument("--max-paginas", type=int, metavar="N",
+                        help="Ignora (e reporta) arquivos com mais de N páginas")
+    parser.add_argument("--max-rss-mb", type=int, metavar="MB",
+                        help="Ignora (e reporta) o arquivo cuja extração fizer a memória "
+                             "do processo crescer mais de MB (Linux)")
+    parser.add_argument("--ocr", nargs="?", const="por", metavar="IDIOMA",
+                        help="Lê por OCR (tesseract) os PDFs sem camada de texto "
+                             "(padrão do IDIOMA: por)")
+    parser.add_argument("--ocr-workers", type=int, default=1, metavar="N",
+                        help="Processos do tesseract em paralelo (padrão: 1)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Não usa o cache de extração")
+    parser.add_argument("--rebuild-cache", action="store_true",
+                        help="Ignora o cache existente e regrava os resultados")
+    parser.add_argument("--cache-db", metavar="ARQUIVO",
+                        help="Arquivo SQLite do cache (padrão: cache do usuário)")
+    parser.add_argument("--cache-max-mb", type=int, default=512,
+                        help="Tamanho máximo do cache em MB (padrão: 512)")
+
+
+def _adicionar_opcoes_perfil(parser):
+    parser.add_argument("--profile", action="store_true",
+                        help="Mostra no fim o tempo de cada etapa (p50/p95/máx), por tipo "
+                             "de comprovante, e os arquivos mais lentos (mesmo com -q)")
+    parser.add_argument("--profile-json", metavar="ARQUIVO",
+                        help="Grava o relatório do perfil em JSON (implica --profile)")
+    parser.add_argument("--profile-pstats", metavar="ARQUIVO",
+                        help="Grava um perfil do cProfile do processo principal "
+                             "(os workers de -w não entram; implica --profile)")
+    parser.add_argument("--profile-top", type=int, default=10, metavar="N",
+                        help="Quantos arquivos mais lentos listar (padrão: 10)")
+
+
+def _argumento(conversor, manter_texto=False):
+    """Tipo do argparse que valida o texto com `conversor` (ValueError vira erro de uso)."""
+    def converter(texto):
+        try:
+            convertido = conversor(texto)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e)) from None
+        return texto if manter_texto else convertido
+    return converter
+
+
+def criar_parser(comando=None):
+    """
+    Cria o parser de argumentos da linha de comando.
+
+    Args:
+        comando (str): Um dos COMANDOS, ou None para o modo padrão (renomear)
+
+    Returns:
+        argparse.ArgumentParser: Parser configurado
+    """
+    if comando == "plan":
+        parser = argparse.ArgumentParser(prog="renomeador_comprovantes.py plan",
+                                         description=COMANDOS["plan"])
+        _adicionar_opcoes_varredura(parser)
+        parser.add_argument("-o", "--manifesto", default="manifesto.jsonl", metavar="ARQUIVO",
+                            help="Arquivo de saída (.jsonl ou .csv; padrão: manifesto.jsonl)")
+        _adicionar_opcoes_extracao(parser)
+        _adicionar_opcoes_perfil(parser)
+        _adicionar_opcoes_log(parser)
+        return parser
+
+    if comando == "apply":
+        parser = argparse.ArgumentParser(prog="renomeador_comprovantes.py apply",
+                                         description=COMANDOS["apply"])
+        parser.add_argument("manifesto", help="Manifesto gerado pelo comando plan")
+        _adicionar_opcoes_organizacao(parser)
+        _adicionar_opcao_livro(parser)
+        _adicionar_opcoes_log(parser)
+        return parser
+
+    if comando == "query":
+        parser = argparse.ArgumentParser(prog="renomeador_comprovantes.py query",
+                                         description=COMANDOS["query"])
+        parser.add_argument("--ledger", metavar="ARQUIVO",
+                            help="Livro SQLite (padrão: livro.sqlite3 no cache do usuário)")
+        parser.add_argument("--tipo", help="Tipo do comprovante (pix, boleto, consumo, ...)")
+        parser.add_argument("--de", metavar="AAAA-MM-DD", type=_argumento(limite_de_data),
+                            help="Data inicial (inclusive; AAAA-MM e AAAA começam no 1º dia)")
+        parser.add_argument("--ate", metavar="AAAA-MM-DD",
+                            type=_argumento(lambda texto: limite_de_data(texto, final=True)),
+                            help="Data final (inclusive; AAAA-MM e AAAA vão até o último dia)")
+        parser.add_argument("--valor-min", metavar="VALOR",
+                            type=_argumento(valor_digitado_em_centavos, manter_texto=True),
+                            help="Valor mínimo (ex.: 1.000 ou 1.000,00)")
+        parser.add_argument("--valor-max", metavar="VALOR",
+                            type=_argumento(valor_digitado_em_centavos, manter_texto=True),
+                            help="Valor máximo")
+        parser.add_argument("--descricao", metavar="TRECHO", help="Trecho da descrição")
+        parser.add_argument("--csv", metavar="ARQUIVO",
+                            help="Exporta o resultado em CSV ('-' para a saída padrão)")
+        _adicionar_opcoes_log(parser)
+        return parser
+
+    if comando == "serve":
+        parser = argparse.ArgumentParser(prog="renomeador_comprovantes.py serve",
+                                         description=COMANDOS["serve"])
+        parser.add_argument("--socket", metavar="ARQUIVO",
+                            help="Socket Unix (padrão: servidor.sock no cache do usuário)")
+        _adicionar_opcoes_log(parser)
+        _adicionar_opcoes_renomeacao(parser)
+        _adicionar_opcoes_extracao(parser)
+        return parser
+
+    if comando == "send":
+        parser = argparse.ArgumentParser(prog="renomeador_comprovantes.py send",
+                                         description=COMANDOS["send"])
+        parser.add_argument("arquivos", nargs="*", metavar="ARQUIVO",
+                            help="PDFs (ou .zip) a renomear")
+        parser.add_argument("--socket", metavar="ARQUIVO",
+                            help="Socket do servidor (padrão: servidor.sock no cache do usuário)")
+        parser.add_argument("--parar", action="store_true",
+                            help="Encerra o servidor")
+        _adicionar_opcoes_log(parser)
+        return parser
+
+    parser = argparse.ArgumentParser(
+        description="Renomeia comprovantes bancários em PDF como DESCRICAO_VALOR_DATA.pdf",
+        epilog="Comandos: " + "; ".join(f"{nome}: {ajuda}" for nome, ajuda in COMANDOS.items())
+               + " (use 'COMANDO -h' para as opções)")
+    _adicionar_opcoes_varredura(parser)
+    _adicionar_opcoes_log(parser)
+    parser.add_argument("--zip", action="store_true",
+                        help="Processa também os PDFs de dentro de arquivos .zip, sem extraí-los")
+    parser.add_argument("--undo", metavar="JOURNAL",
+                        help="Desfaz os movimentos registrados em um diário e sai")
+    parser.add_argument("--watch", action="store_true",
+                        help="Fica observando a pasta e processa os PDFs que chegarem")
+    parser.add_argument("--intervalo", type=float, default=2.0,
+                        help="Segundos entre verificações no modo --watch (padrão: 2)")
+    parser.add_argument("--debounce", type=float, default=5.0,
+                        help="Segundos sem mudanças antes de processar um arquivo novo "
+                             "no modo --watch (padrão: 5)")
+    _adicionar_opcoes_renomeacao(parser)
+    _adicionar_opcoes_extracao(parser)
+    _adicionar_opcoes_perfil(parser)
+    return parser
+
+
+def _abrir_cache(args):
+    """CacheExtracao conforme as opções (ou um contexto vazio com --no-cache)."""
+    if args.no_cache:
+        return contextlib.nullcontext()
+    return CacheExtracao(args.cache_db, max_bytes=args.cache_max_mb * 1024 * 1024,
+                         reconstruir=args.rebuild_cache)
+
+
+def _criar_organizador(args, raiz):
+    """Organizador conforme --organizar/--journal (None se nenhum foi pedido)."""
+    diario = args.journal
+    if args.organizar and not diario:
+        diario = (_diretorio_cache_usuario() / "journal"
+                  / f"{datetime.now():%Y%m%d-%H%M%S}.jsonl")
+    if not (args.organizar or diario):
+        return None
+    logger.info("📒 Diário: %s (desfaça com --undo %s; se interromper, retome com "
+                "--journal %s)", diario, diario, diario)
+    return Organizador(raiz, args.organizar, diario)
+
+
+def _abrir_livro(args):
+    """LivroComprovantes conforme --ledger (ou um contexto vazio sem ele)."""
+    if args.ledger is None:
+        return contextlib.nullcontext()
+    return LivroComprovantes(args.ledger or None)
+
+
+def _executar_query(args):
+    caminho = Path(args.ledger) if args.ledger else caminho_livro_padrao()
+    if not caminho.is_file():
+        logger.error("❌ Livro não encontrado: %s (crie-o renomeando com --ledger)", caminho)
+        return 1
+    with LivroComprovantes(caminho) as livro:
+        comprovantes = livro.consultar(args.tipo, args.de, args.ate, args.valor_min,
+                                       args.valor_max, args.descricao)
+        if args.csv == "-":
+            total = exportar_csv(comprovantes, sys.stdout)
+        elif args.csv:
+            with open(args.csv, "w", encoding="utf-8", newline="") as f:
+                total = exportar_csv(comprovantes, f)
+            logger.info("📝 %d comprovante(s) exportado(s) para %s", total, args.csv)
+        else:
+            total = 0
+            for c in comprovantes:
+                valor = formatar_valor_saida(c["valor"]) if c["valor"] else "-"
+                print(f"{c['data'] or '-':10}  {c['tipo']:9}  {valor:>14}  "
+                      f"{c['descricao'] or '-'}  {c['caminho']}")
+                total += 1
+    logger.info("RESUMO: %d comprovante(s)", total, extra={"total": total})
+
+
+def _opcoes_extracao(args):
+    """OpcoesExtracao conforme as opções de extração da linha de comando."""
+    ocr = args.ocr
+    motivo = ocr and motivo_sem_ocr()
+    if motivo:
+        logger.warning("⚠️  %s; --ocr desativado", motivo)
+        ocr = None
+    return OpcoesExtracao(texto_rapido=args.texto_rapido,
+                          janela_cabecalho=args.janela_cabecalho,
+                          leitura_antecipada=max(0, args.prefetch),
+                          max_paginas=args.max_paginas, max_rss_mb=args.max_rss_mb,
+                          ocr=ocr, ocr_workers=max(1, args.ocr_workers))
+
+
+def _registrar_perfil(relatorio):
+    logger.log(RELATORIO, "⏱️  PERFIL: %d arquivo(s) em %.2f s", relatorio["arquivos"],
+               relatorio["segundos"], extra={"perfil": relatorio})
+    for etapa, tempos in relatorio["etapas_ms"].items():
+        logger.log(RELATORIO, "⏱️  %-11s total %10.1f ms | p50 %8.2f | p95 %8.2f | máx %8.2f",
+                   etapa, tempos["total"], tempos["p50"], tempos["p95"], tempos["max"])
+    for tipo, tempos in relatorio["por_tipo_ms"].items():
+        logger.log(RELATORIO, "⏱️  %-11s %4d arquivo(s) | p50 %8.2f ms | p95 %8.2f | máx %8.2f",
+                   tipo.upper(), tempos["arquivos"], tempos["p50"], tempos["p95"],
+                   tempos["max"])
+    for lento in relatorio["mais_lentos"]:
+        etapa = max(lento["etapas_ms"], key=lento["etapas_ms"].get, default="-")
+        logger.log(RELATORIO, "🐢 %8.1f ms  %s (%s; mais tempo em %s)", lento["ms"],
+                   lento["arquivo"], lento["tipo"] or "erro", etapa)
+
+
+@contextlib.contextmanager
+def _perfilar(args):
+    """
+    Ativa o perfil da execução conforme --profile, --profile-json e
+    --profile-pstats; sem eles, não mede nada.
+    """
+    if not (args.profile or args.profile_json or args.profile_pstats):
+        yield
+        return
+    perfil = PerfilExecucao()
+    token = _perfil_atual.set(perfil)
+    perfilador = None
+    if args.profile_pstats:
+        import cProfile
+        perfilador = cProfile.Profile()
+        perfilador.enable()
+    try:
+        yield
+    finally:
+        if perfilador is not None:
+            perfilador.disable()
+            perfilador.dump_stats(args.profile_pstats)
+            logger.info("📝 cProfile gravado em %s (veja com python -m pstats %s)",
+                        args.profile_pstats, args.profile_pstats)
+        _perfil_atual.reset(token)
+        relatorio = perfil.relatorio(max(0, args.profile_top))
+        _registrar_perfil(relatorio)
+        if args.profile_json:
+            Path(args.profile_json).write_text(
+                json.dumps(relatorio, indent=2, ensure_ascii=False), encoding="utf-8")
+            logger.info("📝 Perfil gravado em %s", args.profile_json)
+
+
+def _executar_plan(args):
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    opcoes = _opcoes_extracao(args)
+    with _perfilar(args), _abrir_cache(args) as cache:
+        contagem = planejar_pasta(args.pasta, args.manifesto, workers, cache, opcoes,
+                                  args.recursivo, tuple(args.incluir or ("*.pdf",)),
+                                  tuple(args.excluir))
+    _registrar_resumo(contagem)
+
+
+def _executar_apply(args):
+    if not Path(args.manifesto).is_file():
+        logger.error("❌ Manifesto não encontrado: %s", args.manifesto)
+        return 1
+    # Sem raiz: as pastas por data ficam na pasta de cada arquivo
+    organizador = _criar_organizador(args, None)
+    with organizador or contextlib.nullcontext(), _abrir_livro(args) as livro:
+        try:
+            contagem = aplicar_manifesto(args.manifesto, organizador, livro)
+        except (OSError, ValueError) as e:
+            logger.error("❌ Não foi possível ler o manifesto: %s", e)
+            return 1
+    _registrar_resumo(contagem)
+
+
+@contextlib.contextmanager
+def _abrir_processamento(args, raiz):
+    """
+    Abre o que as opções de renomeação pedem (organizador, índice, detector
+    de duplicatas, livro e cache) e os fecha no fim.
+
+    Yields:
+        tuple: (cache ou None, argumentos de _processar_arquivos)
+    """
+    organizador = _criar_organizador(args, raiz)
+    indice = None if args.no_index else IndiceProcessados(args.index_db)
+    duplicatas = None
+    if args.duplicatas:
+        duplicatas = DetectorDuplicatas(args.fingerprint_db, args.duplicatas, args.quarentena)
+
+    with organizador or contextlib.nullcontext(), indice or contextlib.nullcontext(), \
+            duplicatas or contextlib.nullcontext(), _abrir_livro(args) as livro, \
+            _abrir_cache(args) as cache:
+        yield cache, dict(dividir=args.dividir, organizador=organizador, indice=indice,
+                          repetir_falhas=args.retry_failed, livro=livro, duplicatas=duplicatas,
+                          saida_zip=args.saida_zip, reempacotar=args.reempacotar)
+
+
+def _executar_renomear(args):
+    if args.undo:
+        try:
+            desfazer_diario(args.undo)
+        except OSError as e:
+            logger.error("❌ Não foi possível ler o diário: %s", e)
+            return 1
+        return
+
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    opcoes = _opcoes_extracao(args)
+    if args.retry_failed and args.no_index:
+        logger.error("❌ --retry-failed precisa do índice (remova --no-index)")
+        return
+
+    incluir = tuple(args.incluir or ("*.pdf",)) + (("*.zip",) if args.zip else ())
+    with _perfilar(args), _abrir_processamento(args, args.pasta) as (cache, processamento):
+        varredura = dict(recursivo=args.recursivo, incluir=incluir,
+                         excluir=tuple(args.excluir), **processamento)
+        # Processar arquivos na pasta indicada
+        if args.watch:
+            observar_pasta(args.pasta, workers, cache, opcoes, intervalo=args.intervalo,
+                           debounce=args.debounce, **varredura)
+        else:
+            renomear_arquivos_na_pasta(args.pasta, workers, cache, opcoes, **varredura)
+
+
+def _executar_serve(args):
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    opcoes = _opcoes_extracao(args)
+    if args.retry_failed and args.no_index:
+        logger.error("❌ --retry-failed precisa do índice (remova --no-index)")
+        return 1
+
+    # Sem raiz: as pastas por data ficam na pasta de cada arquivo
+    with _abrir_processamento(args, None) as (cache, processamento):
+        try:
+            servir(args.socket, workers, cache, opcoes, **processamento)
+        except OSError as e:
+            logger.error("❌ Não foi possível iniciar o servidor: %s", e)
+            return 1
+
+
+def _executar_send(args):
+    try:
+        if args.parar:
+            parar_servidor(args.socket)
+            return 0
+        niveis = {-1: logging.WARNING, 0: logging.INFO, 1: logging.DEBUG}
+        nivel = niveis.get(-1 if args.quiet else args.verbose, DEPURACAO_LINHAS)
+        contagem = enviar_arquivos(args.arquivos, args.socket, nivel, args.log_format)
+    except OSError as e:
+        logger.error("❌ Servidor indisponível (%s); inicie-o com o comando serve", e)
+        return 1
+    return 1 if contagem["falhas"] else 0
+
+
+def main(argv=None):
+    """Função principal"""
+    argv = sys.argv[1:] if argv is None else list(argv)
+    comando = argv.pop(0) if argv and argv[0] in COMANDOS else None
+    args = criar_parser(comando).parse_args(argv)
+
+    # Na consulta, a saída padrão fica só com os resultados
+    configurar_logging(-1 if args.quiet else args.verbose, args.log_format,
+                       sys.stderr if comando == "query" else None)
+    # O cliente só repassa o log do servidor
+    if comando != "send":
+        logger.info("RENOMEADOR INTELIGENTE DE COMPROVANTES - v6")
+
+    executores = {"plan": _executar_plan, "apply": _executar_apply, "query": _executar_query,
+                  "serve": _executar_serve, "send": _executar_send}
+    return executores.get(comando, _executar_renomear)(args)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
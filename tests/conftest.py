@@ -0,0 +1,19 @@
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.gerador import gerar_comprovante, montar_pdf  # noqa: E402
+
+
+@pytest.fixture
+def comprovante():
+    """Grava um comprovante sintético e retorna o nome que deve ser sugerido."""
+    def gravar(caminho, tipo="pix", semente=0, paginas_extras=()):
+        linhas, nome = gerar_comprovante(tipo, random.Random(semente))
+        Path(caminho).write_bytes(montar_pdf([linhas, *paginas_extras]))
+        return nome
+    return gravar
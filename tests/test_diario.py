@@ -0,0 +1,75 @@
+import random
+import zipfile
+
+import pytest
+
+import renomeador_comprovantes as rc
+from benchmarks.gerador import gerar_comprovante, montar_pdf
+
+
+def _pdf_com_recibos(caminho, tipos):
+    """Grava um PDF com um comprovante por página; retorna os nomes esperados."""
+    rng = random.Random(0)
+    paginas, nomes = [], []
+    for tipo in tipos:
+        linhas, nome = gerar_comprovante(tipo, rng)
+        paginas.append(linhas)
+        nomes.append(nome)
+    caminho.write_bytes(montar_pdf(paginas))
+    return nomes
+
+
+def test_retomar_divisao_interrompida(tmp_path, monkeypatch):
+    lote = tmp_path / "lote.pdf"
+    nomes = _pdf_com_recibos(lote, ("pix", "boleto", "darf"))
+    diario = tmp_path / "diario.jsonl"
+
+    criar = rc.AlocadorNomes.criar
+    chamadas = []
+
+    def criar_e_interromper(self, pasta, nome):
+        chamadas.append(nome)
+        if len(chamadas) == 2:
+            raise KeyboardInterrupt
+        return criar(self, pasta, nome)
+
+    monkeypatch.setattr(rc.AlocadorNomes, "criar", criar_e_interromper)
+    with pytest.raises(KeyboardInterrupt), rc.Organizador(tmp_path, None, diario) as org:
+        rc.renomear_arquivos_na_pasta(tmp_path, dividir=True, organizador=org)
+    monkeypatch.setattr(rc.AlocadorNomes, "criar", criar)
+    assert lote.exists()
+
+    with rc.Organizador(tmp_path, None, diario) as org:
+        rc.renomear_arquivos_na_pasta(tmp_path, dividir=True, organizador=org)
+
+    assert sorted(p.name for p in tmp_path.glob("*.pdf")) == sorted(nomes)
+    assert (tmp_path / ("lote.pdf" + rc.SUFIXO_DIVIDIDO)).exists()
+
+    rc.desfazer_diario(diario)
+    assert [p.name for p in tmp_path.glob("*.pdf")] == ["lote.pdf"]
+
+
+def test_undo_diario_inexistente(tmp_path):
+    assert rc.main(["--undo", str(tmp_path / "nao_existe.jsonl")]) == 1
+
+
+def test_undo_remove_zip_reempacotado(tmp_path):
+    pdf = tmp_path / "recibos.pdf"
+    _pdf_com_recibos(pdf, ("pix",))
+    exportacao = tmp_path / "exportacao.zip"
+    with zipfile.ZipFile(exportacao, "w") as z:
+        z.write(pdf, "a/recibo.pdf")
+        z.write(pdf, "b/recibo.pdf")
+    pdf.unlink()
+    diario = tmp_path / "diario.jsonl"
+
+    with rc.Organizador(tmp_path, None, diario) as org, \
+            rc.DetectorDuplicatas(tmp_path / "digitais.sqlite3") as duplicatas:
+        contagem = rc.processar_zip(exportacao, reempacotar=True, organizador=org,
+                                    duplicatas=duplicatas)
+    reempacotado, = contagem["renomeados"]
+    assert reempacotado.exists()
+    assert contagem["duplicatas"] == 1
+
+    rc.desfazer_diario(diario)
+    assert sorted(p.name for p in tmp_path.glob("*.zip")) == ["exportacao.zip"]
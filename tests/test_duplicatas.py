@@ -0,0 +1,65 @@
+import random
+import shutil
+
+import pytest
+
+import renomeador_comprovantes as rc
+from benchmarks.gerador import gerar_comprovante, montar_pdf
+
+
+@pytest.fixture
+def duplicatas(tmp_path):
+    with rc.DetectorDuplicatas(tmp_path / "digitais.sqlite3", "quarentena") as detector:
+        yield detector
+
+
+def _processar(pasta, duplicatas):
+    return rc._processar_arquivos(rc.percorrer_pdfs(pasta), duplicatas=duplicatas)
+
+
+def test_bytes_identicos(tmp_path, comprovante, duplicatas):
+    pasta = tmp_path / "pdfs"
+    pasta.mkdir()
+    nome = comprovante(pasta / "a.pdf")
+    shutil.copy(pasta / "a.pdf", pasta / "b.pdf")
+
+    contagem = _processar(pasta, duplicatas)
+
+    assert (contagem["processados"], contagem["duplicatas"]) == (1, 1)
+    assert (pasta / nome).exists()
+    assert (pasta / "duplicatas" / "b.pdf").exists()
+
+
+def test_mesmo_conteudo_com_bytes_diferentes(tmp_path, duplicatas):
+    pasta = tmp_path / "pdfs"
+    pasta.mkdir()
+    linhas, nome = gerar_comprovante("pix", random.Random(0))
+    (pasta / "a.pdf").write_bytes(montar_pdf([linhas]))
+    # Gerado de novo com outro espaçamento: mesmo texto, outro arquivo
+    (pasta / "b.pdf").write_bytes(montar_pdf([[linha.replace(" ", "  ") for linha in linhas]]))
+    assert (pasta / "a.pdf").read_bytes() != (pasta / "b.pdf").read_bytes()
+
+    contagem = _processar(pasta, duplicatas)
+
+    assert (contagem["processados"], contagem["duplicatas"]) == (1, 1)
+    assert sorted(p.name for p in pasta.iterdir()) == [nome, "duplicatas"]
+
+
+def test_watch_nao_le_a_quarentena_de_novo(tmp_path, comprovante, duplicatas, monkeypatch):
+    pasta = tmp_path / "pdfs"
+    pasta.mkdir()
+    ciclos = []
+
+    def dormir(segundos):
+        ciclos.append(segundos)
+        if len(ciclos) == 1:
+            comprovante(pasta / "a.pdf")
+            shutil.copy(pasta / "a.pdf", pasta / "b.pdf")
+        elif len(ciclos) == 6:
+            raise KeyboardInterrupt
+    monkeypatch.setattr(rc.time, "sleep", dormir)
+
+    rc.observar_pasta(pasta, recursivo=True, debounce=0, duplicatas=duplicatas)
+
+    quarentena = pasta / "duplicatas"
+    assert sorted(p.name for p in quarentena.iterdir()) == ["b.pdf"]
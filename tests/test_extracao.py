@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+import renomeador_comprovantes as rc
+from benchmarks.gerador import gerar_comprovante, gerar_corpus
+
+# Campos de referência de cada layout para a semente 42 do gerador
+REFERENCIA = {
+    "pix": ("pix", "Escola_Infantil_AP334053", "18679.25", "2023-12-01"),
+    "boleto": ("boleto", "Escola_Infantil_1958682846", "18679.25", "2023-12-01"),
+    "consumo": ("consumo", "Saneamento_Municipal_DEZ", "18679.25", "2023-12-01"),
+    "bradesco": ("bradesco", "Transferencia_Escola_Infantil", "18679.25", "2023-12-01"),
+    "darf": ("darf", "DARF_42168056263359376", "18679.25", "2023-12-01"),
+}
+
+
+@pytest.mark.parametrize("tipo", sorted(REFERENCIA))
+def test_campos_de_referencia(tipo):
+    linhas, nome = gerar_comprovante(tipo, random.Random(42))
+
+    resultado, completo = rc._extrair_de_paginas(["\n".join(linhas)])
+    assert tuple(resultado[:4]) == REFERENCIA[tipo]
+    assert completo
+    assert rc.montar_nome_sugerido(resultado) == nome
+
+    # Uma linha por página: as regras esperam pelas linhas das páginas seguintes
+    resultado, _ = rc._extrair_de_paginas(linhas)
+    assert tuple(resultado[:4]) == REFERENCIA[tipo]
+
+
+def test_corpus_sintetico(tmp_path):
+    esperado = gerar_corpus(tmp_path, quantidade=25, multipagina=5, paginas_extras=3,
+                            malformados=4, semente=0)
+
+    obtido = {arquivo: rc.processar_pdf(str(tmp_path / arquivo)) for arquivo in esperado}
+
+    assert obtido == esperado
+
+
+def test_processar_bytes_aceita_qualquer_buffer(comprovante, tmp_path):
+    arquivo = tmp_path / "recibo.pdf"
+    esperado = comprovante(arquivo)
+    dados = arquivo.read_bytes()
+    # Vista não contígua: cada byte do PDF intercalado com um byte de enchimento
+    intercalado = bytearray(len(dados) * 2)
+    intercalado[::2] = dados
+
+    for entrada in (dados, bytearray(dados), memoryview(intercalado)[::2]):
+        assert rc.processar_bytes(entrada).nome == esperado
+
+    falha = rc.processar_bytes("não é um PDF", origem="texto")
+    assert falha.nome is None
+    assert falha.origem == "texto"
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_prefetch_mesmos_nomes_na_mesma_ordem(tmp_path, comprovante, workers):
+    arquivos = []
+    for i in range(8):
+        arquivos.append(tmp_path / f"{i}.pdf")
+        comprovante(arquivos[-1], ("pix", "boleto", "darf", "bradesco")[i % 4], semente=i)
+    (tmp_path / "quebrado.pdf").write_bytes(b"nao e um pdf")
+    # Listado, mas apagado antes de ser lido
+    arquivos[3:3] = [tmp_path / "quebrado.pdf", tmp_path / "apagado.pdf"]
+
+    def nomes(leitura_antecipada):
+        opcoes = rc.OpcoesExtracao(leitura_antecipada=leitura_antecipada)
+        return [(arquivo.name, nome)
+                for arquivo, nome, _ in rc._extrair_nomes(arquivos, workers, opcoes=opcoes)]
+
+    esperado = nomes(0)
+    assert esperado[3:5] == [("quebrado.pdf", None), ("apagado.pdf", None)]
+    assert sum(nome is not None for _, nome in esperado) == 8
+    assert nomes(1) == esperado
+    assert nomes(4) == esperado
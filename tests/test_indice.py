@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+import renomeador_comprovantes as rc
+from benchmarks.gerador import montar_pdf
+
+
+@pytest.fixture
+def extracoes(monkeypatch):
+    """Registra os arquivos que passaram pela extração."""
+    lidos = []
+    extrair = rc.extrair_resultado
+
+    def extrair_registrando(caminho_pdf, *args, **kwargs):
+        lidos.append(os.path.basename(caminho_pdf))
+        return extrair(caminho_pdf, *args, **kwargs)
+    monkeypatch.setattr(rc, "extrair_resultado", extrair_registrando)
+    return lidos
+
+
+def _executar(pasta, indice, *opcoes):
+    rc.main(["-q", "--no-cache", "--index-db", str(indice), *opcoes, str(pasta)])
+
+
+def test_segunda_execucao_pula_os_arquivos_sem_mudancas(tmp_path, comprovante, extracoes):
+    pasta, indice = tmp_path / "pdfs", tmp_path / "indice.sqlite3"
+    pasta.mkdir()
+    nome = comprovante(pasta / "a.pdf")
+    (pasta / "ruim.pdf").write_bytes(b"nao e um pdf")
+
+    _executar(pasta, indice)
+    assert sorted(extracoes) == ["a.pdf", "ruim.pdf"]
+
+    extracoes.clear()
+    _executar(pasta, indice)
+    assert extracoes == []
+    assert sorted(p.name for p in pasta.iterdir()) == [nome, "ruim.pdf"]
+
+
+def test_arquivo_alterado_e_processado_de_novo(tmp_path, comprovante, extracoes):
+    pasta, indice = tmp_path / "pdfs", tmp_path / "indice.sqlite3"
+    pasta.mkdir()
+    nome = comprovante(pasta / "a.pdf")
+    (pasta / "ruim.pdf").write_bytes(b"nao e um pdf")
+    _executar(pasta, indice)
+
+    # Novo tamanho: o PDF quebrado foi substituído por um comprovante válido
+    outro = comprovante(pasta / "ruim.pdf", semente=1)
+    # Mesmo tamanho, novo mtime
+    info = (pasta / nome).stat()
+    os.utime(pasta / nome, ns=(info.st_atime_ns, info.st_mtime_ns + 10**9))
+
+    extracoes.clear()
+    _executar(pasta, indice)
+    assert sorted(extracoes) == sorted([nome, "ruim.pdf"])
+    assert sorted(p.name for p in pasta.iterdir()) == sorted([nome, outro])
+
+
+def test_retry_failed_so_le_falhas_e_desconhecidos(tmp_path, comprovante, extracoes):
+    pasta, indice = tmp_path / "pdfs", tmp_path / "indice.sqlite3"
+    pasta.mkdir()
+    nome = comprovante(pasta / "a.pdf")
+    (pasta / "ruim.pdf").write_bytes(b"nao e um pdf")
+    (pasta / "outro.pdf").write_bytes(montar_pdf([["Extrato sem layout conhecido"]]))
+    _executar(pasta, indice)
+
+    with rc.IndiceProcessados(indice) as registros:
+        assert registros.situacao(pasta / nome) == "renomeado"
+        assert registros.situacao(pasta / "ruim.pdf") == "falha"
+        assert registros.situacao(pasta / "outro.pdf") == "desconhecido"
+
+    extracoes.clear()
+    _executar(pasta, indice, "--retry-failed")
+    assert sorted(extracoes) == ["outro.pdf", "ruim.pdf"]
@@ -0,0 +1,42 @@
+import itertools
+import tracemalloc
+
+import renomeador_comprovantes as rc
+
+
+def test_arquivo_depois_de_um_recusado_por_memoria(tmp_path, comprovante, monkeypatch):
+    grande, pequeno = tmp_path / "grande.pdf", tmp_path / "pequeno.pdf"
+    comprovante(grande, "boleto", paginas_extras=[["extrato"]] * 3)
+    esperado = comprovante(pequeno, "pix", semente=1)
+    opcoes = rc.OpcoesExtracao(max_rss_mb=40)
+
+    # O grande faz o RSS subir 50 MB por página e a memória não volta
+    rss = itertools.count(100, 50)
+    monkeypatch.setattr(rc, "rss_atual_mb", lambda: next(rss))
+    nome, _ = rc._processar_pdf_detalhado(str(grande), opcoes=opcoes)
+    assert nome is None
+
+    monkeypatch.setattr(rc, "rss_atual_mb", lambda: 500.0)
+    assert rc.processar_pdf(str(pequeno), opcoes=opcoes) == esperado
+
+
+def test_max_paginas(tmp_path, comprovante):
+    arquivo = tmp_path / "extrato.pdf"
+    comprovante(arquivo, paginas_extras=[["extrato"]] * 5)
+    assert rc.processar_pdf(str(arquivo), opcoes=rc.OpcoesExtracao(max_paginas=3)) is None
+    assert rc.processar_pdf(str(arquivo), opcoes=rc.OpcoesExtracao(max_paginas=6))
+
+
+def test_memoria_nao_cresce_com_as_paginas(tmp_path, comprovante):
+    arquivo = tmp_path / "extrato.pdf"
+    linhas = [f"extrato linha {i} " + "x" * 60 for i in range(40)]
+    comprovante(arquivo, paginas_extras=[linhas] * 6)
+
+    tracemalloc.start()
+    try:
+        memoria = [tracemalloc.get_traced_memory()[0]
+                   for _ in rc._paginas_pdfplumber(str(arquivo))]
+    finally:
+        tracemalloc.stop()
+    # Cada página retida custaria alguns MB; sem retenção, fica estável
+    assert memoria[-1] - memoria[2] < 2 * 1024 * 1024
@@ -0,0 +1,46 @@
+import pytest
+
+import renomeador_comprovantes as rc
+
+
+@pytest.fixture
+def livro(tmp_path):
+    with rc.LivroComprovantes(tmp_path / "livro.sqlite3") as livro:
+        for i, (valor, data) in enumerate((("999.99", "2024-02-29"), ("1000.00", "2024-03-01"),
+                                           ("1500.00", "2024-03-31"), ("20.00", "2024-04-01"))):
+            livro.registrar(tmp_path / f"{i}.pdf",
+                            rc.ResultadoExtracao("darf", f"DARF_{i}", valor, data, ""),
+                            hash_conteudo=str(i))
+        yield livro
+
+
+def _descricoes(comprovantes):
+    return [c["descricao"] for c in comprovantes]
+
+
+def test_valor_com_separador_de_milhar(livro):
+    assert _descricoes(livro.consultar(valor_min="1.000")) == ["DARF_1", "DARF_2"]
+    assert _descricoes(livro.consultar(valor_max="1.000,00")) == ["DARF_0", "DARF_1", "DARF_3"]
+    assert _descricoes(livro.consultar(valor_min="1000.5")) == ["DARF_2"]
+
+
+def test_mes_incompleto_vai_ate_o_ultimo_dia(livro):
+    assert _descricoes(livro.consultar(de="2024-03", ate="2024-03")) == ["DARF_1", "DARF_2"]
+
+
+def test_filtro_invalido_nao_e_ignorado(livro):
+    with pytest.raises(ValueError):
+        list(livro.consultar(valor_min="1.234.56"))
+    with pytest.raises(ValueError):
+        list(livro.consultar(ate="2024-02-30"))
+
+
+def test_query_recusa_filtro_invalido(tmp_path, livro):
+    with pytest.raises(SystemExit):
+        rc.main(["query", "--ledger", str(livro.caminho), "--valor-min", "1.2.3"])
+
+
+def test_query_sem_livro(tmp_path):
+    ausente = tmp_path / "livro.sqlite3"
+    assert rc.main(["query", "--ledger", str(ausente)]) == 1
+    assert not ausente.exists()
@@ -0,0 +1,81 @@
+import json
+
+import renomeador_comprovantes as rc
+
+
+def _gravar_manifesto(caminho, entradas):
+    caminho.write_text("".join(json.dumps(e) + "\n" for e in entradas), encoding="utf-8")
+
+
+def test_apply_recusa_nome_fora_da_pasta(tmp_path, comprovante):
+    pasta = tmp_path / "a" / "b"
+    pasta.mkdir(parents=True)
+    arquivo = pasta / "x.pdf"
+    comprovante(arquivo)
+    manifesto = tmp_path / "manifesto.jsonl"
+    _gravar_manifesto(manifesto, [
+        {"origem": str(arquivo), "nome": "../../evil.pdf"},
+        {"origem": str(arquivo), "nome": str(tmp_path / "evil.pdf")},
+        {"origem": str(arquivo), "nome": ".."},
+    ])
+
+    contagem = rc.aplicar_manifesto(manifesto)
+
+    assert contagem["falhas"] == 3
+    assert contagem["processados"] == 0
+    assert arquivo.exists()
+    assert not (tmp_path / "evil.pdf").exists()
+
+
+def test_apply_renomeia_nome_editado(tmp_path, comprovante):
+    arquivo = tmp_path / "x.pdf"
+    comprovante(arquivo)
+    manifesto = tmp_path / "manifesto.jsonl"
+    _gravar_manifesto(manifesto, [{"origem": str(arquivo), "nome": "editado.pdf"}])
+
+    contagem = rc.aplicar_manifesto(manifesto)
+
+    assert contagem["processados"] == 1
+    assert (tmp_path / "editado.pdf").exists()
+
+
+def test_apply_manifesto_inexistente(tmp_path):
+    assert rc.main(["apply", str(tmp_path / "nao_existe.jsonl")]) == 1
+
+
+def test_apply_pula_tamanho_invalido(tmp_path, comprovante):
+    ruim, bom = tmp_path / "ruim.pdf", tmp_path / "bom.pdf"
+    comprovante(ruim)
+    comprovante(bom, semente=1)
+    manifesto = tmp_path / "manifesto.jsonl"
+    _gravar_manifesto(manifesto, [
+        {"origem": str(ruim), "tamanho": "12kB", "nome": "ruim_editado.pdf"},
+        {"nome": "sem_origem.pdf"},
+        {"origem": str(bom), "tamanho": bom.stat().st_size, "nome": "bom_editado.pdf"},
+    ])
+
+    contagem = rc.aplicar_manifesto(manifesto)
+
+    assert (contagem["processados"], contagem["falhas"]) == (1, 2)
+    assert ruim.exists()
+    assert (tmp_path / "bom_editado.pdf").exists()
+
+
+def test_plan_le_cada_arquivo_uma_vez(tmp_path, comprovante, monkeypatch):
+    pasta = tmp_path / "pdfs"
+    pasta.mkdir()
+    nomes = [comprovante(pasta / f"{i}.pdf", semente=i) for i in range(3)]
+    esperado = {str(pasta / f"{i}.pdf"): rc.hash_arquivo(pasta / f"{i}.pdf") for i in range(3)}
+    lidos = []
+    ler = rc._ler_conteudo
+    monkeypatch.setattr(rc, "_ler_conteudo", lambda arquivo: lidos.append(arquivo) or ler(arquivo))
+    monkeypatch.setattr(rc, "hash_arquivo", None)
+
+    manifesto = tmp_path / "manifesto.jsonl"
+    contagem = rc.planejar_pasta(pasta, manifesto)
+
+    entradas = list(rc.ler_manifesto(manifesto))
+    assert contagem["processados"] == 3
+    assert {e["origem"]: e["hash"] for e in entradas} == esperado
+    assert [e["nome"] for e in entradas] == nomes
+    assert sorted(lidos) == sorted(pasta.iterdir())
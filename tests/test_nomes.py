@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+import renomeador_comprovantes as rc
+
+
+def _renomear(pasta):
+    contagem = rc._processar_arquivos(rc.percorrer_pdfs(pasta))
+    return sorted(p.name for p in contagem["renomeados"])
+
+
+def test_dois_pdfs_com_o_mesmo_nome(tmp_path, comprovante):
+    nome = comprovante(tmp_path / "a.pdf")
+    comprovante(tmp_path / "b.pdf")
+
+    base, extensao = os.path.splitext(nome)
+    assert _renomear(tmp_path) == [nome, f"{base}_1{extensao}"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [nome, f"{base}_1{extensao}"]
+
+
+def test_nome_ja_existente_nao_e_sobrescrito(tmp_path, comprovante):
+    nome = comprovante(tmp_path / "a.pdf")
+    (tmp_path / nome).write_bytes(b"outro arquivo")
+
+    base, extensao = os.path.splitext(nome)
+    assert _renomear(tmp_path) == [f"{base}_1{extensao}"]
+    assert (tmp_path / nome).read_bytes() == b"outro arquivo"
+
+
+@pytest.mark.parametrize("erro", [OSError, NotImplementedError])
+def test_sem_hard_links(tmp_path, monkeypatch, erro):
+    arquivo = tmp_path / "a.pdf"
+    arquivo.write_bytes(b"conteudo")
+    alocador = rc.AlocadorNomes()
+    alocador._nomes_ocupados(tmp_path)
+    # Ocupado por outro processo depois da listagem
+    (tmp_path / "NOME.pdf").write_bytes(b"outro processo")
+
+    def link(origem, destino):
+        raise erro("hard links não suportados")
+    monkeypatch.setattr(rc.os, "link", link)
+
+    assert alocador.mover(arquivo, "NOME.pdf") == tmp_path / "NOME_1.pdf"
+    assert not arquivo.exists()
+    assert (tmp_path / "NOME_1.pdf").read_bytes() == b"conteudo"
+    assert (tmp_path / "NOME.pdf").read_bytes() == b"outro processo"
+
+
+def test_conclui_movimento_interrompido(tmp_path, comprovante):
+    nome = comprovante(tmp_path / "a.pdf")
+    # Execução anterior morta entre os.link e o unlink da origem
+    os.link(tmp_path / "a.pdf", tmp_path / nome)
+
+    assert _renomear(tmp_path) == [nome]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [nome]
@@ -0,0 +1,36 @@
+import random
+import sys
+import types
+
+from benchmarks.gerador import gerar_comprovante, montar_pdf
+
+import renomeador_comprovantes as rc
+
+
+def test_cache_sem_texto_nao_impede_o_ocr(tmp_path, monkeypatch):
+    arquivo = tmp_path / "digitalizado.pdf"
+    arquivo.write_bytes(montar_pdf([[]]))
+    linhas, esperado = gerar_comprovante("pix", random.Random(0))
+    monkeypatch.setattr(rc, "ocr_paginas", lambda *args: ["\n".join(linhas)])
+
+    with rc.CacheExtracao(tmp_path / "cache.sqlite") as cache:
+        # Primeira execução sem --ocr guarda o resultado vazio
+        assert rc.processar_pdf(str(arquivo), cache=cache) is None
+        assert rc.processar_pdf(str(arquivo), cache=cache,
+                                opcoes=rc.OpcoesExtracao(ocr="por")) == esperado
+
+
+def test_ocr_sem_renderizador(monkeypatch):
+    instalados = {"tesseract"}
+    monkeypatch.setattr(rc.shutil, "which",
+                        lambda nome: f"/usr/bin/{nome}" if nome in instalados else None)
+
+    # Sem a MagickWand, o pdfplumber não consegue importar o módulo de renderização
+    monkeypatch.setitem(sys.modules, "pdfplumber.display", None)
+    assert "ImageMagick" in rc.motivo_sem_ocr()
+
+    monkeypatch.setitem(sys.modules, "pdfplumber.display", types.ModuleType("display"))
+    assert "Ghostscript" in rc.motivo_sem_ocr()
+
+    instalados.add("gs")
+    assert rc.ocr_disponivel()
@@ -0,0 +1,11 @@
+import renomeador_comprovantes as rc
+
+
+def test_profile_aparece_com_quiet(tmp_path, comprovante, capsys):
+    comprovante(tmp_path / "recibo.pdf")
+
+    rc.main(["-q", "--profile", "--no-cache", "--no-index", str(tmp_path)])
+
+    saida = capsys.readouterr().out
+    assert "PERFIL: 1 arquivo(s)" in saida
+    assert "Processando" not in saida
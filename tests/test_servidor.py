@@ -0,0 +1,46 @@
+import io
+import logging
+import threading
+import time
+
+import pytest
+
+import renomeador_comprovantes as rc
+
+pytestmark = pytest.mark.skipif(not hasattr(rc.socket, "AF_UNIX"),
+                                reason="sockets Unix indisponíveis")
+
+
+@pytest.fixture
+def log_do_servidor():
+    """Configura o log do servidor como -q, restaurando o logger no fim."""
+    handlers, nivel = list(rc.logger.handlers), rc.logger.level
+    fluxo = io.StringIO()
+    rc.configurar_logging(-1, fluxo=fluxo)
+    yield fluxo
+    rc.logger.handlers, rc.logger.level = handlers, nivel
+
+
+def test_servidor_quieto_envia_o_log_pedido_pelo_cliente(tmp_path, comprovante, log_do_servidor):
+    socket_servidor = tmp_path / "s.sock"
+    arquivo = tmp_path / "x.pdf"
+    esperado = comprovante(arquivo)
+    servidor = threading.Thread(target=rc.servir, args=(socket_servidor,))
+    servidor.start()
+    try:
+        for _ in range(100):
+            if socket_servidor.exists():
+                break
+            time.sleep(0.05)
+        saida = io.StringIO()
+        contagem = rc.enviar_arquivos([arquivo], socket_servidor, logging.INFO, saida=saida)
+    finally:
+        rc.parar_servidor(socket_servidor)
+        servidor.join(10)
+
+    assert contagem["processados"] == 1
+    assert (tmp_path / esperado).exists()
+    assert "✅ Renomeado" in saida.getvalue()
+    # O servidor continua mostrando só avisos e erros
+    assert "✅ Renomeado" not in log_do_servidor.getvalue()
+    assert rc.logger.level == logging.WARNING
@@ -0,0 +1,47 @@
+import zipfile
+
+import renomeador_comprovantes as rc
+
+
+def _zip_com_comprovantes(caminho, pastas, comprovante):
+    """Grava um .zip com um comprovante por membro; retorna os nomes esperados."""
+    nomes = []
+    with zipfile.ZipFile(caminho, "w") as z:
+        for semente, pasta in enumerate(pastas):
+            pdf = caminho.parent / "recibo.pdf"
+            nomes.append(comprovante(pdf, semente=semente))
+            z.write(pdf, f"{pasta}/recibo.pdf")
+            pdf.unlink()
+    return nomes
+
+
+def _varrer(pasta, **opcoes):
+    """Processa os PDFs e .zip da pasta; retorna a contagem."""
+    arquivos = rc.percorrer_pdfs(pasta, False, ("*.pdf", "*.zip"), ())
+    return rc._processar_arquivos(arquivos, **opcoes)
+
+
+def test_reempacotado_com_sufixo_nao_e_lido_de_novo(tmp_path, comprovante):
+    _zip_com_comprovantes(tmp_path / "exportacao.zip", ("a",), comprovante)
+    (tmp_path / "exportacao.renomeado.zip").write_bytes(b"ocupado")
+
+    contagem = _varrer(tmp_path, reempacotar=True)
+    assert [p.name for p in contagem["renomeados"]] == ["exportacao.renomeado_1.zip"]
+
+    contagem = _varrer(tmp_path, reempacotar=True)
+    assert contagem["processados"] == contagem["falhas"] == 0
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "exportacao.renomeado.zip", "exportacao.renomeado_1.zip", "exportacao.zip.extraido"]
+
+
+def test_pdfs_extraidos_entram_no_indice(tmp_path, comprovante):
+    nomes = _zip_com_comprovantes(tmp_path / "exportacao.zip", ("a", "b"), comprovante)
+
+    with rc.IndiceProcessados(tmp_path / "indice.sqlite3") as indice:
+        contagem = _varrer(tmp_path, indice=indice)
+        assert sorted(p.name for p in contagem["renomeados"]) == sorted(nomes)
+        assert {indice.situacao(p) for p in contagem["renomeados"]} == {"renomeado"}
+
+        contagem = _varrer(tmp_path, indice=indice)
+    assert contagem["total"] == 2
+    assert contagem["processados"] == contagem["falhas"] == 0